@@ -2,13 +2,17 @@ from flask import Flask
 from flask_cors import CORS
 import os
 
-from app.config import BASE_DIR, SECRET_KEY, DEBUG
-from app.routes.main_routes import main_routes
-from app.routes.api_routes import api_routes
-from app.services.display_service import DisplayService
+from app.config import BASE_DIR, SECRET_KEY, DEBUG, UPLOAD_MAX_REQUEST_MB
 
 
 def create_app():
+    # 路由与显示服务在此导入：渲染子进程导入 app.services 时不加载 Flask 应用
+    from app.routes.main_routes import main_routes
+    from app.routes.api_routes import api_routes
+    from app.services.display_service import DisplayService
+    from app.services.image_library_service import ImageLibraryService
+    from app.services.upload_service import UploadRequest
+
     app = Flask(
         __name__,
         template_folder=os.path.join(BASE_DIR, "app", "templates"),
@@ -17,10 +21,15 @@ def create_app():
 
     app.config["SECRET_KEY"] = SECRET_KEY
     app.config["DEBUG"] = DEBUG
+    # 上传请求体流式落盘，超过上限在读取前即返回 413
+    app.config["MAX_CONTENT_LENGTH"] = UPLOAD_MAX_REQUEST_MB * 1024 * 1024
+    app.request_class = UploadRequest
 
     CORS(app)
 
     app.extensions["display_service"] = DisplayService()
+    # 旧 BMP 原图在后台迁移为 LIBRARY_FORMAT
+    ImageLibraryService().start_migration()
 
     app.register_blueprint(main_routes)
     app.register_blueprint(api_routes, url_prefix="/api")
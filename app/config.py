@@ -12,7 +12,49 @@ RUN_MODE = os.getenv("RUN_MODE", "debug")
 SCREEN_WIDTH = int(os.getenv("SCREEN_WIDTH", "800"))
 SCREEN_HEIGHT = int(os.getenv("SCREEN_HEIGHT", "480"))
 
+FRAME_CACHE_MAX_MB = int(os.getenv("FRAME_CACHE_MAX_MB", "64"))
+EPD_FORCE_REFRESH_INTERVAL = int(os.getenv("EPD_FORCE_REFRESH_INTERVAL", "0"))
+EPD_REFRESH_ENERGY_J = float(os.getenv("EPD_REFRESH_ENERGY_J", "7.5"))
+# 帧数据按块推送到 SPI（spidev 默认 bufsiz 为 4096）
+EPD_SPI_CHUNK = int(os.getenv("EPD_SPI_CHUNK", "4096"))
+PLAYBACK_PREFETCH_DEPTH = int(os.getenv("PLAYBACK_PREFETCH_DEPTH", "1"))
+PLAYBACK_PREFETCH_MAX_MB = int(os.getenv("PLAYBACK_PREFETCH_MAX_MB", "8"))
+# 图片库原图存储格式：webp（无损，默认）/ png / bmp；不支持 WebP 时回退 png
+LIBRARY_FORMAT = os.getenv("LIBRARY_FORMAT", "webp").lower()
+# 额外保存预量化的 4bpp 面板帧（<id>.frame，64 字节头 + 800x480 的 192000 字节数据），冷启动时跳过量化
+LIBRARY_PANEL_FRAMES = os.getenv("LIBRARY_PANEL_FRAMES", "false").lower() == "true"
+# 启动时在后台把旧格式原图迁移为 LIBRARY_FORMAT
+LIBRARY_MIGRATE = os.getenv("LIBRARY_MIGRATE", "true").lower() == "true"
+# 上传：单个文件与整个请求的字节上限（MB）、像素上限、批量上传并发数、落盘临时目录
+UPLOAD_MAX_MB = int(os.getenv("UPLOAD_MAX_MB", "30"))
+UPLOAD_MAX_REQUEST_MB = int(os.getenv("UPLOAD_MAX_REQUEST_MB", "200"))
+UPLOAD_MAX_PIXELS = int(os.getenv("UPLOAD_MAX_PIXELS", "64000000"))
+UPLOAD_WORKERS = int(os.getenv("UPLOAD_WORKERS", "2"))
+UPLOAD_TMP_DIR = os.getenv("UPLOAD_TMP_DIR", os.path.join(BASE_DIR, "storage", "upload_tmp"))
+# 批量导入包（zip/tar）的大小上限（MB）
+LIBRARY_IMPORT_MAX_MB = int(os.getenv("LIBRARY_IMPORT_MAX_MB", "2048"))
+# 近似重复检测的 pHash 汉明距离阈值（64 位）
+DEDUP_PHASH_DISTANCE = int(os.getenv("DEDUP_PHASH_DISTANCE", "8"))
+PREVIEW_CACHE_MAX_MB = int(os.getenv("PREVIEW_CACHE_MAX_MB", "32"))
+PREVIEW_JOB_WORKERS = int(os.getenv("PREVIEW_JOB_WORKERS", "2"))
+# 渲染进程数，默认保留一个核给 Flask/显示线程；0 表示在调用线程内执行（单核 Pi Zero）
+RENDER_WORKERS = int(os.getenv("RENDER_WORKERS", str(max(0, (os.cpu_count() or 1) - 1))))
+
 DASHSCOPE_API_KEY = os.getenv("DASHSCOPE_API_KEY")
+# 文生图并发数、DashScope 速率配额（每分钟请求数，0 为不限）、突发容量、单任务时限与相同请求结果复用时长（秒）
+IMAGE_GEN_WORKERS = int(os.getenv("IMAGE_GEN_WORKERS", "2"))
+IMAGE_GEN_RATE_PER_MIN = float(os.getenv("IMAGE_GEN_RATE_PER_MIN", "10"))
+IMAGE_GEN_BURST = int(os.getenv("IMAGE_GEN_BURST", "2"))
+IMAGE_GEN_TIMEOUT = float(os.getenv("IMAGE_GEN_TIMEOUT", "300"))
+IMAGE_GEN_DEDUPE_TTL = float(os.getenv("IMAGE_GEN_DEDUPE_TTL", "120"))
+# 外部 HTTP 调用（DashScope 图片下载、天气 API）共用的连接池与重试策略
+HTTP_POOL_SIZE = int(os.getenv("HTTP_POOL_SIZE", "8"))
+HTTP_RETRIES = int(os.getenv("HTTP_RETRIES", "3"))
+HTTP_BACKOFF = float(os.getenv("HTTP_BACKOFF", "0.5"))
+HTTP_CONNECT_TIMEOUT = float(os.getenv("HTTP_CONNECT_TIMEOUT", "5"))
+HTTP_READ_TIMEOUT = float(os.getenv("HTTP_READ_TIMEOUT", "30"))
+# 按主机后缀覆盖读超时，如 "aliyuncs.com=120,qweatherapi.com=10"
+HTTP_HOST_TIMEOUTS = os.getenv("HTTP_HOST_TIMEOUTS", "aliyuncs.com=120")
 DASHSCOPE_COMPAT_BASE_URL = "https://dashscope.aliyuncs.com/compatible-mode/v1"
 DASHSCOPE_HTTP_BASE_URL = "https://dashscope.aliyuncs.com/api/v1"
 
@@ -22,3 +64,8 @@ WEATHER_PEM_KEY = os.getenv("WEATHER_PEM_KEY")
 WEATHER_SUB_ID = os.getenv("WEATHER_SUB_ID")
 WEATHER_KID_ID = os.getenv("WEATHER_KID_ID")
 WEATHER_FONT_PATH = os.getenv("WEATHER_FONT_PATH")
+# 多地点并发查询线程数；实时天气结果复用时长（秒）
+WEATHER_FETCH_WORKERS = int(os.getenv("WEATHER_FETCH_WORKERS", "4"))
+WEATHER_RESULT_TTL = float(os.getenv("WEATHER_RESULT_TTL", "300"))
+# 日内刷新实时天气并重新合成文字层的间隔（秒，0 为关闭）
+WEATHER_REFRESH_INTERVAL = int(os.getenv("WEATHER_REFRESH_INTERVAL", "1800"))
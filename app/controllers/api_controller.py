@@ -6,8 +6,8 @@ from app.models.weather_du import WeatherDisplayUnit
 from app.models.poetry_du import PoetryDisplayUnit
 from app.models.playlist import Playlist
 from app.services.storage_service import StorageService
-import base64
-import io
+from app.services.preview_store_service import get_preview_store
+import hashlib
 
 class APIController:
     """API控制器，处理业务逻辑"""
@@ -165,18 +165,18 @@ class APIController:
         du_dict['id'] = du_id
         
         try:
-            # 获取预览图片
-            image = du.get_image()
-            
-            # 将图片转换为base64编码的URL
-            buffer = io.BytesIO()
-            image.save(buffer, format='PNG')
-            buffer.seek(0)
-            image_base64 = base64.b64encode(buffer.read()).decode('utf-8')
-            image_url = f"data:image/png;base64,{image_base64}"
-            
-            # 添加图片URL到响应
-            du_dict['image_url'] = image_url
+            preview_store = get_preview_store()
+            content_key = du.frame_cache_key()
+            if content_key is not None:
+                # 可缓存的单元按内容键渲染一次，之后直接命中磁盘
+                key = preview_store.make_key("du", content_key)
+                du_dict['image_url'] = preview_store.get_or_render(key, du.get_image)
+            else:
+                # 内容随时间变化的单元每次取图（其内部已按天缓存），按像素内容只编码一次
+                image = du.get_image()
+                pixel_hash = hashlib.sha1(image.tobytes()).hexdigest()
+                key = preview_store.make_key("pixels", image.mode, image.size, pixel_hash)
+                du_dict['image_url'] = preview_store.get_or_render(key, lambda: image)
         except Exception as e:
             print(f"Error generating preview: {e}")
             # 如果生成预览失败，返回基本信息
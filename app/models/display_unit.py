@@ -20,6 +20,23 @@ class DisplayUnit(ABC):
         :return: PIL.Image对象
         """
         pass
+
+    def frame_cache_key(self):
+        """
+        帧缓存键：键相同保证 get_image() 输出相同
+        :return: 字符串；None 表示不可缓存
+        """
+        return None
+
+    def packed_frame_path(self, width, height, version):
+        """
+        预量化的 4bpp 面板帧文件，内容须与 get_image() 量化打包的结果一致
+        :param width: 面板宽度
+        :param height: 面板高度
+        :param version: 调色板版本
+        :return: 文件路径；None 表示没有
+        """
+        return None
     
     def to_dict(self):
         """
@@ -23,6 +23,9 @@ class EmptyDisplayUnit(DisplayUnit):
         image = Image.new('RGB', (SCREEN_WIDTH, SCREEN_HEIGHT), color='white')
         return image
 
+    def frame_cache_key(self):
+        return f"empty:{SCREEN_WIDTH}x{SCREEN_HEIGHT}"
+
     @classmethod
     def from_dict(cls, data):
         return cls(
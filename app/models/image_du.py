@@ -1,6 +1,7 @@
 from app.models.display_unit import DisplayUnit, register_display_unit
 from app.services.image_library_service import ImageLibraryService
-from app.services.image_processing_service import apply_color_diffusion
+from app.services.render_service import get_render_service
+from app.services.frame_cache_service import file_digest
 from app.config import SCREEN_WIDTH, SCREEN_HEIGHT
 from PIL import Image
 import os
@@ -22,15 +23,19 @@ class ImageDisplayUnit(DisplayUnit):
         self.image_id = image_id
         self.enable_color_diffusion = enable_color_diffusion
     
+    def _resolve_image_path(self):
+        image_path = self.image_path
+        if self.image_id:
+            library_service = ImageLibraryService()
+            image_path = library_service.get_image_path(self.image_id)
+        return image_path
+
     def get_image(self):
         """
         获取要显示的图片
         :return: PIL.Image对象
         """
-        image_path = self.image_path
-        if self.image_id:
-            library_service = ImageLibraryService()
-            image_path = library_service.get_image_path(self.image_id)
+        image_path = self._resolve_image_path()
 
         if not image_path or not os.path.exists(image_path):
             # 如果图片不存在，返回白色图片
@@ -39,15 +44,34 @@ class ImageDisplayUnit(DisplayUnit):
         try:
             # 打开并返回图片
             image = Image.open(image_path)
+            render_service = get_render_service()
             # 调整图片大小以适应屏幕
-            image = image.resize((SCREEN_WIDTH, SCREEN_HEIGHT), Image.LANCZOS)
+            image = render_service.resize(image, (SCREEN_WIDTH, SCREEN_HEIGHT))
             if self.enable_color_diffusion:
-                image = apply_color_diffusion(image)
+                image = render_service.dither(image)
             return image
         except Exception as e:
             # 出错时返回白色图片
             print(f"Error loading image: {e}")
             return Image.new('RGB', (SCREEN_WIDTH, SCREEN_HEIGHT), color='white')
+
+    def frame_cache_key(self):
+        """
+        以图片内容哈希 + 处理选项作为帧缓存键
+        """
+        image_path = self._resolve_image_path()
+        if not image_path or not os.path.exists(image_path):
+            return None
+        return (
+            f"image:{file_digest(image_path)}:{SCREEN_WIDTH}x{SCREEN_HEIGHT}"
+            f":diffusion={int(bool(self.enable_color_diffusion))}"
+        )
+
+    def packed_frame_path(self, width, height, version):
+        # 颜色扩散后的帧与原图直接量化的结果不同，只有未扩散时可用
+        if self.enable_color_diffusion or not self.image_id:
+            return None
+        return ImageLibraryService().get_packed_frame_path(self.image_id, width, height, version)
     
     def to_dict(self):
         """
@@ -1,26 +1,31 @@
 from app.models.display_unit import DisplayUnit, register_display_unit
-from app.services.weather_service import WeatherService
+from app.services.weather_service import get_weather_service
 from app.services.weather_cache_service import WeatherCacheService
+from app.services.weather_refresh_service import get_weather_refresh_service
 from app.services.image_library_service import ImageLibraryService
 from app.services.image_gen_service import ImageGenService
+from app.services.image_gen_queue_service import PRIORITY_SCHEDULED
 from app.services.ina219_service import INA219Service
 from app.config import SCREEN_WIDTH, SCREEN_HEIGHT, WEATHER_FONT_PATH
 from PIL import Image, ImageDraw, ImageFont, ImageStat
 import os
 import threading
+import time
 
 
 @register_display_unit
 class WeatherDisplayUnit(DisplayUnit):
-    """天气显示单元：每日首次生成背景图并缓存"""
+    """天气显示单元：每日首次生成背景图并缓存，日内按实时天气重新合成文字层"""
 
     def __init__(self, name, location, display_time=600):
         super().__init__(name, display_time)
         self.location = location
-        self.weather_service = WeatherService()
+        self.weather_service = get_weather_service()
+        self.weather_service.watch(self, location)
         self.cache_service = WeatherCacheService()
         self.image_library_service = ImageLibraryService()
         self.image_gen_service = ImageGenService()
+        get_weather_refresh_service().start()
 
     def _build_prompt(self, weather_text, temp):
         return (
@@ -249,6 +254,45 @@ class WeatherDisplayUnit(DisplayUnit):
         mean = ImageStat.Stat(region).mean[0]
         return (255, 255, 255) if mean < 128 else (0, 0, 0)
 
+    def _fetch_weather(self):
+        # 一次并发取回全部天气单元的地点，同日生成的其他单元直接命中结果缓存
+        entry = self.weather_service.get_weather_map().get(self.location)
+        if entry is None:
+            return self.weather_service.get_today_weather(self.location)
+        if entry["error"]:
+            raise RuntimeError(entry["error"])
+        return entry["data"]
+
+    def _overlay_values(self, weather):
+        """
+        文字层的天气数值；与缓存值相同时日内刷新跳过重新合成
+        电量每次轮询都会变化，不参与比较，合成时再读取
+        """
+        now = weather.get("now", {})
+        update_time = weather.get("updateTime", "")
+        return {
+            "date_text": update_time.split("T")[0] if update_time else self.weather_service.today_key(),
+            "weather_text": now.get("text", "未知"),
+            "temp": now.get("temp", "--"),
+            "humidity": now.get("humidity", ""),
+            "wind_dir": now.get("windDir", ""),
+            "wind_scale": now.get("windScale", ""),
+            "vis": now.get("vis", ""),
+        }
+
+    @staticmethod
+    def _ups_percent():
+        try:
+            return INA219Service().get_ups_percent()
+        except Exception:
+            return None
+
+    def _compose(self, background, values):
+        # convert 总是返回副本，背景图保持不变；电量取合成时的实时值
+        frame = background.convert("RGB")
+        self._draw_weather_text(frame, **values, ups_percent=self._ups_percent())
+        return frame
+
     def get_image(self):
         date_key = self.weather_service.today_key()
         cached = self.cache_service.get(date_key, self.location)
@@ -271,47 +315,30 @@ class WeatherDisplayUnit(DisplayUnit):
 
         def _generate():
             try:
-                weather = self.weather_service.get_today_weather(self.location)
-                now = weather.get("now", {})
-                weather_text = now.get("text", "未知")
-                temp = now.get("temp", "--")
-                wind_dir = now.get("windDir", "")
-                wind_scale = now.get("windScale", "")
-                humidity = now.get("humidity", "")
-                vis = now.get("vis", "")
-                update_time = weather.get("updateTime", "")
-                date_text = update_time.split("T")[0] if update_time else self.weather_service.today_key()
-
-                prompt = self._build_prompt(weather_text, temp)
+                values = self._overlay_values(self._fetch_weather())
+                prompt = self._build_prompt(values["weather_text"], values["temp"])
+                # 后台预生成：让位于界面交互的文生图请求
                 background = self.image_gen_service.generate_image(
-                    prompt, display_size=(SCREEN_WIDTH, SCREEN_HEIGHT)
-                )
-                try:
-                    ups_percent = INA219Service().get_ups_percent()
-                except Exception:
-                    ups_percent = None
-
-                self._draw_weather_text(
-                    background,
-                    date_text,
-                    weather_text,
-                    temp,
-                    humidity,
-                    wind_dir,
-                    wind_scale,
-                    vis,
-                    ups_percent,
+                    prompt, display_size=(SCREEN_WIDTH, SCREEN_HEIGHT), priority=PRIORITY_SCHEDULED
                 )
+                # 背景单独保存，日内刷新只重新合成文字层
+                background_file = self.cache_service.save_background(date_key, self.location, background)
 
                 self.image_library_service.update_item(
                     placeholder["id"],
                     {"status": "ready", "error": None},
-                    image=background,
+                    image=self._compose(background, values),
                 )
                 self.cache_service.set(
                     date_key,
                     self.location,
-                    {"image_id": placeholder["id"], "status": "ready"},
+                    {
+                        "image_id": placeholder["id"],
+                        "status": "ready",
+                        "background": background_file,
+                        "overlay": values,
+                        "refreshed_at": time.time(),
+                    },
                 )
             except Exception as e:
                 self.image_library_service.update_item(
@@ -329,6 +356,36 @@ class WeatherDisplayUnit(DisplayUnit):
         image_path = self.image_library_service.get_image_path(placeholder["id"])
         return Image.open(image_path).convert("RGB")
 
+    def refresh_overlay(self):
+        """
+        日内刷新：取最新实时天气，数值变化时在当日背景上重新合成文字层并覆盖图片库中的帧
+        :return: 是否重新合成（当日背景未就绪或数值未变时返回 False）
+        """
+        date_key = self.weather_service.today_key()
+        cached = self.cache_service.get(date_key, self.location)
+        if not cached or cached.get("status") != "ready" or not cached.get("background"):
+            return False
+        background_path = self.cache_service.background_path(cached["background"])
+        if not os.path.exists(background_path):
+            return False
+
+        values = self._overlay_values(self.weather_service.get_today_weather(self.location))
+        # 旧缓存中的 overlay 可能带有电量，比较前去掉
+        previous = {k: v for k, v in (cached.get("overlay") or {}).items() if k != "ups_percent"}
+        if values == previous:
+            return False
+
+        with Image.open(background_path) as background:
+            frame = self._compose(background, values)
+        if not self.image_library_service.update_item(cached["image_id"], {}, image=frame):
+            return False
+        self.cache_service.set(
+            date_key,
+            self.location,
+            {**cached, "overlay": values, "refreshed_at": time.time()},
+        )
+        return True
+
     def to_dict(self):
         base = super().to_dict()
         base["location"] = self.location
@@ -1,12 +1,23 @@
-from flask import Blueprint, jsonify, request, current_app, send_file
-from io import BytesIO
+from flask import Blueprint, Response, jsonify, request, current_app, send_file
+import json
+import os
+import shutil
+import tempfile
+import time
+from app.config import SCREEN_WIDTH, SCREEN_HEIGHT, LIBRARY_IMPORT_MAX_MB, UPLOAD_TMP_DIR
 from app.controllers.api_controller import APIController
 from app.models.empty_du import EmptyDisplayUnit
 from app.models.image_du import ImageDisplayUnit
 from app.models.text_to_image_du import TextToImageDisplayUnit
-from app.services.image_library_service import ImageLibraryService
+from app.services.frame_file_service import FrameFileError, validate_frame_file
+from app.services.image_library_service import ImageLibraryService, library_format, library_mimetype
+from app.services.image_processing_service import PANEL_FRAME_VERSION
+from app.services.library_transfer_service import get_library_transfer_service, is_import_archive
 from app.services.playback_service import PlaybackService
-from app.services.image_processing_service import apply_color_diffusion
+from app.services.preview_job_service import get_preview_job_service
+from app.services.preview_store_service import get_preview_store
+from app.services.rendition_service import RENDITION_SIZES, TRANSCODE_FORMATS, rendition_url
+from app.services.upload_service import UploadError
 
 api_routes = Blueprint('api', __name__)
 
@@ -70,6 +81,7 @@ def text2image():
     文生图功能
     """
     from app.services.image_gen_service import ImageGenService
+    from app.services.image_gen_queue_service import PRIORITY_INTERACTIVE
     
     data = request.json
     prompt = data.get('prompt', '')
@@ -79,25 +91,15 @@ def text2image():
     
     try:
         image_gen_service = ImageGenService()
-        image, save_path = image_gen_service.generate_image_to_bmp(prompt)
-
-        library_service = ImageLibraryService()
-        library_item = None
-        if save_path:
-            library_item = library_service.add_existing_file(save_path, original_name="generated")
-        
-        # 将图片转换为base64编码的URL
-        import base64
-        from io import BytesIO
-        buffer = BytesIO()
-        image.save(buffer, format='PNG')
-        buffer.seek(0)
-        image_base64 = base64.b64encode(buffer.read()).decode('utf-8')
-        image_url = f"data:image/png;base64,{image_base64}"
-        
-        response = {'image_url': image_url, 'save_path': save_path}
-        if library_item:
-            response['image_id'] = library_item['id']
+        image = image_gen_service.generate_image(prompt, priority=PRIORITY_INTERACTIVE, fallback=False)
+        # 直接按存储格式存入图片库，不再落盘中间 BMP
+        library_item = ImageLibraryService().add_pil_image(image, original_name="generated")
+
+        preview_store = get_preview_store()
+        key = preview_store.make_key("image", library_item['etag'], False)
+        image_url = preview_store.get_or_render(key, lambda: image)
+
+        response = {'image_url': image_url, 'image_id': library_item['id']}
         return jsonify(response)
     except Exception as e:
         print(f"Error generating image: {e}")
@@ -200,10 +202,12 @@ def list_image_library():
     获取图片库列表
     """
     service = ImageLibraryService()
-    items = service.list_images()
+    items = service.list_images(status=request.args.get('status'))
     for item in items:
         if "status" not in item:
             item["status"] = "ready"
+        item['thumb_url'] = rendition_url(item, 'thumb')
+        item['medium_url'] = rendition_url(item, 'medium')
     return jsonify(items)
 
 
@@ -213,7 +217,7 @@ def get_image_library_item(image_id):
     获取图片库详情
     """
     service = ImageLibraryService()
-    item = service.get_image(image_id)
+    item = service.get_file_info(image_id)
     if not item:
         return jsonify({'error': 'Image not found'}), 404
     item = dict(item)
@@ -221,23 +225,65 @@ def get_image_library_item(image_id):
         item["status"] = "ready"
     item['file_path'] = service.get_image_path(image_id)
     item['file_url'] = f"/api/image-library/{image_id}/file"
+    if item.get('etag'):
+        item['file_url'] += f"?v={item['etag'][:16]}"
+    item['thumb_url'] = rendition_url(item, 'thumb')
+    item['medium_url'] = rendition_url(item, 'medium')
     return jsonify(item)
 
 
+@api_routes.route('/image-library/<image_id>/similar', methods=['GET'])
+def get_image_library_similar(image_id):
+    """
+    查找近似重复图片（pHash 汉明距离不超过 distance，默认 DEDUP_PHASH_DISTANCE）
+    """
+    distance = request.args.get('distance', type=int)
+    if distance is not None and not 0 <= distance <= 64:
+        return jsonify({'error': 'distance must be between 0 and 64'}), 400
+    matches = ImageLibraryService().find_similar(image_id, distance)
+    if matches is None:
+        return jsonify({'error': 'Image not found'}), 404
+    items = []
+    for item, item_distance in matches:
+        item['distance'] = item_distance
+        item['thumb_url'] = rendition_url(item, 'thumb')
+        items.append(item)
+    return jsonify({'items': items})
+
+
 @api_routes.route('/image-library/upload', methods=['POST'])
 def upload_image_to_library():
     """
-    上传图片到图片库（自动转为800x480 BMP）
+    上传图片到图片库（自动转为800x480，按 LIBRARY_FORMAT 保存）
+    多个 file 字段为批量上传，返回 {items, errors}
     """
-    if 'file' not in request.files:
+    files = request.files.getlist('file')
+    if not files:
         return jsonify({'error': 'No file provided'}), 400
-    file = request.files['file']
+    service = ImageLibraryService()
+    if len(files) > 1:
+        items, errors = [], []
+        for file, (item, error) in zip(files, service.add_uploads(files)):
+            if error is None:
+                items.append(item)
+            else:
+                errors.append({'filename': file.filename, 'error': str(error), 'status': _upload_error_status(error)})
+        if not items:
+            return jsonify({'error': errors[0]['error'], 'items': items, 'errors': errors}), errors[0]['status']
+        return jsonify({'items': items, 'errors': errors}), 201
     try:
-        service = ImageLibraryService()
-        item = service.add_upload(file)
+        item = service.add_upload(files[0])
         return jsonify(item), 201
     except Exception as e:
-        return jsonify({'error': str(e)}), 500
+        return jsonify({'error': str(e)}), _upload_error_status(e)
+
+
+def _upload_error_status(error):
+    if isinstance(error, UploadError):
+        return 413
+    if isinstance(error, ValueError):
+        return 400
+    return 500
 
 
 @api_routes.route('/image-library/batch-delete', methods=['POST'])
@@ -255,6 +301,95 @@ def batch_delete_image_library():
     return jsonify({'deleted': deleted})
 
 
+@api_routes.route('/image-library/storage', methods=['GET'])
+def image_library_storage():
+    """
+    图片库存储格式、各格式占用与后台迁移进度
+    """
+    return jsonify(ImageLibraryService().storage_status())
+
+
+@api_routes.route('/image-library/import', methods=['POST'])
+def import_image_library():
+    """
+    批量导入：请求体为 zip / tar 包（原始字节流，非 multipart），落盘后在后台导入，返回任务
+    """
+    limit = LIBRARY_IMPORT_MAX_MB * 1024 * 1024
+    if request.content_length is None:
+        return jsonify({'error': 'Content-Length required'}), 411
+    if request.content_length > limit:
+        return jsonify({'error': f'Archive exceeds {LIBRARY_IMPORT_MAX_MB} MB'}), 413
+    if request.content_length == 0:
+        return jsonify({'error': 'No archive provided'}), 400
+
+    os.makedirs(UPLOAD_TMP_DIR, exist_ok=True)
+    fd, path = tempfile.mkstemp(suffix='.import', dir=UPLOAD_TMP_DIR)
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            shutil.copyfileobj(request.stream, f, 64 * 1024)
+        if not is_import_archive(path):
+            os.remove(path)
+            return jsonify({'error': 'Body must be a zip or tar archive'}), 400
+        job = get_library_transfer_service().start_import(path, remove_source=True, source='upload')
+    except Exception as e:
+        # 文件可能已删除，或已交给导入任务处理
+        try:
+            os.remove(path)
+        except OSError:
+            pass
+        return jsonify({'error': str(e)}), 500
+    return jsonify(job), 202
+
+
+@api_routes.route('/image-library/import/<job_id>', methods=['GET'])
+def get_image_library_import(job_id):
+    """
+    批量导入进度
+    """
+    job = get_library_transfer_service().get_job(job_id)
+    if not job:
+        return jsonify({'error': 'Job not found'}), 404
+    return jsonify(job)
+
+
+@api_routes.route('/image-library/export', methods=['GET'])
+def export_image_library():
+    """
+    流式导出图片库为 tar（library.json + images/）
+    """
+    filename = f"library-{time.strftime('%Y%m%d-%H%M%S')}.tar"
+    return Response(
+        get_library_transfer_service().export_stream(),
+        mimetype='application/x-tar',
+        headers={'Content-Disposition': f'attachment; filename="{filename}"'},
+    )
+
+
+@api_routes.route('/image-library/<image_id>/frame', methods=['GET', 'POST'])
+def image_library_frame(image_id):
+    """
+    GET 校验图片的面板帧文件，POST 把图片转换为面板帧文件
+    """
+    service = ImageLibraryService()
+    if not service.get_image(image_id):
+        return jsonify({'error': 'Image not found'}), 404
+    try:
+        if request.method == 'POST':
+            path = service.convert_to_frame(image_id)
+        else:
+            path = service.get_packed_frame_path(image_id, SCREEN_WIDTH, SCREEN_HEIGHT, PANEL_FRAME_VERSION)
+            if not path:
+                return jsonify({'error': 'No panel frame for current panel'}), 404
+        header = validate_frame_file(
+            path, width=SCREEN_WIDTH, height=SCREEN_HEIGHT, palette_version=PANEL_FRAME_VERSION
+        )
+    except FrameFileError as e:
+        return jsonify({'error': str(e), 'valid': False}), 422
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 409
+    return jsonify({'valid': True, 'file': os.path.basename(path), 'header': header})
+
+
 @api_routes.route('/image-library/<image_id>/stylize', methods=['POST'])
 def stylize_image(image_id):
     """
@@ -274,9 +409,8 @@ def stylize_image(image_id):
     from dashscope import ImageSynthesis
     import dashscope
     import os
-    import requests
     import threading
-    from PIL import Image
+    from app.services.http_service import get_http_service
     from app.services.logging_service import get_api_logger
 
     dashscope.base_http_api_url = 'https://dashscope.aliyuncs.com/api/v1'
@@ -333,9 +467,7 @@ def stylize_image(image_id):
 
             image_url_out = response.output.results[0].url
             logger.info(f"DASHSCOPE_IMAGE_EDIT_URL url={image_url_out}")
-            image_response = requests.get(image_url_out, stream=True, timeout=300)
-            image_response.raise_for_status()
-            image = Image.open(BytesIO(image_response.content))
+            image = get_http_service().fetch_image(image_url_out)
             service.update_item(
                 placeholder["id"],
                 {"status": "ready", "error": None},
@@ -354,19 +486,106 @@ def stylize_image(image_id):
 @api_routes.route('/image-library/<image_id>/file', methods=['GET'])
 def get_library_image_file(image_id):
     """
-    获取图片库文件
+    获取图片库文件（内容哈希 ETag、条件请求、Range；默认返回存储格式，按 Accept 或 ?format= 无损转码）
     """
     service = ImageLibraryService()
-    image_path = service.get_image_path(image_id)
-    if not image_path:
+    item = service.get_file_info(image_id)
+    if not item or not item.get('etag'):
         return jsonify({'error': 'Image not found'}), 404
-    return send_file(image_path, mimetype='image/bmp')
+
+    stored = library_format(item['filename'])
+    fmt = request.args.get('format')
+    if fmt is None:
+        fmt = stored
+        if stored == 'bmp':
+            # 尚未迁移的 BMP：仅在客户端显式声明支持时转码，image/* 或 */* 仍返回原始 BMP
+            accepted = set(request.accept_mimetypes.values())
+            for candidate in ('webp', 'png'):
+                if candidate in TRANSCODE_FORMATS and TRANSCODE_FORMATS[candidate][1] in accepted:
+                    fmt = candidate
+                    break
+    if fmt != stored and fmt not in TRANSCODE_FORMATS:
+        return jsonify({'error': 'Unsupported format'}), 400
+
+    etag = item['etag'] if fmt == stored else f"{item['etag']}-{fmt}"
+    version = request.args.get('v')
+    if version and item['etag'].startswith(version):
+        cache_control = 'public, max-age=31536000, immutable'
+    else:
+        cache_control = 'no-cache'
+
+    # 仅凭元数据判断 304，不打开文件
+    not_modified = False
+    if request.if_none_match:
+        not_modified = etag in request.if_none_match
+    elif request.if_modified_since is not None:
+        not_modified = int(request.if_modified_since.timestamp()) >= item['modified_at']
+    if not_modified:
+        response = current_app.response_class(status=304)
+    else:
+        image_path = os.path.join(service.library_dir, item['filename'])
+        if fmt == stored:
+            path, mimetype = image_path, library_mimetype(item['filename'])
+        else:
+            path, mimetype = service.rendition_service.transcoded(image_path, item['etag'], fmt)
+        response = send_file(
+            path,
+            mimetype=mimetype,
+            etag=etag,
+            last_modified=item['modified_at'],
+            conditional=True,
+        )
+        response.accept_ranges = 'bytes'
+    response.set_etag(etag)
+    response.last_modified = item['modified_at']
+    response.headers['Cache-Control'] = cache_control
+    response.vary.add('Accept')
+    return response
+
+
+@api_routes.route('/image-library/<image_id>/thumb', methods=['GET'])
+def get_library_image_thumb(image_id):
+    """
+    获取图片库缩略图（size=thumb|medium，强 ETag；带匹配的 v 参数时长期缓存）
+    """
+    size = request.args.get('size', 'thumb')
+    if size not in RENDITION_SIZES:
+        return jsonify({'error': 'Unsupported size'}), 400
+
+    service = ImageLibraryService()
+    rendition = service.get_rendition(image_id, size)
+    if rendition is None:
+        return jsonify({'error': 'Image not found'}), 404
+    path, entry = rendition
+
+    version = request.args.get('v')
+    if version and entry['etag'].startswith(version):
+        cache_control = 'public, max-age=31536000, immutable'
+    else:
+        cache_control = 'no-cache'
+
+    if entry['etag'] in request.if_none_match:
+        response = current_app.response_class(status=304)
+    else:
+        response = send_file(path, mimetype=entry['mimetype'], conditional=False, etag=False)
+    response.set_etag(entry['etag'])
+    response.headers['Cache-Control'] = cache_control
+    return response
+
+
+def _preview_job_response(job, status_code=None):
+    data = job.to_dict()
+    data['status_url'] = f"/api/image-preview/jobs/{job.id}"
+    data['events_url'] = f"/api/image-preview/jobs/{job.id}/events"
+    if status_code is None:
+        status_code = 200 if job.done else 202
+    return jsonify(data), status_code
 
 
 @api_routes.route('/image-preview', methods=['POST'])
 def preview_image_with_options():
     """
-    预览图片（可选颜色扩散）
+    预览图片（可选颜色扩散），等待渲染完成后返回可缓存的预览 URL
     """
     data = request.json or {}
     image_id = data.get('image_id')
@@ -374,34 +593,20 @@ def preview_image_with_options():
     if not image_id:
         return jsonify({'error': 'image_id is required'}), 400
 
-    service = ImageLibraryService()
-    image_path = service.get_image_path(image_id)
-    if not image_path:
+    job = get_preview_job_service().submit(image_id, enable_color_diffusion)
+    if job is None:
         return jsonify({'error': 'Image not found'}), 404
-
     try:
-        from PIL import Image
-        import base64
-        from io import BytesIO
-
-        image = Image.open(image_path).convert('RGB')
-        if enable_color_diffusion:
-            image = apply_color_diffusion(image)
-
-        buffer = BytesIO()
-        image.save(buffer, format='PNG')
-        buffer.seek(0)
-        image_base64 = base64.b64encode(buffer.read()).decode('utf-8')
-        image_url = f"data:image/png;base64,{image_base64}"
-        return jsonify({'image_url': image_url})
+        job.wait()
     except Exception as e:
         return jsonify({'error': str(e)}), 500
+    return jsonify({'image_url': get_preview_store().url(job.key)})
 
 
 @api_routes.route('/image-preview/file', methods=['GET'])
 def preview_image_file():
     """
-    预览图片文件（可选颜色扩散）
+    预览图片文件（可选颜色扩散）；async=true 且尚未渲染完成时返回 202 + 任务信息
     """
     image_id = request.args.get('image_id')
     enable_color_diffusion = request.args.get('enable_color_diffusion', 'false').lower() == 'true'
@@ -409,33 +614,161 @@ def preview_image_file():
     if not image_id:
         return jsonify({'error': 'image_id is required'}), 400
 
-    service = ImageLibraryService()
-    image_path = service.get_image_path(image_id)
-    if not image_path:
+    job = get_preview_job_service().submit(image_id, enable_color_diffusion)
+    if job is None:
         return jsonify({'error': 'Image not found'}), 404
-
+    if async_mode and not job.done:
+        return _preview_job_response(job)
     try:
-        from PIL import Image
-        from io import BytesIO
+        job.wait()
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+    response = send_file(get_preview_store().path(job.key), mimetype='image/png', etag=job.key)
+    response.headers['Cache-Control'] = 'no-cache'
+    return response
 
-        image = Image.open(image_path).convert('RGB')
 
-        # async mode: return original immediately if diffusion requested
-        if enable_color_diffusion and async_mode:
-            buffer = BytesIO()
-            image.save(buffer, format='PNG')
-            buffer.seek(0)
-            return send_file(buffer, mimetype='image/png')
+@api_routes.route('/image-preview/jobs', methods=['POST'])
+def create_preview_job():
+    """
+    提交预览渲染任务（相同图片与选项的请求合并为同一任务）
+    """
+    data = request.json or {}
+    image_id = data.get('image_id')
+    enable_color_diffusion = bool(data.get('enable_color_diffusion', False))
+    if not image_id:
+        return jsonify({'error': 'image_id is required'}), 400
 
-        if enable_color_diffusion:
-            image = apply_color_diffusion(image)
+    job = get_preview_job_service().submit(image_id, enable_color_diffusion)
+    if job is None:
+        return jsonify({'error': 'Image not found'}), 404
+    return _preview_job_response(job)
 
-        buffer = BytesIO()
-        image.save(buffer, format='PNG')
-        buffer.seek(0)
-        return send_file(buffer, mimetype='image/png')
-    except Exception as e:
+
+@api_routes.route('/image-preview/jobs/<job_id>', methods=['GET'])
+def get_preview_job(job_id):
+    """
+    预览任务状态（完成后含 image_url）
+    """
+    job = get_preview_job_service().get_job(job_id)
+    if job is None:
+        return jsonify({'error': 'Job not found'}), 404
+    return _preview_job_response(job, 200)
+
+
+@api_routes.route('/image-preview/jobs/<job_id>/events', methods=['GET'])
+def stream_preview_job(job_id):
+    """
+    预览任务 SSE 流：结束时推送 done / failed 事件
+    """
+    job = get_preview_job_service().get_job(job_id)
+    if job is None:
+        return jsonify({'error': 'Job not found'}), 404
+
+    def _events():
+        yield "retry: 2000\n\n"
+        # 定期发送注释行保活，直到任务结束
+        while True:
+            try:
+                finished = job.wait(15)
+            except Exception:
+                finished = True
+            if finished:
+                break
+            yield ": keep-alive\n\n"
+        yield f"event: {job.status}\ndata: {json.dumps(job.to_dict())}\n\n"
+
+    response = current_app.response_class(_events(), mimetype='text/event-stream')
+    response.headers['Cache-Control'] = 'no-cache'
+    response.headers['X-Accel-Buffering'] = 'no'
+    return response
+
+
+@api_routes.route('/previews/<key>.png', methods=['GET'])
+def get_preview(key):
+    """
+    获取预览图（URL 由内容键决定，可长期缓存）
+    """
+    preview_store = get_preview_store()
+    if len(key) != 40 or not all(c in '0123456789abcdef' for c in key) or not preview_store.contains(key):
+        return jsonify({'error': 'Preview not found'}), 404
+    if key in request.if_none_match:
+        response = current_app.response_class(status=304)
+    else:
+        response = send_file(preview_store.path(key), mimetype='image/png', conditional=True, etag=key)
+    response.set_etag(key)
+    response.headers['Cache-Control'] = 'public, max-age=31536000, immutable'
+    return response
+
+
+@api_routes.route('/image-gen/status', methods=['GET'])
+def image_gen_status():
+    """
+    文生图任务池状态（排队深度、执行中数量、排队等待耗时）
+    """
+    from app.services.image_gen_queue_service import get_image_gen_queue
+    return jsonify(get_image_gen_queue().status())
+
+
+@api_routes.route('/weather/now', methods=['GET'])
+def weather_now():
+    """
+    并发获取多个地点的实时天气
+    ?location=a&location=b 指定地点，默认为全部天气单元的地点
+    """
+    from app.services.weather_service import get_weather_service
+    from app.services.weather_refresh_service import get_weather_refresh_service
+    try:
+        weather_service = get_weather_service()
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 500
+    locations = request.args.getlist('location') or None
+    return jsonify({
+        'locations': weather_service.get_weather_map(locations),
+        'status': weather_service.status(),
+        'refresh': get_weather_refresh_service().status(),
+    })
+
+
+@api_routes.route('/weather/refresh', methods=['POST'])
+def weather_refresh():
+    """
+    立即刷新全部天气单元的文字层（只在天气数值变化时重新合成）
+    """
+    from app.services.weather_service import get_weather_service
+    from app.services.weather_refresh_service import get_weather_refresh_service
+    try:
+        get_weather_service()
+    except ValueError as e:
         return jsonify({'error': str(e)}), 500
+    refresh_service = get_weather_refresh_service()
+    recomposed = refresh_service.refresh_all()
+    return jsonify({'recomposed': recomposed, 'refresh': refresh_service.status()})
+
+
+@api_routes.route('/display/status', methods=['GET'])
+def display_status():
+    """
+    显示服务状态（刷新耗时直方图）
+    """
+    display_service = current_app.extensions.get("display_service")
+    if display_service is None:
+        return jsonify({'error': 'Display service not initialized'}), 500
+    return jsonify(display_service.status())
+
+
+@api_routes.route('/display/jobs/<job_id>', methods=['GET'])
+def display_job_status(job_id):
+    """
+    显示任务状态
+    """
+    display_service = current_app.extensions.get("display_service")
+    if display_service is None:
+        return jsonify({'error': 'Display service not initialized'}), 500
+    job = display_service.get_job(job_id)
+    if job is None:
+        return jsonify({'error': 'Job not found'}), 404
+    return jsonify(job)
 
 
 @api_routes.route('/test-display', methods=['POST'])
@@ -463,9 +796,12 @@ def test_display():
         else:
             return jsonify({'error': 'Invalid display unit type'}), 400
 
-        image = du.get_image()
-        display_service.display_image(image)
+        job = display_service.submit_unit(du)
 
-        return jsonify({'message': f'Image displayed successfully in {display_service.get_run_mode()} mode'}), 200
+        return jsonify({
+            'message': f'Display job queued in {display_service.get_run_mode()} mode',
+            'job_id': job.id,
+            'status_url': f'/api/display/jobs/{job.id}',
+        }), 202
     except Exception as e:
         return jsonify({'error': str(e)}), 500
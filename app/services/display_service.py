@@ -1,10 +1,66 @@
 import matplotlib.pyplot as plt
 from PIL import Image
-from app.config import RUN_MODE
+from app.config import RUN_MODE, EPD_FORCE_REFRESH_INTERVAL, EPD_REFRESH_ENERGY_J, EPD_SPI_CHUNK
+from app.services.image_processing_service import PALETTE_DIGEST, PANEL_CODES, PANEL_FRAME_VERSION
+from app.services.frame_cache_service import FrameCacheService
+from app.services.frame_file_service import open_frame_file
+from app.services.render_service import get_render_service
+from collections import OrderedDict, deque
+import hashlib
 import threading
+import time
+import uuid
+
+class DisplayJob:
+    """显示任务：由显示线程执行，调用方可等待结果或按 id 查询状态"""
+
+    def __init__(self, kind, du=None, image=None, supersedable=True):
+        self.id = uuid.uuid4().hex
+        self.kind = kind
+        self.supersedable = supersedable
+        self.du = du
+        self.image = image
+        self.status = "pending"
+        self.error = None
+        self.created_at = time.time()
+        self.finished_at = None
+        self._event = threading.Event()
+
+    def finish(self, status, error=None):
+        self.status = status
+        self.error = error
+        self.finished_at = time.time()
+        # 释放渲染输入，避免保留的任务记录占用内存
+        self.du = None
+        self.image = None
+        self._event.set()
+
+    def wait(self, timeout=None):
+        """
+        等待任务结束
+        :return: 最终状态（done / skipped / superseded），失败时抛出原异常
+        """
+        self._event.wait(timeout)
+        if self.error:
+            raise self.error
+        return self.status
+
+    def to_dict(self):
+        return {
+            "id": self.id,
+            "kind": self.kind,
+            "status": self.status,
+            "error": str(self.error) if self.error else None,
+            "created_at": self.created_at,
+            "finished_at": self.finished_at,
+        }
+
 
 class DisplayService:
     """显示服务类，根据运行模式决定如何显示图像"""
+
+    # 保留最近任务记录的数量（用于状态查询）
+    JOB_HISTORY = 50
     
     def __init__(self):
         """
@@ -13,8 +69,23 @@ class DisplayService:
         self.run_mode = RUN_MODE
         self.epd = None
         self._buffer = None
-        self._palette_image = None
         self._buffer_lock = threading.Lock()
+        self.frame_cache = None
+
+        # 单一显示线程独占墨水屏：可覆盖的待执行任务只保留最新一个（后到者覆盖）；
+        # 清屏、关机白屏等不可覆盖的任务按提交顺序排在其前
+        self._job_cond = threading.Condition()
+        self._pending_job = None
+        self._pending_fixed = deque()
+        self._current_job = None
+        self._jobs = OrderedDict()
+        self._superseded_count = 0
+        self._worker = None
+
+        # 跳过相同帧：记录最后一次推送到墨水屏的缓冲区摘要
+        self._last_digest = None
+        self._last_refresh_at = 0.0
+        self._refresh_stats = {"refreshed": 0, "skipped": 0, "forced": 0}
         
         # 仅在生产模式下导入墨水屏驱动
         if self.run_mode == 'production':
@@ -22,19 +93,15 @@ class DisplayService:
             self.epd = EPD()
             self.epd.init()
             self._init_buffer_pool()
+            self.frame_cache = FrameCacheService()
 
     def _init_buffer_pool(self):
-        # Create a reusable palette and buffer to reduce allocations
-        self._palette_image = Image.new("P", (1, 1))
-        self._palette_image.putpalette(
-            (0, 0, 0, 255, 255, 255, 255, 255, 0, 255, 0, 0, 0, 0, 0, 0, 0, 255, 0, 255, 0)
-            + (0, 0, 0) * 249
-        )
+        # Reuse one packed frame buffer to reduce allocations
         size = int(self.epd.width * self.epd.height / 2)
         self._buffer = bytearray(size)
 
     def _getbuffer_reuse(self, image):
-        # Similar to epd.getbuffer but reuses buffer
+        # Similar to epd.getbuffer but reuses buffer; quantize + pack runs in the render pool
         imwidth, imheight = image.size
         if imwidth == self.epd.width and imheight == self.epd.height:
             image_temp = image
@@ -43,27 +110,179 @@ class DisplayService:
         else:
             image_temp = image.resize((self.epd.width, self.epd.height))
 
-        image_6color = image_temp.convert("RGB").quantize(palette=self._palette_image)
-        buf_6color = image_6color.tobytes("raw")
-
-        buf = self._buffer
-        idx = 0
-        for i in range(0, len(buf_6color), 2):
-            buf[idx] = (buf_6color[i] << 4) + buf_6color[i + 1]
-            idx += 1
-        return buf
+        return get_render_service().quantize_pack(image_temp, self._buffer)
     
-    def display_image(self, image):
+    def _frame_key(self, content_key):
+        # 面板尺寸与调色板版本变化都会使旧帧失效
+        raw = f"{content_key}|{self.epd.width}x{self.epd.height}|{PALETTE_DIGEST}|{PANEL_CODES.tobytes().hex()}"
+        return hashlib.sha1(raw.encode("utf-8")).hexdigest()
+
+    def has_cached_frame(self, du):
+        """
+        该显示单元的帧是否已在帧缓存中
+        """
+        content_key = du.frame_cache_key() if self.frame_cache is not None else None
+        if content_key is None:
+            return False
+        return self.frame_cache.contains(self._frame_key(content_key))
+
+    def _ensure_worker(self):
+        if self._worker and self._worker.is_alive():
+            return
+        self._worker = threading.Thread(target=self._run_worker, daemon=True)
+        self._worker.start()
+
+    def _run_worker(self):
+        while True:
+            with self._job_cond:
+                while self._pending_job is None and not self._pending_fixed:
+                    self._job_cond.wait()
+                if self._pending_fixed:
+                    job = self._pending_fixed.popleft()
+                else:
+                    job = self._pending_job
+                    self._pending_job = None
+                self._current_job = job
+                job.status = "running"
+            try:
+                # 一旦开始即完整执行（上电、刷新、断电），不会被新任务打断
+                if job.kind == "unit":
+                    refreshed = self._show_unit(job.du, job.image)
+                elif job.kind == "image":
+                    refreshed = self._show_image(job.image)
+                else:
+                    refreshed = self._clear()
+                job.finish("skipped" if refreshed is False else "done")
+            except Exception as e:
+                job.finish("failed", e)
+            finally:
+                with self._job_cond:
+                    self._current_job = None
+
+    def submit(self, kind, du=None, image=None, supersedable=True):
+        """
+        提交显示任务，立即返回
+        :param kind: unit / image / clear
+        :param supersedable: False 时任务不会被后来的任务覆盖（clear 总是如此），之后提交的任务排在其后
+        :return: DisplayJob对象；尚未开始的可覆盖旧任务会被标记为 superseded 并丢弃
+        """
+        if kind == "clear":
+            supersedable = False
+        job = DisplayJob(kind, du=du, image=image, supersedable=supersedable)
+        with self._job_cond:
+            if self._pending_job is not None:
+                self._pending_job.finish("superseded")
+                self._superseded_count += 1
+                self._pending_job = None
+            if supersedable:
+                self._pending_job = job
+            else:
+                self._pending_fixed.append(job)
+            self._jobs[job.id] = job
+            while len(self._jobs) > self.JOB_HISTORY:
+                self._jobs.popitem(last=False)
+            self._ensure_worker()
+            self._job_cond.notify()
+        return job
+
+    def submit_unit(self, du, image=None):
+        return self.submit("unit", du=du, image=image)
+
+    def submit_image(self, image, supersedable=True):
+        return self.submit("image", image=image, supersedable=supersedable)
+
+    def get_job(self, job_id):
+        with self._job_cond:
+            job = self._jobs.get(job_id)
+        return job.to_dict() if job else None
+
+    def display_unit(self, du, image=None):
+        """
+        显示一个显示单元并等待完成
+        :param du: DisplayUnit对象
+        :param image: 已预先渲染的PIL.Image对象（可选），未命中缓存时代替 du.get_image()
+        :return: 任务最终状态
         """
-        显示图像
+        return self.submit_unit(du, image).wait()
+
+    def _show_unit(self, du, image=None):
+        """
+        生产模式下命中帧缓存时以 mmap 映射帧文件并分块推送，跳过PIL处理且不在堆上复制整帧
+        """
+        content_key = du.frame_cache_key() if self.frame_cache is not None else None
+        if content_key is None:
+            return self._show_image(image if image is not None else du.get_image())
+
+        width, height = self.epd.width, self.epd.height
+        key = self._frame_key(content_key)
+        frame = self.frame_cache.open(key, width, height)
+        if frame is None:
+            # 图片库存有预量化面板帧时直接映射，跳过解码与量化
+            packed_path = du.packed_frame_path(width, height, PANEL_FRAME_VERSION)
+            frame = open_frame_file(packed_path, width, height) if packed_path else None
+            if frame is not None:
+                print("Displaying stored panel frame on e-paper...")
+        else:
+            print("Displaying cached frame on e-paper...")
+
+        try:
+            if frame is not None:
+                with frame:
+                    return self._push_buffer(frame.payload)
+            if image is None:
+                image = du.get_image()
+            with self._buffer_lock:
+                buffer = self._getbuffer_reuse(image)
+                self.frame_cache.put(key, buffer, width, height)
+            return self._push_buffer(buffer)
+        except Exception as e:
+            raise RuntimeError(f"Error displaying image on EPD: {e}")
+
+    def _push_buffer(self, buffer):
+        """
+        推送打包好的缓冲区并刷新；与屏幕当前内容相同则跳过刷新
+        :param buffer: bytearray 或指向 mmap 帧文件的 memoryview
+        :return: 是否执行了刷新
+        """
+        digest = hashlib.sha1(buffer).hexdigest()
+        now = time.time()
+        forced = (
+            EPD_FORCE_REFRESH_INTERVAL > 0
+            and now - self._last_refresh_at >= EPD_FORCE_REFRESH_INTERVAL
+        )
+        unchanged = digest == self._last_digest
+        if unchanged and not forced:
+            print("Frame unchanged, skipping e-paper refresh")
+            self._refresh_stats["skipped"] += 1
+            return False
+
+        # 先清除摘要：刷新中途失败时屏幕内容未知
+        self._last_digest = None
+        self.epd.display_stream(buffer, EPD_SPI_CHUNK)
+        self._last_digest = digest
+        self._last_refresh_at = now
+        self._refresh_stats["refreshed"] += 1
+        if unchanged:
+            # 相同帧因防残影定期强制刷新
+            self._refresh_stats["forced"] += 1
+        return True
+
+    def display_image(self, image, supersedable=True):
+        """
+        显示图像并等待完成
         :param image: PIL.Image对象
+        :param supersedable: False 时不会被之后提交的任务覆盖（如关机白屏）
+        :return: 任务最终状态
         """
+        return self.submit_image(image, supersedable).wait()
+
+    def _show_image(self, image):
         if self.run_mode == 'debug':
             # 在debug模式下使用plt显示
-            self._display_with_plt(image)
+            return self._display_with_plt(image)
         else:
             # 在production模式下使用墨水屏驱动
-            self._display_with_epd(image)
+            return self._display_with_epd(image)
     
     def _display_with_plt(self, image):
         """
@@ -91,8 +310,8 @@ class DisplayService:
             # 转换图像为墨水屏驱动需要的格式
             with self._buffer_lock:
                 buffer = self._getbuffer_reuse(image)
-            # 显示图像
-            self.epd.display(buffer)
+            # 显示图像（与当前屏幕内容相同则跳过）
+            refreshed = self._push_buffer(buffer)
             # 释放内存，避免Zero内存不足
             try:
                 if hasattr(image, "close"):
@@ -101,24 +320,64 @@ class DisplayService:
                 del buffer
                 import gc
                 gc.collect()
+            return refreshed
         except Exception as e:
             raise RuntimeError(f"Error displaying image on EPD: {e}")
     
     def clear_display(self):
         """
         清除显示
+        :return: 任务最终状态；失败时为 failed
         """
+        try:
+            status = self.submit("clear").wait()
+        except Exception as e:
+            print(f"Error clearing EPD: {e}")
+            return "failed"
+        if status != "done":
+            print(f"EPD clear finished with status: {status}")
+        return status
+
+    def _clear(self):
         if self.run_mode == 'debug':
             print("Debug mode: Clear display")
-        else:
-            if self.epd is not None:
-                try:
-                    print("Clearing e-paper display...")
-                    self.epd.Clear()
-                    self.epd.sleep()
-                except Exception as e:
-                    print(f"Error clearing EPD: {e}")
+        elif self.epd is not None:
+            print("Clearing e-paper display...")
+            self._last_digest = None
+            self.epd.Clear()
+            self.epd.sleep()
     
+    def status(self):
+        """
+        显示服务状态，供监控使用
+        :return: 包含运行模式、任务队列、刷新/跳过计数与BUSY等待耗时直方图的字典
+        """
+        with self._job_cond:
+            queue = {
+                "current_job": self._current_job.to_dict() if self._current_job else None,
+                "pending_job": self._pending_job.to_dict() if self._pending_job else None,
+                "pending_fixed": [job.to_dict() for job in self._pending_fixed],
+                "superseded": self._superseded_count,
+            }
+        refresh = dict(self._refresh_stats)
+        refresh["force_interval"] = EPD_FORCE_REFRESH_INTERVAL
+        refresh["energy_saved_j"] = round(refresh["skipped"] * EPD_REFRESH_ENERGY_J, 1)
+        histograms = self.epd.busy_histograms() if self.epd is not None else {}
+        refresh_phase = histograms.get("refresh")
+        if refresh_phase and refresh_phase["count"]:
+            # 按实测平均刷新耗时估算节省的刷新时间
+            average = refresh_phase["sum"] / refresh_phase["count"]
+            refresh["seconds_saved"] = round(refresh["skipped"] * average, 1)
+        else:
+            refresh["seconds_saved"] = None
+        return {
+            "run_mode": self.run_mode,
+            "queue": queue,
+            "refresh": refresh,
+            "busy_histograms": histograms,
+            "render": get_render_service().status(),
+        }
+
     def get_run_mode(self):
         """
         获取当前运行模式
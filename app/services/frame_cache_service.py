@@ -0,0 +1,110 @@
+import hashlib
+import os
+import threading
+
+from app.config import BASE_DIR, FRAME_CACHE_MAX_MB
+from app.services.frame_file_service import open_frame_file, write_frame_file
+
+
+_digest_memo = {}
+_digest_lock = threading.Lock()
+_DIGEST_MEMO_LIMIT = 1024
+
+
+def file_digest(path):
+    """
+    文件内容 sha1，按 (path, mtime, size) 记忆，未变化的文件不重复读取
+    """
+    stat = os.stat(path)
+    memo_key = (path, stat.st_mtime_ns, stat.st_size)
+    with _digest_lock:
+        digest = _digest_memo.get(memo_key)
+    if digest is not None:
+        return digest
+
+    sha1 = hashlib.sha1()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1 << 16), b""):
+            sha1.update(chunk)
+    digest = sha1.hexdigest()
+
+    with _digest_lock:
+        if len(_digest_memo) >= _DIGEST_MEMO_LIMIT:
+            _digest_memo.clear()
+        _digest_memo[memo_key] = digest
+    return digest
+
+
+def evict_lru(directory, suffix, max_bytes, stale_suffixes=()):
+    """
+    按 mtime（访问时间）从旧到新删除 directory 下以 suffix 结尾的文件，直到总大小不超过 max_bytes
+    :param stale_suffixes: 旧版格式的文件后缀，扫描时直接删除
+    """
+    entries = []
+    total = 0
+    for entry in os.scandir(directory):
+        if stale_suffixes and entry.name.endswith(stale_suffixes):
+            try:
+                os.remove(entry.path)
+            except OSError:
+                pass
+            continue
+        if not entry.name.endswith(suffix):
+            continue
+        stat = entry.stat()
+        entries.append((stat.st_mtime, stat.st_size, entry.path))
+        total += stat.st_size
+    if total <= max_bytes:
+        return
+    entries.sort()
+    for _, size, path in entries:
+        if total <= max_bytes:
+            break
+        try:
+            os.remove(path)
+            total -= size
+        except OSError:
+            pass
+
+
+class FrameCacheService:
+    """预渲染帧缓存：按内容键保存带头部的 4bpp 帧文件（见 frame_file_service），按总大小 LRU 淘汰"""
+
+    def __init__(self, max_bytes=None):
+        self.cache_dir = os.path.join(BASE_DIR, "storage", "frame_cache")
+        self.max_bytes = max_bytes if max_bytes is not None else FRAME_CACHE_MAX_MB * 1024 * 1024
+        self._lock = threading.Lock()
+        os.makedirs(self.cache_dir, exist_ok=True)
+
+    def _path(self, key):
+        return os.path.join(self.cache_dir, f"{key}.frame")
+
+    def contains(self, key):
+        return os.path.exists(self._path(key))
+
+    def open(self, key, width, height):
+        """
+        以 mmap 打开缓存帧，不把帧数据读入堆内存
+        :param key: 帧键
+        :param width: 面板宽度
+        :param height: 面板高度
+        :return: FrameFile（用完须 close）；未命中或头部不匹配返回 None
+        """
+        path = self._path(key)
+        frame = open_frame_file(path, width, height)
+        if frame is not None:
+            try:
+                # 更新 mtime 作为 LRU 访问时间
+                os.utime(path)
+            except OSError:
+                pass
+        return frame
+
+    def put(self, key, buffer, width, height):
+        write_frame_file(self._path(key), buffer, width, height)
+        self._evict()
+
+    def _evict(self):
+        with self._lock:
+            # .bin 为旧版无头部的缓存帧
+            evict_lru(self.cache_dir, ".frame", self.max_bytes, stale_suffixes=(".bin",))
@@ -0,0 +1,170 @@
+import mmap
+import os
+import struct
+import threading
+import zlib
+
+from app.services.image_processing_service import PANEL_FRAME_VERSION
+
+
+# 帧文件格式：64 字节头 + 原始 4bpp 打包数据（每字节两个像素，高半字节在前）
+FRAME_MAGIC = b"PPFR"
+FRAME_FORMAT_VERSION = 1
+FRAME_HEADER_SIZE = 64
+FRAME_BPP = 4
+# magic, 格式版本, bpp, 面板型号, 宽, 高, 调色板版本, 数据长度, 数据 crc32
+_HEADER = struct.Struct("<4sBB16sHH8sII")
+
+PANEL_MODEL = "epd7in3e"
+
+
+class FrameFileError(ValueError):
+    """帧文件损坏或与当前面板不匹配"""
+
+
+def frame_payload_size(width, height):
+    return width * height * FRAME_BPP // 8
+
+
+def pack_header(width, height, payload, model=PANEL_MODEL, palette_version=PANEL_FRAME_VERSION):
+    header = _HEADER.pack(
+        FRAME_MAGIC,
+        FRAME_FORMAT_VERSION,
+        FRAME_BPP,
+        model.encode("ascii")[:16],
+        width,
+        height,
+        palette_version.encode("ascii")[:8],
+        len(payload),
+        zlib.crc32(payload),
+    )
+    return header.ljust(FRAME_HEADER_SIZE, b"\0")
+
+
+def parse_header(data):
+    """
+    解析帧文件头
+    :param data: 至少 FRAME_HEADER_SIZE 字节
+    :return: {"model", "width", "height", "bpp", "palette_version", "payload_size", "crc32", "format_version"}
+    :raises FrameFileError: 不是帧文件或版本不支持
+    """
+    if len(data) < FRAME_HEADER_SIZE:
+        raise FrameFileError("Frame file too short")
+    magic, version, bpp, model, width, height, palette_version, payload_size, crc = _HEADER.unpack_from(data)
+    if magic != FRAME_MAGIC:
+        raise FrameFileError("Not a frame file")
+    if version != FRAME_FORMAT_VERSION:
+        raise FrameFileError(f"Unsupported frame format version {version}")
+    if bpp != FRAME_BPP:
+        raise FrameFileError(f"Unsupported bit depth {bpp}")
+    return {
+        "format_version": version,
+        "model": model.rstrip(b"\0").decode("ascii"),
+        "width": width,
+        "height": height,
+        "bpp": bpp,
+        "palette_version": palette_version.rstrip(b"\0").decode("ascii"),
+        "payload_size": payload_size,
+        "crc32": crc,
+    }
+
+
+def write_frame_file(path, payload, width, height, model=PANEL_MODEL, palette_version=PANEL_FRAME_VERSION):
+    """
+    原子写入帧文件
+    :param payload: 打包好的 4bpp 数据（bytes / bytearray / memoryview）
+    """
+    if len(payload) != frame_payload_size(width, height):
+        raise FrameFileError(f"Payload is {len(payload)} bytes, expected {frame_payload_size(width, height)}")
+    tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+    with open(tmp_path, "wb") as f:
+        f.write(pack_header(width, height, payload, model, palette_version))
+        f.write(payload)
+    os.replace(tmp_path, path)
+
+
+class FrameFile:
+    """只读 mmap 打开的帧文件；payload 为指向映射区的 memoryview，不复制到堆上"""
+
+    def __init__(self, path):
+        self.path = path
+        self._file = open(path, "rb")
+        try:
+            self._mmap = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+        except ValueError:
+            # 空文件无法映射
+            self._file.close()
+            raise FrameFileError("Frame file is empty")
+        try:
+            self.header = parse_header(self._mmap)
+            end = FRAME_HEADER_SIZE + self.header["payload_size"]
+            if len(self._mmap) != end:
+                raise FrameFileError(f"Frame file is {len(self._mmap)} bytes, header says {end}")
+        except FrameFileError:
+            self.close()
+            raise
+        self.payload = memoryview(self._mmap)[FRAME_HEADER_SIZE:end]
+
+    def matches(self, width, height, model=PANEL_MODEL, palette_version=PANEL_FRAME_VERSION):
+        header = self.header
+        return (
+            header["width"] == width
+            and header["height"] == height
+            and header["model"] == model
+            and header["palette_version"] == palette_version
+            and header["payload_size"] == frame_payload_size(width, height)
+        )
+
+    def close(self):
+        payload = getattr(self, "payload", None)
+        if payload is not None:
+            payload.release()
+            self.payload = None
+        if self._mmap is not None:
+            self._mmap.close()
+            self._mmap = None
+        self._file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def open_frame_file(path, width, height, model=PANEL_MODEL, palette_version=PANEL_FRAME_VERSION):
+    """
+    打开并校验与当前面板匹配的帧文件
+    :return: FrameFile；文件缺失、损坏或不匹配返回 None
+    """
+    try:
+        frame = FrameFile(path)
+    except (OSError, FrameFileError):
+        return None
+    if not frame.matches(width, height, model, palette_version):
+        frame.close()
+        return None
+    return frame
+
+
+def validate_frame_file(path, width=None, height=None, model=None, palette_version=None, check_crc=True):
+    """
+    完整校验帧文件（头部、长度、crc32 及可选的面板参数）
+    :return: 头部信息
+    :raises FrameFileError: 校验失败
+    """
+    try:
+        frame = FrameFile(path)
+    except OSError as e:
+        raise FrameFileError(str(e))
+    with frame:
+        header = dict(frame.header)
+        expected = {"width": width, "height": height, "model": model, "palette_version": palette_version}
+        for field, value in expected.items():
+            if value is not None and header[field] != value:
+                raise FrameFileError(f"{field} is {header[field]!r}, expected {value!r}")
+        if header["payload_size"] != frame_payload_size(header["width"], header["height"]):
+            raise FrameFileError("Payload size does not match dimensions")
+        if check_crc and zlib.crc32(frame.payload) != header["crc32"]:
+            raise FrameFileError("Payload checksum mismatch")
+    return header
@@ -0,0 +1,96 @@
+import threading
+from urllib.parse import urlsplit
+
+import requests
+from PIL import ImageFile
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+from app.config import (
+    HTTP_POOL_SIZE,
+    HTTP_RETRIES,
+    HTTP_BACKOFF,
+    HTTP_CONNECT_TIMEOUT,
+    HTTP_READ_TIMEOUT,
+    HTTP_HOST_TIMEOUTS,
+)
+
+
+# 流式下载图片时每次读取的字节数
+CHUNK_SIZE = 64 * 1024
+
+
+def _parse_host_timeouts(spec):
+    """
+    解析 "host后缀=读超时,..."（如 "aliyuncs.com=120,qweatherapi.com=10"）
+    :return: [(host后缀, 读超时秒数)]，长后缀优先匹配
+    """
+    timeouts = []
+    for part in (spec or "").split(","):
+        suffix, _, value = part.strip().partition("=")
+        if suffix and value:
+            timeouts.append((suffix.lower(), float(value)))
+    timeouts.sort(key=lambda item: len(item[0]), reverse=True)
+    return timeouts
+
+
+class HttpService:
+    """共享 HTTP 会话：keep-alive 连接池、失败重试退避、按主机超时，图片流式解码"""
+
+    def __init__(self):
+        self.host_timeouts = _parse_host_timeouts(HTTP_HOST_TIMEOUTS)
+        self.session = requests.Session()
+        retry = Retry(
+            total=HTTP_RETRIES,
+            connect=HTTP_RETRIES,
+            read=HTTP_RETRIES,
+            status=HTTP_RETRIES,
+            backoff_factor=HTTP_BACKOFF,
+            status_forcelist=(429, 500, 502, 503, 504),
+            allowed_methods=frozenset(["GET", "HEAD"]),
+            raise_on_status=False,
+        )
+        adapter = HTTPAdapter(pool_connections=HTTP_POOL_SIZE, pool_maxsize=HTTP_POOL_SIZE, max_retries=retry)
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+
+    def timeout_for(self, url):
+        """
+        按主机后缀选择 (连接超时, 读超时)
+        """
+        host = (urlsplit(url).hostname or "").lower()
+        for suffix, read_timeout in self.host_timeouts:
+            if host == suffix or host.endswith("." + suffix):
+                return HTTP_CONNECT_TIMEOUT, read_timeout
+        return HTTP_CONNECT_TIMEOUT, HTTP_READ_TIMEOUT
+
+    def get(self, url, **kwargs):
+        kwargs.setdefault("timeout", self.timeout_for(url))
+        return self.session.get(url, **kwargs)
+
+    def fetch_image(self, url, **kwargs):
+        """
+        流式下载并增量解码图片，不在内存中保留完整响应体
+        :param url: 图片 URL
+        :return: 已完成解码的 PIL Image
+        """
+        with self.get(url, stream=True, **kwargs) as response:
+            response.raise_for_status()
+            parser = ImageFile.Parser()
+            for chunk in response.iter_content(chunk_size=CHUNK_SIZE):
+                parser.feed(chunk)
+            image = parser.close()
+        image.load()
+        return image
+
+
+_http_service = None
+_http_service_lock = threading.Lock()
+
+
+def get_http_service():
+    global _http_service
+    with _http_service_lock:
+        if _http_service is None:
+            _http_service = HttpService()
+    return _http_service
@@ -1,25 +1,87 @@
+import itertools
 import threading
 import queue
+import time
 import uuid
+from concurrent.futures import CancelledError
+
+from app.config import (
+    IMAGE_GEN_WORKERS,
+    IMAGE_GEN_RATE_PER_MIN,
+    IMAGE_GEN_BURST,
+    IMAGE_GEN_TIMEOUT,
+    IMAGE_GEN_DEDUPE_TTL,
+)
+
+
+# 数值越小越先执行：界面交互请求优先于定时预生成
+PRIORITY_INTERACTIVE = 0
+PRIORITY_NORMAL = 5
+PRIORITY_SCHEDULED = 10
+
+# 排队等待耗时直方图上界（秒）
+WAIT_BUCKETS = (1, 5, 15, 30, 60, 120, 300)
 
 
 class ImageGenTask:
-    def __init__(self, func, args, kwargs):
+    def __init__(self, func, args, kwargs, priority=PRIORITY_NORMAL, timeout=None):
         self.id = uuid.uuid4().hex
         self.func = func
         self.args = args
         self.kwargs = kwargs
+        self.priority = priority
+        self.timeout = timeout
+        self.status = "pending"
+        self.submitted_at = time.time()
+        self.started_at = None
+        self.finished_at = None
         self._event = threading.Event()
+        self._lock = threading.Lock()
+        self._timer = None
         self._result = None
         self._error = None
 
+    def _finish(self, status, result=None, error=None):
+        # 只有第一次结束生效：超时/取消后迟到的结果被丢弃
+        with self._lock:
+            if self._event.is_set():
+                return False
+            self.status = status
+            self._result = result
+            self._error = error
+            self.finished_at = time.time()
+            self._event.set()
+        if self._timer is not None:
+            self._timer.cancel()
+        return True
+
+    def _start(self):
+        with self._lock:
+            if self._event.is_set() or self.status != "pending":
+                return False
+            self.status = "running"
+            self.started_at = time.time()
+            return True
+
     def set_result(self, result):
-        self._result = result
-        self._event.set()
+        return self._finish("done", result=result)
 
     def set_error(self, error):
-        self._error = error
-        self._event.set()
+        return self._finish("failed", error=error)
+
+    def cancel(self):
+        """
+        取消任务：排队中的任务不再执行；执行中的任务结果被丢弃
+        :return: 是否成功取消（已结束的任务返回 False）
+        """
+        return self._finish("cancelled", error=CancelledError(f"Image generation task {self.id} cancelled"))
+
+    def expire(self):
+        return self._finish("timeout", error=TimeoutError(f"Image generation task {self.id} timed out"))
+
+    @property
+    def done(self):
+        return self._event.is_set()
 
     def wait(self, timeout=None):
         self._event.wait(timeout)
@@ -27,37 +89,260 @@ class ImageGenTask:
             raise self._error
         return self._result
 
+    def to_dict(self):
+        return {
+            "id": self.id,
+            "status": self.status,
+            "priority": self.priority,
+            "submitted_at": self.submitted_at,
+            "started_at": self.started_at,
+            "finished_at": self.finished_at,
+            "error": str(self._error) if self._error else None,
+        }
+
+
+class _TokenBucket:
+    """令牌桶限流：按配额匀速补充，允许 burst 个请求突发"""
+
+    def __init__(self, rate_per_min, capacity):
+        self.rate = rate_per_min / 60.0
+        self.capacity = max(1, capacity)
+        self._tokens = float(self.capacity)
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self):
+        """
+        取得一个令牌，不足时阻塞等待
+        :return: 因限流等待的秒数
+        """
+        if self.rate <= 0:
+            return 0.0
+        waited = 0.0
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+                self._updated = now
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return waited
+                delay = (1 - self._tokens) / self.rate
+            time.sleep(delay)
+            waited += delay
+
+
+class _Flight:
+    """一次实际执行：相同键的任务共享同一个 flight 及其结果"""
+
+    def __init__(self, key, task):
+        self.key = key
+        self.func = task.func
+        self.args = task.args
+        self.kwargs = task.kwargs
+        self.priority = task.priority
+        self.waiters = [task]
+        self.started = False
+
 
 class ImageGenQueueService:
-    def __init__(self):
-        self._queue = queue.Queue()
-        self._worker = None
+    """文生图任务池：N 个工作线程按优先级取任务，令牌桶限制 DashScope 调用速率，相同请求合并执行"""
+
+    def __init__(self, workers=None, rate_per_min=None, burst=None, default_timeout=None, dedupe_ttl=None):
+        self.workers = workers or IMAGE_GEN_WORKERS
+        self.default_timeout = IMAGE_GEN_TIMEOUT if default_timeout is None else default_timeout
+        self.dedupe_ttl = IMAGE_GEN_DEDUPE_TTL if dedupe_ttl is None else dedupe_ttl
+        self._queue = queue.PriorityQueue()
+        self._seq = itertools.count()
+        self._bucket = _TokenBucket(
+            IMAGE_GEN_RATE_PER_MIN if rate_per_min is None else rate_per_min,
+            IMAGE_GEN_BURST if burst is None else burst,
+        )
+        self._threads = []
         self._lock = threading.Lock()
+        self._pending = set()
+        self._inflight = {}
+        self._results = {}
+        self._running = 0
+        self._stats = {
+            "submitted": 0, "done": 0, "failed": 0, "cancelled": 0, "timeout": 0,
+            "coalesced": 0, "cache_hits": 0, "calls": 0,
+        }
+        self._wait_stats = {"count": 0, "sum": 0.0, "max": 0.0, "throttled": 0.0}
+        self._wait_buckets = [0] * (len(WAIT_BUCKETS) + 1)
 
     def _ensure_worker(self):
         with self._lock:
-            if self._worker and self._worker.is_alive():
-                return
-            self._worker = threading.Thread(target=self._run, daemon=True)
-            self._worker.start()
+            self._threads = [t for t in self._threads if t.is_alive()]
+            while len(self._threads) < self.workers:
+                thread = threading.Thread(target=self._run, daemon=True)
+                thread.start()
+                self._threads.append(thread)
+
+    def _record_wait(self, waited, throttled):
+        with self._lock:
+            self._wait_stats["count"] += 1
+            self._wait_stats["sum"] += waited
+            self._wait_stats["max"] = max(self._wait_stats["max"], waited)
+            self._wait_stats["throttled"] += throttled
+            for i, bound in enumerate(WAIT_BUCKETS):
+                if waited <= bound:
+                    self._wait_buckets[i] += 1
+                    break
+            else:
+                self._wait_buckets[-1] += 1
+
+    def _count(self, status):
+        with self._lock:
+            self._stats[status] += 1
+
+    def _claim(self, flight):
+        """
+        认领 flight：已执行过（优先级提升导致的重复条目）或等待方全部取消/超时时返回 False
+        """
+        with self._lock:
+            if flight.started:
+                return False
+            flight.started = True
+            self._pending.discard(flight)
+            if all(task.done for task in flight.waiters):
+                if self._inflight.get(flight.key) is flight:
+                    del self._inflight[flight.key]
+                return False
+            return True
 
     def _run(self):
         while True:
-            task = self._queue.get()
+            _, _, flight = self._queue.get()
             try:
-                result = task.func(*task.args, **task.kwargs)
-                task.set_result(result)
-            except Exception as e:
-                task.set_error(e)
+                if not self._claim(flight):
+                    continue
+                throttled = self._bucket.acquire()
+                with self._lock:
+                    waiters = list(flight.waiters)
+                    self._running += 1
+                    self._stats["calls"] += 1
+                started = [task for task in waiters if task._start()]
+                if started:
+                    first = min(task.submitted_at for task in started)
+                    self._record_wait(started[0].started_at - first, throttled)
+                try:
+                    result, error = flight.func(*flight.args, **flight.kwargs), None
+                except Exception as e:
+                    result, error = None, e
+                with self._lock:
+                    self._running -= 1
+                    if flight.key is not None:
+                        if self._inflight.get(flight.key) is flight:
+                            del self._inflight[flight.key]
+                        if error is None and self.dedupe_ttl > 0:
+                            now = time.monotonic()
+                            for stale in [k for k, (expires_at, _) in self._results.items() if expires_at <= now]:
+                                del self._results[stale]
+                            self._results[flight.key] = (now + self.dedupe_ttl, result)
+                    # 执行期间加入的等待方同样获得结果
+                    waiters = list(flight.waiters)
+                for task in waiters:
+                    if error is None:
+                        if task.set_result(result):
+                            self._count("done")
+                    elif task.set_error(error):
+                        self._count("failed")
             finally:
                 self._queue.task_done()
 
-    def submit(self, func, *args, **kwargs):
+    def _expire(self, task):
+        if task.expire():
+            self._count("timeout")
+
+    def _cached_result(self, key):
+        entry = self._results.get(key)
+        if entry is None:
+            return False, None
+        expires_at, result = entry
+        if expires_at <= time.monotonic():
+            del self._results[key]
+            return False, None
+        return True, result
+
+    def submit(self, func, args=(), kwargs=None, priority=PRIORITY_NORMAL, timeout=None, key=None):
+        """
+        提交任务
+        :param args: func 的位置参数
+        :param kwargs: func 的关键字参数（与队列自身的 priority / timeout / key 互不冲突）
+        :param priority: PRIORITY_INTERACTIVE / PRIORITY_NORMAL / PRIORITY_SCHEDULED，越小越先执行
+        :param timeout: 从提交起的总时限（秒），默认 IMAGE_GEN_TIMEOUT；0 表示不限
+        :param key: 合并键；相同键的任务共享同一次执行，成功结果在 IMAGE_GEN_DEDUPE_TTL 秒内直接复用
+        :return: ImageGenTask
+        """
         self._ensure_worker()
-        task = ImageGenTask(func, args, kwargs)
-        self._queue.put(task)
+        if timeout is None:
+            timeout = self.default_timeout
+        task = ImageGenTask(func, tuple(args), dict(kwargs or {}), priority=priority, timeout=timeout or None)
+
+        with self._lock:
+            self._stats["submitted"] += 1
+            if key is not None:
+                hit, result = self._cached_result(key)
+                if hit:
+                    self._stats["cache_hits"] += 1
+                    task.set_result(result)
+                    return task
+
+            flight = self._inflight.get(key) if key is not None else None
+            if flight is not None:
+                self._stats["coalesced"] += 1
+                flight.waiters.append(task)
+                if priority < flight.priority and not flight.started:
+                    # 提升优先级：重新入队，旧条目出队时因已认领而跳过
+                    flight.priority = priority
+                    self._queue.put((priority, next(self._seq), flight))
+            else:
+                flight = _Flight(key, task)
+                if key is not None:
+                    self._inflight[key] = flight
+                self._pending.add(flight)
+                self._queue.put((priority, next(self._seq), flight))
+
+        if task.timeout:
+            # 到期即唤醒等待方（排队中或执行中）；执行中的调用无法中断，其结果被丢弃
+            task._timer = threading.Timer(task.timeout, self._expire, args=(task,))
+            task._timer.daemon = True
+            task._timer.start()
         return task
 
+    def cancel(self, task):
+        """
+        取消任务；与其合并的其他任务不受影响，全部等待方取消后该次调用不再执行
+        """
+        if task.cancel():
+            self._count("cancelled")
+            return True
+        return False
+
+    def status(self):
+        """
+        队列状态：排队深度、执行中数量、结果计数与排队等待耗时
+        """
+        with self._lock:
+            wait = dict(self._wait_stats)
+            wait["avg"] = round(wait["sum"] / wait["count"], 3) if wait["count"] else None
+            wait["buckets"] = {
+                **{f"le_{bound}": count for bound, count in zip(WAIT_BUCKETS, self._wait_buckets)},
+                "inf": self._wait_buckets[-1],
+            }
+            return {
+                "workers": self.workers,
+                "rate_per_min": self._bucket.rate * 60,
+                "burst": self._bucket.capacity,
+                "queue_depth": len(self._pending),
+                "running": self._running,
+                "inflight_keys": len(self._inflight),
+                "cached_results": len(self._results),
+                "tasks": dict(self._stats),
+                "wait_seconds": wait,
+            }
+
 
 _QUEUE = ImageGenQueueService()
 
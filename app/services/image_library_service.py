@@ -1,12 +1,88 @@
+import hashlib
 import json
 import os
-import shutil
+import sqlite3
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
 from datetime import datetime
 from uuid import uuid4
 
-from PIL import Image, ImageDraw
-
-from app.config import BASE_DIR, SCREEN_WIDTH, SCREEN_HEIGHT
+from PIL import Image, ImageDraw, features
+
+from app.config import (
+    BASE_DIR,
+    SCREEN_WIDTH,
+    SCREEN_HEIGHT,
+    LIBRARY_FORMAT,
+    LIBRARY_PANEL_FRAMES,
+    LIBRARY_MIGRATE,
+    UPLOAD_WORKERS,
+    DEDUP_PHASH_DISTANCE,
+)
+from app.services.frame_cache_service import file_digest
+from app.services.frame_file_service import write_frame_file
+from app.services.image_processing_service import PANEL_FRAME_VERSION, dhash, phash, pixel_digest
+from app.services.perceptual_hash_service import HammingIndex
+from app.services.rendition_service import RenditionService
+from app.services.render_service import get_render_service
+from app.services.upload_service import open_upload_image
+
+
+# 每个线程每个数据库文件复用一个连接
+_local = threading.local()
+_schema_lock = threading.Lock()
+_schema_ready = set()
+
+# 原图存储格式：扩展名 -> (PIL 格式, mimetype, 编码参数)
+LIBRARY_FORMATS = {
+    "png": ("PNG", "image/png", {"compress_level": 6}),
+    "bmp": ("BMP", "image/bmp", {}),
+}
+if features.check("webp"):
+    LIBRARY_FORMATS["webp"] = ("WEBP", "image/webp", {"lossless": True, "method": 4})
+
+if LIBRARY_FORMAT in LIBRARY_FORMATS:
+    STORAGE_FORMAT = LIBRARY_FORMAT
+else:
+    STORAGE_FORMAT = "webp" if "webp" in LIBRARY_FORMATS else "png"
+
+# 覆盖写入原图（update_item / 迁移）互斥，避免旧内容覆盖新内容
+_write_lock = threading.Lock()
+_migration = {"running": False, "pending": 0, "migrated": 0, "failed": 0, "saved_bytes": 0, "last_error": None}
+_migration_lock = threading.Lock()
+
+# 内容寻址存储：原图按规范化像素哈希命名（blob），多个条目共享同一 blob，按引用计数回收
+# 检查 blob 文件是否存在与回收删除文件互斥，避免刚被重新引用的 blob 被删除
+_blob_lock = threading.Lock()
+# 每个数据库一个 pHash 汉明距离索引，首次查询时从 blobs 表加载
+_phash_indexes = {}
+_phash_index_lock = threading.Lock()
+
+# 批量上传的解码线程池（进程内共享，限制同时解码的大图数量）
+_upload_executor = None
+_upload_executor_lock = threading.Lock()
+
+
+def _get_upload_executor():
+    global _upload_executor
+    with _upload_executor_lock:
+        if _upload_executor is None:
+            _upload_executor = ThreadPoolExecutor(max_workers=max(1, UPLOAD_WORKERS), thread_name_prefix="upload")
+    return _upload_executor
+
+
+def library_format(filename):
+    """
+    :return: 原图文件的格式名（扩展名），如 webp / png / bmp
+    """
+    return os.path.splitext(filename)[1].lstrip(".").lower()
+
+
+def library_mimetype(filename):
+    entry = LIBRARY_FORMATS.get(library_format(filename))
+    return entry[1] if entry else "application/octet-stream"
 
 
 class ImageLibraryService:
@@ -15,30 +91,147 @@ class ImageLibraryService:
     def __init__(self):
         self.storage_dir = os.path.join(BASE_DIR, "storage")
         self.library_dir = os.path.join(BASE_DIR, "pic", "library")
+        self.db_file = os.path.join(self.storage_dir, "image_library.db")
+        # 旧版 JSON 元数据，首次打开数据库时迁移
         self.library_file = os.path.join(self.storage_dir, "image_library.json")
 
         os.makedirs(self.storage_dir, exist_ok=True)
         os.makedirs(self.library_dir, exist_ok=True)
 
-        if not os.path.exists(self.library_file):
-            with open(self.library_file, "w", encoding="utf-8") as f:
-                json.dump({}, f)
-
-    def _load(self):
-        with open(self.library_file, "r", encoding="utf-8") as f:
-            return json.load(f)
+        self.rendition_service = RenditionService()
+        self._ensure_schema()
+
+    def _connect(self):
+        connections = getattr(_local, "connections", None)
+        if connections is None:
+            connections = _local.connections = {}
+        conn = connections.get(self.db_file)
+        if conn is None:
+            conn = sqlite3.connect(self.db_file, timeout=30, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            connections[self.db_file] = conn
+        return conn
+
+    @contextmanager
+    def _transaction(self):
+        # BEGIN IMMEDIATE 先取写锁，读-改-写期间不会与其他写入者交错
+        conn = self._connect()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            yield conn
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+        conn.execute("COMMIT")
+
+    def _ensure_schema(self):
+        with _schema_lock:
+            if self.db_file in _schema_ready:
+                return
+            with self._transaction() as conn:
+                conn.execute(
+                    "CREATE TABLE IF NOT EXISTS images ("
+                    "id TEXT PRIMARY KEY, status TEXT, source_id TEXT, "
+                    "created_at TEXT, data TEXT NOT NULL)"
+                )
+                conn.execute("CREATE INDEX IF NOT EXISTS idx_images_status ON images(status)")
+                conn.execute("CREATE INDEX IF NOT EXISTS idx_images_source_id ON images(source_id)")
+                conn.execute("CREATE INDEX IF NOT EXISTS idx_images_created_at ON images(created_at)")
+                conn.execute("CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT)")
+                columns = {row[1] for row in conn.execute("PRAGMA table_info(images)")}
+                if "blob" not in columns:
+                    conn.execute("ALTER TABLE images ADD COLUMN blob TEXT")
+                conn.execute("CREATE INDEX IF NOT EXISTS idx_images_blob ON images(blob)")
+                # refs 为引用该 blob 的条目数；data 为共享字段（filename / etag / panel / renditions 等）
+                conn.execute(
+                    "CREATE TABLE IF NOT EXISTS blobs ("
+                    "hash TEXT PRIMARY KEY, refs INTEGER NOT NULL, dhash TEXT, phash TEXT, data TEXT)"
+                )
+                # 上传原文件摘要 -> blob，重复上传同一文件时跳过解码
+                conn.execute("CREATE TABLE IF NOT EXISTS sources (digest TEXT PRIMARY KEY, blob TEXT NOT NULL)")
+                conn.execute("CREATE INDEX IF NOT EXISTS idx_sources_blob ON sources(blob)")
+                migrated = self._migrate_json(conn)
+            if migrated:
+                os.replace(self.library_file, self.library_file + ".migrated")
+            _schema_ready.add(self.db_file)
+
+    def _migrate_json(self, conn):
+        row = conn.execute("SELECT value FROM meta WHERE key = 'json_migrated'").fetchone()
+        if row:
+            return False
+        migrated = False
+        if os.path.exists(self.library_file):
+            with open(self.library_file, "r", encoding="utf-8") as f:
+                data = json.load(f)
+            for item in data.values():
+                self._insert(conn, item, replace=False)
+            migrated = True
+        conn.execute("INSERT INTO meta (key, value) VALUES ('json_migrated', ?)", (datetime.utcnow().isoformat() + "Z",))
+        return migrated
+
+    @staticmethod
+    def _insert(conn, item, replace=True):
+        verb = "INSERT OR REPLACE" if replace else "INSERT OR IGNORE"
+        conn.execute(
+            f"{verb} INTO images (id, status, source_id, created_at, blob, data) VALUES (?, ?, ?, ?, ?, ?)",
+            (
+                item["id"],
+                item.get("status"),
+                item.get("source_id"),
+                item.get("created_at"),
+                item.get("blob"),
+                json.dumps(item, ensure_ascii=False),
+            ),
+        )
 
-    def _save(self, data):
-        with open(self.library_file, "w", encoding="utf-8") as f:
-            json.dump(data, f, indent=2, ensure_ascii=False)
+    def _add_item(self, item):
+        try:
+            with self._transaction() as conn:
+                self._insert(conn, item)
+        except Exception:
+            self.release_items([item])
+            raise
+        return item
 
-    def list_images(self):
-        data = self._load()
-        return list(data.values())
+    def add_items(self, items):
+        """
+        在同一个事务内写入多条元数据，ID 已存在的条目跳过并释放其 blob 引用
+        :return: 实际写入的条目列表
+        """
+        added = []
+        with self._transaction() as conn:
+            skipped = []
+            for item in items:
+                before = conn.total_changes
+                self._insert(conn, item, replace=False)
+                if conn.total_changes != before:
+                    added.append(item)
+                else:
+                    skipped.append(item.get("blob"))
+            dead = self._release(conn, skipped)
+        self._collect(dead)
+        return added
+
+    def list_images(self, status=None):
+        conn = self._connect()
+        if status:
+            rows = conn.execute(
+                "SELECT data FROM images WHERE status = ? ORDER BY created_at, rowid", (status,)
+            ).fetchall()
+        else:
+            rows = conn.execute("SELECT data FROM images ORDER BY created_at, rowid").fetchall()
+        return [json.loads(row[0]) for row in rows]
+
+    def list_by_source(self, source_id):
+        rows = self._connect().execute(
+            "SELECT data FROM images WHERE source_id = ? ORDER BY created_at, rowid", (source_id,)
+        ).fetchall()
+        return [json.loads(row[0]) for row in rows]
 
     def get_image(self, image_id):
-        data = self._load()
-        return data.get(image_id)
+        row = self._connect().execute("SELECT data FROM images WHERE id = ?", (image_id,)).fetchone()
+        return json.loads(row[0]) if row else None
 
     def get_image_path(self, image_id):
         item = self.get_image(image_id)
@@ -46,80 +239,433 @@ class ImageLibraryService:
             return None
         return os.path.join(self.library_dir, item["filename"])
 
-    def delete_images(self, image_ids):
-        data = self._load()
-        deleted = 0
-        for image_id in image_ids:
-            item = data.pop(image_id, None)
-            if item:
-                deleted += 1
-                path = os.path.join(self.library_dir, item["filename"])
-                try:
-                    if os.path.exists(path):
-                        os.remove(path)
-                except OSError:
-                    pass
-        self._save(data)
-        return deleted
-
-    def add_upload(self, file_storage):
-        if file_storage is None or file_storage.filename == "":
-            raise ValueError("No file provided")
+    def _write_file(self, path, data):
+        tmp_path = f"{path}.{threading.get_ident()}.tmp"
+        with open(tmp_path, "wb") as f:
+            f.write(data)
+        os.replace(tmp_path, path)
+
+    def _write_blob(self, key, image, panel=True):
+        """
+        写入 blob 文件：按 STORAGE_FORMAT 保存原图（原子替换）、按配置附带 4bpp 面板帧，并生成缩略图
+        :param key: blob 哈希
+        :param image: 已缩放到屏幕尺寸的图像
+        :param panel: 是否生成面板帧（占位图不生成）
+        :return: blob 共享字段（filename / etag / file_size / modified_at / panel / renditions）
+        """
+        pil_format, _, params = LIBRARY_FORMATS[STORAGE_FORMAT]
+        filename = f"{key}.{STORAGE_FORMAT}"
+        path = os.path.join(self.library_dir, filename)
+        self._write_file(path, get_render_service().encode(image, pil_format, **params))
+        return {
+            "filename": filename,
+            **self._file_fields(path),
+            **self._write_panel(key, image, panel),
+            "renditions": self.rendition_service.generate(key, image),
+        }
 
-        image = Image.open(file_storage.stream)
-        image = image.convert("RGB")
-        resized = image.resize((SCREEN_WIDTH, SCREEN_HEIGHT), Image.LANCZOS)
+    def _blob_paths(self, fields):
+        paths = []
+        if fields.get("filename"):
+            paths.append(os.path.join(self.library_dir, fields["filename"]))
+        if fields.get("panel"):
+            paths.append(os.path.join(self.library_dir, fields["panel"]["file"]))
+        paths.extend(self.rendition_service.path(entry) for entry in (fields.get("renditions") or {}).values())
+        return paths
+
+    def _blob_ready_locked(self, fields):
+        # 调用方持有 _blob_lock：原图、面板帧与缩略图均存在
+        return bool(fields.get("filename")) and all(os.path.exists(path) for path in self._blob_paths(fields))
+
+    def _blob_ready(self, fields):
+        with _blob_lock:
+            return self._blob_ready_locked(fields)
+
+    def _acquire_blob(self, image, panel=True, source_digest=None):
+        """
+        取得规范化图片的 blob 引用：相同像素的 blob 已存在时只增加引用计数，不再编码、写文件
+        :param image: 已缩放到屏幕尺寸的 RGB 图像
+        :param panel: 新建 blob 时是否生成面板帧
+        :param source_digest: 上传原文件摘要，记录后重复上传同一文件可跳过解码
+        :return: 条目字段（blob 及 blob 共享字段）
+        """
+        key = pixel_digest(image)
+        with self._transaction() as conn:
+            row = conn.execute("SELECT data, phash FROM blobs WHERE hash = ?", (key,)).fetchone()
+            if row:
+                conn.execute("UPDATE blobs SET refs = refs + 1 WHERE hash = ?", (key,))
+                value = int(row[1], 16) if row[1] else phash(image)
+            else:
+                value = phash(image)
+                conn.execute(
+                    "INSERT INTO blobs (hash, refs, dhash, phash) VALUES (?, 1, ?, ?)",
+                    (key, f"{dhash(image):016x}", f"{value:016x}"),
+                )
+            if source_digest:
+                conn.execute("INSERT OR REPLACE INTO sources (digest, blob) VALUES (?, ?)", (source_digest, key))
+
+        fields = json.loads(row[0]) if row and row[0] else None
+        written = fields is None or not self._blob_ready(fields)
+        if written:
+            # 新 blob，或并发创建者尚未写完 / 文件丢失：在锁外编码写入（内容相同，原子替换可重复执行）
+            fields = self._write_blob(key, image, panel)
+        with _blob_lock:
+            # 本次插入行之前开始的 _collect 可能已删除刚写入的文件（或索引项）：行已存在后的回收会跳过，
+            # 此处在锁内确认文件齐全，缺失则重写
+            if not self._blob_ready_locked(fields):
+                fields = self._write_blob(key, image, panel)
+                written = True
+            if written:
+                with self._transaction() as conn:
+                    conn.execute(
+                        "UPDATE blobs SET data = ? WHERE hash = ?", (json.dumps(fields, ensure_ascii=False), key)
+                    )
+            self._phash_index().add(key, value)
+        return {"blob": key, **fields}
+
+    def _acquire_existing(self, key=None, source_digest=None):
+        """
+        按 blob 哈希或上传原文件摘要直接增加已有 blob 的引用，无需解码
+        :return: 条目字段；blob 不存在或文件缺失返回 None
+        """
+        with self._transaction() as conn:
+            if source_digest:
+                row = conn.execute(
+                    "SELECT b.hash, b.data FROM sources s JOIN blobs b ON b.hash = s.blob WHERE s.digest = ?",
+                    (source_digest,),
+                ).fetchone()
+            else:
+                row = conn.execute("SELECT hash, data FROM blobs WHERE hash = ?", (key,)).fetchone()
+            if not row or not row[1]:
+                return None
+            conn.execute("UPDATE blobs SET refs = refs + 1 WHERE hash = ?", (row[0],))
+        fields = {"blob": row[0], **json.loads(row[1])}
+        if not self._blob_ready(fields):
+            self.release_items([fields])
+            return None
+        return fields
+
+    def _release(self, conn, keys):
+        """
+        在调用方事务内减少 blob 引用计数，计数归零的 blob 行随之删除
+        :return: 归零的 [(blob 哈希, 共享字段)]，提交后交给 _collect 删除文件
+        """
+        dead = []
+        for key in keys:
+            if not key:
+                continue
+            conn.execute("UPDATE blobs SET refs = refs - 1 WHERE hash = ?", (key,))
+            row = conn.execute("SELECT refs, data FROM blobs WHERE hash = ?", (key,)).fetchone()
+            if row and row[0] <= 0:
+                conn.execute("DELETE FROM blobs WHERE hash = ?", (key,))
+                conn.execute("DELETE FROM sources WHERE blob = ?", (key,))
+                dead.append((key, json.loads(row[1]) if row[1] else {}))
+        return dead
+
+    def _collect(self, dead):
+        """
+        删除引用计数归零的 blob 文件；期间已被重新引用（行已重建）的跳过
+        """
+        if not dead:
+            return
+        conn = self._connect()
+        index = self._phash_index()
+        with _blob_lock:
+            for key, fields in dead:
+                if conn.execute("SELECT 1 FROM blobs WHERE hash = ?", (key,)).fetchone():
+                    continue
+                index.remove(key)
+                if fields.get("filename"):
+                    self._remove_file(os.path.join(self.library_dir, fields["filename"]))
+                self._remove_panel(key)
+                self.rendition_service.remove(fields.get("renditions"))
+                self.rendition_service.remove_transcoded(fields.get("etag"))
+
+    def release_items(self, items):
+        """
+        释放未写入元数据（或已删除）条目持有的 blob 引用
+        """
+        with self._transaction() as conn:
+            dead = self._release(conn, [item.get("blob") for item in items])
+        self._collect(dead)
+
+    def _update_blob(self, key, fields):
+        """
+        更新 blob 共享字段，并同步到引用它的全部条目
+        """
+        with self._transaction() as conn:
+            row = conn.execute("SELECT data FROM blobs WHERE hash = ?", (key,)).fetchone()
+            if not row:
+                return
+            data = json.loads(row[0]) if row[0] else {}
+            data.update(fields)
+            conn.execute("UPDATE blobs SET data = ? WHERE hash = ?", (json.dumps(data, ensure_ascii=False), key))
+            for (raw,) in conn.execute("SELECT data FROM images WHERE blob = ?", (key,)).fetchall():
+                item = json.loads(raw)
+                item.update(fields)
+                self._insert(conn, item)
+
+    def _phash_index(self):
+        with _phash_index_lock:
+            index = _phash_indexes.get(self.db_file)
+            if index is None:
+                index = HammingIndex(DEDUP_PHASH_DISTANCE)
+                for key, value in self._connect().execute("SELECT hash, phash FROM blobs WHERE phash IS NOT NULL"):
+                    index.add(key, int(value, 16))
+                _phash_indexes[self.db_file] = index
+        return index
+
+    def find_similar(self, image_id, max_distance=None):
+        """
+        按 pHash 汉明距离查找近似重复的图片（共享同一 blob 的条目距离为 0）
+        :param max_distance: 默认 DEDUP_PHASH_DISTANCE
+        :return: [(条目, 距离)]，按距离升序；图片不存在返回 None，尚未迁移为 blob 的旧图片返回空列表
+        """
+        item = self.get_image(image_id)
+        if not item:
+            return None
+        conn = self._connect()
+        row = conn.execute("SELECT phash FROM blobs WHERE hash = ?", (item.get("blob"),)).fetchone()
+        if not row or not row[0]:
+            return []
+        matches = []
+        for key, distance in self._phash_index().query(int(row[0], 16), max_distance):
+            for (raw,) in conn.execute("SELECT data FROM images WHERE blob = ? ORDER BY created_at", (key,)):
+                other = json.loads(raw)
+                if other["id"] != image_id and other.get("status", "ready") == "ready":
+                    matches.append((other, distance))
+        return matches
+
+    def _panel_path(self, key):
+        return os.path.join(self.library_dir, f"{key}.frame")
+
+    def _remove_panel(self, key):
+        self._remove_file(self._panel_path(key))
+        # 旧版无头部的 .panel 文件
+        self._remove_file(os.path.join(self.library_dir, f"{key}.panel"))
+
+    def _write_panel(self, key, image, enabled=True):
+        if not (enabled and LIBRARY_PANEL_FRAMES) or image.size != (SCREEN_WIDTH, SCREEN_HEIGHT):
+            self._remove_panel(key)
+            return {"panel": None}
+        return self._write_frame(key, image)
+
+    def _write_frame(self, key, image):
+        # 与显示服务相同的量化打包：面板帧与实时渲染结果逐字节一致
+        buffer = get_render_service().quantize_pack(image, bytearray(SCREEN_WIDTH * SCREEN_HEIGHT // 2))
+        self._remove_file(os.path.join(self.library_dir, f"{key}.panel"))
+        write_frame_file(self._panel_path(key), buffer, SCREEN_WIDTH, SCREEN_HEIGHT)
+        return {
+            "panel": {
+                "file": f"{key}.frame",
+                "width": SCREEN_WIDTH,
+                "height": SCREEN_HEIGHT,
+                "version": PANEL_FRAME_VERSION,
+            }
+        }
 
-        image_id = uuid4().hex
-        filename = f"{image_id}.bmp"
-        save_path = os.path.join(self.library_dir, filename)
-        resized.save(save_path, format="BMP")
+    def convert_to_frame(self, image_id):
+        """
+        把图片库中的一张图片转换为面板帧文件（与 LIBRARY_PANEL_FRAMES 无关），显示时直接 mmap 推送
+        :param image_id: 图片 ID
+        :return: 帧文件路径
+        """
+        with _write_lock:
+            item = self.get_image(image_id)
+            if not item:
+                raise ValueError("Image not found")
+            if item.get("status") == "processing":
+                raise ValueError("Image is still processing")
+            with Image.open(os.path.join(self.library_dir, item["filename"])) as image:
+                # 与 ImageDisplayUnit.get_image 相同的缩放
+                image = get_render_service().resize(image, (SCREEN_WIDTH, SCREEN_HEIGHT))
+            key = item.get("blob") or image_id
+            fields = self._write_frame(key, image)
+            if item.get("blob"):
+                self._update_blob(key, fields)
+            else:
+                self._merge(image_id, fields)
+        return self._panel_path(key)
+
+    @staticmethod
+    def _remove_file(path):
+        try:
+            if os.path.exists(path):
+                os.remove(path)
+        except OSError:
+            pass
+
+    def get_packed_frame_path(self, image_id, width, height, version):
+        """
+        获取预量化的 4bpp 面板帧
+        :param width: 面板宽度
+        :param height: 面板高度
+        :param version: 调色板版本（PANEL_FRAME_VERSION）
+        :return: 文件路径；不存在或尺寸/调色板不匹配返回 None
+        """
+        item = self.get_image(image_id)
+        panel = item.get("panel") if item else None
+        if not panel or (panel.get("width"), panel.get("height"), panel.get("version")) != (width, height, version):
+            return None
+        path = os.path.join(self.library_dir, panel["file"])
+        return path if os.path.exists(path) else None
 
-        item = {
-            "id": image_id,
-            "filename": filename,
-            "original_name": file_storage.filename,
-            "created_at": datetime.utcnow().isoformat() + "Z",
-            "status": "ready",
+    def delete_images(self, image_ids):
+        removed = []
+        with self._transaction() as conn:
+            for image_id in image_ids:
+                row = conn.execute("SELECT data FROM images WHERE id = ?", (image_id,)).fetchone()
+                if not row:
+                    continue
+                conn.execute("DELETE FROM images WHERE id = ?", (image_id,))
+                removed.append(json.loads(row[0]))
+            dead = self._release(conn, [item.get("blob") for item in removed])
+        for item in removed:
+            if not item.get("blob"):
+                self._remove_legacy_files(item)
+        self._collect(dead)
+        return len(removed)
+
+    def _remove_legacy_files(self, item):
+        # 内容寻址之前按图片 ID 命名的原图、面板帧与缩略图
+        self._remove_file(os.path.join(self.library_dir, item["filename"]))
+        self._remove_panel(item["id"])
+        self.rendition_service.remove(item.get("renditions"))
+        self.rendition_service.remove_transcoded(item.get("etag"))
+
+    @staticmethod
+    def _file_fields(path):
+        # 内容哈希作为强 ETag，连同大小与修改时间写入元数据，条件请求无需访问文件
+        stat = os.stat(path)
+        return {
+            "etag": file_digest(path),
+            "file_size": stat.st_size,
+            "modified_at": int(stat.st_mtime),
         }
 
-        data = self._load()
-        data[image_id] = item
-        self._save(data)
-
+    def get_file_info(self, image_id):
+        """
+        获取原图文件信息，旧数据缺失 ETag 时补算并写回
+        :param image_id: 图片 ID
+        :return: 图片元数据（文件存在时含 etag/file_size/modified_at）；不存在返回 None
+        """
+        item = self.get_image(image_id)
+        if not item:
+            return None
+        path = os.path.join(self.library_dir, item["filename"])
+        if not item.get("etag") and os.path.exists(path):
+            item = self.update_item(image_id, self._file_fields(path))
         return item
 
-    def add_pil_image(self, image, original_name="generated"):
-        if image is None:
-            raise ValueError("No image provided")
+    def get_rendition(self, image_id, size):
+        """
+        获取缩略图，旧数据缺失时按原图补生成
+        :param image_id: 图片 ID
+        :param size: thumb / medium
+        :return: (文件路径, {"file", "etag", "mimetype"})；图片不存在返回 None
+        """
+        item = self.get_image(image_id)
+        if not item:
+            return None
+        renditions = item.get("renditions")
+        if not self.rendition_service.is_complete(renditions):
+            source_path = os.path.join(self.library_dir, item["filename"])
+            if not os.path.exists(source_path):
+                return None
+            key = item.get("blob") or image_id
+            with Image.open(source_path) as image:
+                renditions = self.rendition_service.generate(key, image)
+            if item.get("blob"):
+                self._update_blob(key, {"renditions": renditions})
+            else:
+                self.update_item(image_id, {"renditions": renditions})
+        entry = renditions.get(size)
+        if not entry:
+            return None
+        return self.rendition_service.path(entry), entry
 
-        image = image.convert("RGB")
-        resized = image.resize((SCREEN_WIDTH, SCREEN_HEIGHT), Image.LANCZOS)
+    def add_upload(self, file_storage):
+        if file_storage is None or file_storage.filename == "":
+            raise ValueError("No file provided")
 
-        image_id = uuid4().hex
-        filename = f"{image_id}.bmp"
-        save_path = os.path.join(self.library_dir, filename)
-        resized.save(save_path, format="BMP")
+        return self._add_item(self.ingest_file(file_storage.stream, file_storage.filename))
+
+    def ingest_file(self, fp, original_name, image_id=None, created_at=None):
+        """
+        解码图片并写入原图与缩略图，不写元数据（批量导入最后在一个事务内统一写入）
+        相同文件或规范化后像素相同的图片直接引用已有 blob，不重复编码与写文件
+        :param fp: 文件路径或文件对象
+        :param image_id: 指定 ID（导入导出包时沿用原 ID），默认新生成
+        :param created_at: 指定创建时间，默认当前时间
+        :return: 条目
+        """
+        digest = self._source_digest(fp)
+        fields = self._acquire_existing(source_digest=digest)
+        if fields is None:
+            # 按屏幕尺寸缩小解码，不在内存中展开整张全分辨率照片
+            image = open_upload_image(fp, (SCREEN_WIDTH, SCREEN_HEIGHT))
+            resized = get_render_service().resize(image, (SCREEN_WIDTH, SCREEN_HEIGHT))
+            image.close()
+            fields = self._acquire_blob(resized, source_digest=digest)
+        return self._new_item(fields, original_name, image_id=image_id, created_at=created_at)
+
+    def ingest_blob(self, key, original_name, image_id=None, created_at=None):
+        """
+        引用已有 blob 生成条目（导入导出包中共享同一原图的条目），不写元数据
+        :param key: blob 哈希
+        :return: 条目；blob 不存在返回 None
+        """
+        fields = self._acquire_existing(key=key)
+        if fields is None:
+            return None
+        return self._new_item(fields, original_name, image_id=image_id, created_at=created_at)
 
-        item = {
-            "id": image_id,
-            "filename": filename,
+    @staticmethod
+    def _new_item(fields, original_name, image_id=None, created_at=None, status="ready"):
+        return {
+            "id": image_id or uuid4().hex,
+            **fields,
             "original_name": original_name,
-            "created_at": datetime.utcnow().isoformat() + "Z",
-            "status": "ready",
+            "created_at": created_at or datetime.utcnow().isoformat() + "Z",
+            "status": status,
         }
 
-        data = self._load()
-        data[image_id] = item
-        self._save(data)
+    @staticmethod
+    def _source_digest(fp):
+        """
+        上传原文件 sha1，文件对象读完后回到开头
+        """
+        if isinstance(fp, str):
+            return file_digest(fp)
+        sha1 = hashlib.sha1()
+        for chunk in iter(lambda: fp.read(1 << 16), b""):
+            sha1.update(chunk)
+        fp.seek(0)
+        return sha1.hexdigest()
+
+    def add_uploads(self, file_storages):
+        """
+        批量上传：在 UPLOAD_WORKERS 个线程上并行解码入库
+        :param file_storages: FileStorage 列表
+        :return: 与输入顺序一致的 (条目, 异常) 列表，成功时异常为 None
+        """
+        futures = [_get_upload_executor().submit(self.add_upload, file_storage) for file_storage in file_storages]
+        results = []
+        for future in futures:
+            try:
+                results.append((future.result(), None))
+            except Exception as e:
+                results.append((None, e))
+        return results
 
-        return item
+    def add_pil_image(self, image, original_name="generated"):
+        if image is None:
+            raise ValueError("No image provided")
 
-    def add_placeholder(self, original_name, source_id=None, style=None):
-        image_id = uuid4().hex
-        filename = f"{image_id}.bmp"
-        save_path = os.path.join(self.library_dir, filename)
+        resized = get_render_service().resize(image, (SCREEN_WIDTH, SCREEN_HEIGHT))
+        return self._add_item(self._new_item(self._acquire_blob(resized), original_name))
 
+    def add_placeholder(self, original_name, source_id=None, style=None):
         image = Image.new("RGB", (SCREEN_WIDTH, SCREEN_HEIGHT), color=(26, 26, 34))
         draw = ImageDraw.Draw(image)
 
@@ -153,58 +699,182 @@ class ImageLibraryService:
             text,
             fill=(220, 220, 235),
         )
-        image.save(save_path, format="BMP")
-
         item = {
-            "id": image_id,
-            "filename": filename,
-            "original_name": original_name,
-            "created_at": datetime.utcnow().isoformat() + "Z",
-            "status": "processing",
+            **self._new_item(self._acquire_blob(image, panel=False), original_name, status="processing"),
             "source_id": source_id,
             "style": style,
         }
 
-        data = self._load()
-        data[image_id] = item
-        self._save(data)
-        return item
+        return self._add_item(item)
 
     def update_item(self, image_id, updates, image=None):
-        data = self._load()
-        item = data.get(image_id)
-        if not item:
+        if not self.get_image(image_id):
             return None
 
-        if image is not None:
+        if image is None:
+            return self._merge(image_id, updates)[0]
+
+        resized = get_render_service().resize(image, (SCREEN_WIDTH, SCREEN_HEIGHT))
+        with _write_lock:
+            # 新内容写入新的 blob，播放线程仍可读取旧 blob；旧 blob 在无引用后回收
+            fields = self._acquire_blob(resized)
+            merged, previous = self._merge(image_id, dict(updates, **fields))
+        if merged is None:
+            self.release_items([fields])
+        elif previous.get("blob"):
+            # 释放合并事务内实际被替换的 blob（内容未变化时即为刚取得的同一引用）
+            self.release_items([previous])
+        else:
+            self._remove_legacy_files(previous)
+        return merged
+
+    def _merge(self, image_id, updates):
+        """
+        在事务内重新读取再合并，避免并发更新互相覆盖
+        :return: (合并后的条目, 合并前的条目)；图片不存在返回 (None, None)
+        """
+        with self._transaction() as conn:
+            row = conn.execute("SELECT data FROM images WHERE id = ?", (image_id,)).fetchone()
+            if not row:
+                return None, None
+            previous = json.loads(row[0])
+            item = dict(previous, **updates)
+            self._insert(conn, item)
+        return item, previous
+
+    def _needs_migration(self, item):
+        if item.get("status") == "processing":
+            return False
+        if not item.get("blob"):
+            # 内容寻址之前按图片 ID 命名的原图：转为 blob（相同图片随之合并）
+            return True
+        if library_format(item["filename"]) != STORAGE_FORMAT:
+            return True
+        panel = item.get("panel")
+        if panel and not panel.get("file", "").endswith(".frame"):
+            # 旧版无头部面板帧：重新生成或删除
+            return True
+        return LIBRARY_PANEL_FRAMES and (not panel or panel.get("version") != PANEL_FRAME_VERSION)
+
+    def migrate_item(self, image_id):
+        """
+        把一张图片迁移为当前存储格式的 blob（并按配置补生成面板帧）
+        :return: 节省的字节数；无需迁移或期间被其他写入修改时返回 None
+        """
+        with _write_lock:
+            item = self.get_image(image_id)
+            if not item or not self._needs_migration(item):
+                return None
+            if item.get("blob"):
+                return self._migrate_blob(item["blob"])
+            old_path = os.path.join(self.library_dir, item["filename"])
+            if not os.path.exists(old_path):
+                return None
+            old_size = os.path.getsize(old_path)
+            with Image.open(old_path) as image:
+                image = image.convert("RGB")
+            if image.size != (SCREEN_WIDTH, SCREEN_HEIGHT):
+                image = get_render_service().resize(image, (SCREEN_WIDTH, SCREEN_HEIGHT))
+            fields = self._acquire_blob(image)
+            merged, previous = self._merge(image_id, fields)
+            if merged is None:
+                self.release_items([fields])
+                return None
+            refs = self._connect().execute("SELECT refs FROM blobs WHERE hash = ?", (fields["blob"],)).fetchone()
+        if previous.get("blob"):
+            # 期间已被其他写入换为 blob：释放其引用，不删除旧文件
+            self.release_items([previous])
+            return None
+        self._remove_legacy_files(previous)
+        # 合并到已有 blob 时整份旧文件都省下
+        return old_size - (fields["file_size"] if refs and refs[0] == 1 else 0)
+
+    def _migrate_blob(self, key):
+        # blob 的存储格式或面板帧过期：在原 key 下重写，所有引用条目同步更新
+        row = self._connect().execute("SELECT data FROM blobs WHERE hash = ?", (key,)).fetchone()
+        fields = json.loads(row[0]) if row and row[0] else None
+        if not fields:
+            return None
+        old_path = os.path.join(self.library_dir, fields["filename"])
+        if not os.path.exists(old_path):
+            return None
+        old_size = os.path.getsize(old_path)
+        with Image.open(old_path) as image:
             image = image.convert("RGB")
-            resized = image.resize((SCREEN_WIDTH, SCREEN_HEIGHT), Image.LANCZOS)
-            save_path = os.path.join(self.library_dir, item["filename"])
-            resized.save(save_path, format="BMP")
-
-        item.update(updates)
-        data[image_id] = item
-        self._save(data)
-        return item
-
-    def add_existing_file(self, source_path, original_name="generated"):
-        if not source_path or not os.path.exists(source_path):
-            raise ValueError("Source file not found")
-
-        image_id = uuid4().hex
-        filename = f"{image_id}.bmp"
-        dest_path = os.path.join(self.library_dir, filename)
-        shutil.copyfile(source_path, dest_path)
-
-        item = {
-            "id": image_id,
-            "filename": filename,
-            "original_name": original_name,
-            "created_at": datetime.utcnow().isoformat() + "Z",
+        if library_format(fields["filename"]) == STORAGE_FORMAT:
+            updates = self._write_panel(key, image)
+        else:
+            updates = self._write_blob(key, image)
+        self._update_blob(key, updates)
+        if updates.get("filename", fields["filename"]) != fields["filename"]:
+            with _blob_lock:
+                self._remove_file(old_path)
+            self.rendition_service.remove_transcoded(fields.get("etag"))
+            return old_size - updates["file_size"]
+        return 0
+
+    def start_migration(self):
+        """
+        后台迁移旧格式原图（如 BMP）为 STORAGE_FORMAT；LIBRARY_MIGRATE=false 或已在运行时不做任何事
+        """
+        if not LIBRARY_MIGRATE:
+            return
+        with _migration_lock:
+            if _migration["running"]:
+                return
+            _migration["running"] = True
+        threading.Thread(target=self._run_migration, daemon=True, name="library-migrate").start()
+
+    def _run_migration(self):
+        try:
+            pending = [item["id"] for item in self.list_images() if self._needs_migration(item)]
+            with _migration_lock:
+                _migration["pending"] = len(pending)
+            for image_id in pending:
+                try:
+                    saved = self.migrate_item(image_id)
+                except Exception as e:
+                    saved = None
+                    with _migration_lock:
+                        _migration["failed"] += 1
+                        _migration["last_error"] = f"{image_id}: {e}"
+                with _migration_lock:
+                    _migration["pending"] -= 1
+                    if saved is not None:
+                        _migration["migrated"] += 1
+                        _migration["saved_bytes"] += saved
+                # 让出 CPU 与 SD 卡带宽给播放与请求处理
+                time.sleep(0.05)
+        finally:
+            with _migration_lock:
+                _migration["running"] = False
+
+    def storage_status(self):
+        """
+        存储格式、各格式文件数与占用、迁移进度
+        """
+        formats = {}
+        for entry in os.scandir(self.library_dir):
+            if entry.name.endswith(".tmp"):
+                continue
+            fmt = library_format(entry.name)
+            stat = formats.setdefault(fmt, {"files": 0, "bytes": 0})
+            stat["files"] += 1
+            stat["bytes"] += entry.stat().st_size
+        with _migration_lock:
+            migration = dict(_migration)
+        blobs, refs = self._connect().execute("SELECT COUNT(*), COALESCE(SUM(refs), 0) FROM blobs").fetchone()
+        return {
+            "format": STORAGE_FORMAT,
+            "panel_frames": LIBRARY_PANEL_FRAMES,
+            "panel_version": PANEL_FRAME_VERSION,
+            "files": formats,
+            "migration": migration,
+            "blobs": {
+                "count": blobs,
+                "refs": refs,
+                # 因内容相同而未单独存储的条目数
+                "deduplicated": refs - blobs,
+                "phash_distance": DEDUP_PHASH_DISTANCE,
+            },
         }
-
-        data = self._load()
-        data[image_id] = item
-        self._save(data)
-
-        return item
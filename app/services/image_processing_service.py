@@ -1,5 +1,12 @@
+import hashlib
+import os
+import threading
+
+import numpy as np
 from PIL import Image
 
+from app.config import BASE_DIR
+
 
 PALETTE = [
     (255, 255, 255),  # white
@@ -10,6 +17,16 @@ PALETTE = [
     (0, 0, 255),      # blue
 ]
 
+PALETTE_RGB = np.array(PALETTE, dtype=np.uint8)
+_PALETTE_ARRAY = np.array(PALETTE, dtype=np.float32)
+
+# squared distance from every channel value (0-255) to each palette entry,
+# one table per channel: shape (3, 256, len(PALETTE))
+_CHANNEL_DIST = np.stack([
+    (np.arange(256, dtype=np.int32)[:, None] - np.array(PALETTE, dtype=np.int32)[None, :, c]) ** 2
+    for c in range(3)
+])
+
 
 def _nearest_color(r, g, b):
     best = PALETTE[0]
@@ -25,51 +42,200 @@ def _nearest_color(r, g, b):
     return best
 
 
+# identifies the palette in persisted artifacts (LUT file, frame cache keys)
+PALETTE_DIGEST = hashlib.sha1(repr(PALETTE).encode("utf-8")).hexdigest()[:8]
+
+_LUT_SIZE = 1 << 24
+_lut = None
+_lut_lock = threading.Lock()
+
+
+def _lut_path():
+    # the palette digest in the name invalidates stale tables on palette changes
+    return os.path.join(BASE_DIR, "storage", f"palette_lut_{PALETTE_DIGEST}.bin")
+
+
+def _build_palette_lut(path):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    lut = np.memmap(tmp_path, dtype=np.uint8, mode="w+", shape=(256, 256, 256))
+    gb_dist = _CHANNEL_DIST[1][:, None, :] + _CHANNEL_DIST[2][None, :, :]
+    for r in range(256):
+        # argmin keeps the first entry on ties, same as _nearest_color
+        lut[r] = (gb_dist + _CHANNEL_DIST[0][r]).argmin(axis=2)
+    lut.flush()
+    del lut
+    # atomic rename, so concurrent builders never expose a partial table
+    os.replace(tmp_path, path)
+
+
+def get_palette_lut():
+    """
+    RGB -> PALETTE index table, indexed by (r << 16) | (g << 8) | b.
+    Built once into storage/ on first use and memory-mapped read-only,
+    so all processes share one page-cache copy of the 16 MB file.
+    """
+    global _lut
+    if _lut is None:
+        with _lut_lock:
+            if _lut is None:
+                path = _lut_path()
+                if not os.path.exists(path) or os.path.getsize(path) != _LUT_SIZE:
+                    _build_palette_lut(path)
+                _lut = np.memmap(path, dtype=np.uint8, mode="r")
+    return _lut
+
+
+def _nearest_index(values):
+    """
+    Palette index for each row of an (N, 3) integer array.
+    """
+    packed = (values[:, 0] << 16) | (values[:, 1] << 8) | values[:, 2]
+    return get_palette_lut()[packed]
+
+
+def palette_indices(rgb):
+    """
+    Palette index for every pixel of an (H, W, 3) uint8 array.
+    :return: (H, W) uint8 array of PALETTE indices
+    """
+    packed = rgb[..., 0].astype(np.uint32) << 16
+    packed |= rgb[..., 1].astype(np.uint32) << 8
+    packed |= rgb[..., 2]
+    return get_palette_lut()[packed]
+
+
+# EPD color code for each entry of PALETTE
+# (white, black, red, green, yellow, blue)
+PANEL_CODES = np.array([1, 0, 3, 6, 2, 5], dtype=np.uint8)
+
+# Identifies the palette + code mapping baked into stored packed frames;
+# frames written under another version must be re-quantized
+PANEL_FRAME_VERSION = hashlib.sha1(
+    f"{PALETTE_DIGEST}|{PANEL_CODES.tobytes().hex()}".encode("utf-8")
+).hexdigest()[:8]
+
+_panel_palette_image = None
+
+
+def pack_nibbles(codes, out):
+    """
+    Pack 4-bit panel codes two per byte (first pixel in the high nibble)
+    straight into a preallocated buffer.
+    :param codes: uint8 array with width * height color codes
+    :param out: writable buffer of len(codes) / 2 bytes
+    """
+    flat = codes.reshape(-1)
+    dest = np.frombuffer(out, dtype=np.uint8)
+    np.left_shift(flat[0::2], 4, out=dest)
+    np.bitwise_or(dest, flat[1::2], out=dest)
+    return out
+
+
+def _get_panel_palette_image():
+    # palette index == EPD color code, so quantize() yields panel codes directly
+    global _panel_palette_image
+    if _panel_palette_image is None:
+        palette_image = Image.new("P", (1, 1))
+        palette_image.putpalette(
+            (0, 0, 0, 255, 255, 255, 255, 255, 0, 255, 0, 0, 0, 0, 0, 0, 0, 255, 0, 255, 0)
+            + (0, 0, 0) * 249
+        )
+        _panel_palette_image = palette_image
+    return _panel_palette_image
+
+
+def panel_codes(rgb):
+    """
+    EPD color code for every pixel of an (H, W, 3) uint8 array.
+    Frames already in panel colors (diffused / flat) take one LUT gather;
+    continuous-tone frames keep PIL's dithering quantizer.
+    """
+    indices = palette_indices(rgb)
+    if np.array_equal(PALETTE_RGB[indices], rgb):
+        return PANEL_CODES[indices]
+    image_6color = Image.fromarray(rgb, "RGB").quantize(palette=_get_panel_palette_image())
+    return np.asarray(image_6color)
+
+
 def apply_color_diffusion(image):
     """
     Floyd-Steinberg error diffusion with fixed 6-color palette.
+
+    Pixel (x, y) only depends on pixels of the anti-diagonals x + 2y - 1 and
+    earlier, so each anti-diagonal is quantized as one vector. All error terms
+    are exact multiples of 1/16, which keeps the result identical to the
+    classic scan-line order.
+    """
+    src = np.asarray(image.convert("RGB"), dtype=np.float32)
+    height, width = src.shape[:2]
+    out = np.empty((height, width, 3), dtype=np.uint8)
+
+    # error plane with one padding column on each side and one spare row
+    err = np.zeros((height + 1, width + 2, 3), dtype=np.float32)
+    rows = np.arange(height)
+
+    for t in range(width + 2 * (height - 1)):
+        y0 = max(0, (t - width + 2) // 2)
+        y1 = min(height - 1, t // 2)
+        ys = rows[y0:y1 + 1]
+        xs = t - 2 * ys
+
+        values = np.floor(src[ys, xs] + err[ys, xs + 1])
+        np.clip(values, 0, 255, out=values)
+        quantized = _PALETTE_ARRAY[_nearest_index(values.astype(np.intp))]
+        out[ys, xs] = quantized
+
+        diff = values - quantized
+        # Floyd-Steinberg weights: right, down-left, down, down-right
+        err[ys, xs + 2] += diff * (7 / 16)
+        err[ys + 1, xs] += diff * (3 / 16)
+        err[ys + 1, xs + 1] += diff * (5 / 16)
+        err[ys + 1, xs + 2] += diff * (1 / 16)
+
+    return Image.fromarray(out, "RGB")
+
+
+def pixel_digest(image):
+    """
+    Content address of an image: sha1 over size and RGB pixels, so the same
+    picture saved in different containers (BMP/PNG/WebP) gets the same name.
+    :return: 40-char hex digest
+    """
+    rgb = image if image.mode == "RGB" else image.convert("RGB")
+    sha1 = hashlib.sha1(f"{rgb.width}x{rgb.height}:".encode("ascii"))
+    sha1.update(rgb.tobytes())
+    return sha1.hexdigest()
+
+
+def _bits_to_int(bits):
+    return int.from_bytes(np.packbits(bits.reshape(-1)).tobytes(), "big")
+
+
+def dhash(image, size=8):
+    """
+    Difference hash: 64 bits, each comparing horizontally adjacent pixels of
+    a (size + 1) x size grayscale thumbnail.
+    :return: int
+    """
+    gray = np.asarray(image.convert("L").resize((size + 1, size), Image.LANCZOS), dtype=np.int16)
+    return _bits_to_int(gray[:, 1:] > gray[:, :-1])
+
+
+_DCT_SIZE = 32
+# orthonormal DCT-II basis, so the 2D transform is two matrix products
+_DCT_MATRIX = np.cos(
+    np.pi / _DCT_SIZE * (np.arange(_DCT_SIZE)[None, :] + 0.5) * np.arange(_DCT_SIZE)[:, None]
+)
+
+
+def phash(image, size=8):
+    """
+    Perceptual hash: low-frequency size x size block of the DCT of a 32x32
+    grayscale thumbnail, thresholded at its median (DC term excluded).
+    :return: int
     """
-    img = image.convert("RGB")
-    width, height = img.size
-    pixels = img.load()
-
-    # error buffers for current and next row
-    err_curr = [[0.0, 0.0, 0.0] for _ in range(width + 2)]
-    err_next = [[0.0, 0.0, 0.0] for _ in range(width + 2)]
-
-    for y in range(height):
-        for x in range(width):
-            r, g, b = pixels[x, y]
-            er, eg, eb = err_curr[x + 1]
-            r = min(255, max(0, int(r + er)))
-            g = min(255, max(0, int(g + eg)))
-            b = min(255, max(0, int(b + eb)))
-
-            nr, ng, nb = _nearest_color(r, g, b)
-            pixels[x, y] = (nr, ng, nb)
-
-            dr = r - nr
-            dg = g - ng
-            db = b - nb
-
-            # Floyd-Steinberg weights
-            # right
-            err_curr[x + 2][0] += dr * 7 / 16
-            err_curr[x + 2][1] += dg * 7 / 16
-            err_curr[x + 2][2] += db * 7 / 16
-            # down-left
-            err_next[x][0] += dr * 3 / 16
-            err_next[x][1] += dg * 3 / 16
-            err_next[x][2] += db * 3 / 16
-            # down
-            err_next[x + 1][0] += dr * 5 / 16
-            err_next[x + 1][1] += dg * 5 / 16
-            err_next[x + 1][2] += db * 5 / 16
-            # down-right
-            err_next[x + 2][0] += dr * 1 / 16
-            err_next[x + 2][1] += dg * 1 / 16
-            err_next[x + 2][2] += db * 1 / 16
-
-        err_curr, err_next = err_next, [[0.0, 0.0, 0.0] for _ in range(width + 2)]
-
-    return img
+    gray = np.asarray(image.convert("L").resize((_DCT_SIZE, _DCT_SIZE), Image.LANCZOS), dtype=np.float64)
+    low = (_DCT_MATRIX @ gray @ _DCT_MATRIX.T)[:size, :size]
+    median = np.median(low.reshape(-1)[1:])
+    return _bits_to_int(low > median)
@@ -0,0 +1,430 @@
+import json
+import os
+import re
+import shutil
+import tarfile
+import tempfile
+import threading
+import time
+import uuid
+import zipfile
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from io import BytesIO
+
+from app.config import UPLOAD_MAX_MB, UPLOAD_TMP_DIR, UPLOAD_WORKERS
+from app.services.image_library_service import ImageLibraryService
+
+
+# 可导入的图片扩展名
+IMPORT_EXTENSIONS = {".jpg", ".jpeg", ".png", ".webp", ".bmp", ".gif", ".tif", ".tiff"}
+# 导出包布局：元数据在前，原图在 images/ 下
+EXPORT_METADATA = "library.json"
+EXPORT_IMAGE_DIR = "images"
+EXPORT_VERSION = 1
+
+_IMAGE_ID = re.compile(r"[0-9a-f]{32}")
+
+
+class ImportJob:
+    """批量导入任务，记录进度供轮询"""
+
+    # 只保留前若干条错误
+    MAX_ERRORS = 20
+
+    def __init__(self, source):
+        self.id = uuid.uuid4().hex
+        self.source = source
+        self.status = "pending"
+        self.total = 0
+        self.processed = 0
+        self.imported = 0
+        self.skipped = 0
+        self.failed = 0
+        self.errors = []
+        self.error = None
+        self.created_at = time.time()
+        self.finished_at = None
+
+    def add_error(self, name, error):
+        self.failed += 1
+        if len(self.errors) < self.MAX_ERRORS:
+            self.errors.append({"name": name, "error": str(error)})
+
+    def to_dict(self):
+        return {
+            "id": self.id,
+            "source": self.source,
+            "status": self.status,
+            "total": self.total,
+            "processed": self.processed,
+            "imported": self.imported,
+            "skipped": self.skipped,
+            "failed": self.failed,
+            "errors": list(self.errors),
+            "error": self.error,
+            "created_at": self.created_at,
+            "finished_at": self.finished_at,
+        }
+
+
+class _ChunkBuffer:
+    """tarfile 流式写入的目标：累积写出的数据块，由生成器逐段取走"""
+
+    def __init__(self):
+        self._chunks = []
+
+    def write(self, data):
+        self._chunks.append(bytes(data))
+        return len(data)
+
+    def drain(self):
+        chunks, self._chunks = self._chunks, []
+        return chunks
+
+
+class _ImportSource:
+    """导入源：成员列表与导出包元数据，退出时关闭底层包文件"""
+
+    def __init__(self, members, metadata, closer=None):
+        self.members = members
+        self.metadata = metadata
+        self._closer = closer
+
+    def __enter__(self):
+        return self.members, self.metadata
+
+    def __exit__(self, *exc):
+        if self._closer is not None:
+            self._closer()
+
+
+def _is_import_name(name):
+    base = os.path.basename(name)
+    if not base or base.startswith(".") or "__MACOSX" in name.split("/"):
+        return False
+    return os.path.splitext(base)[1].lower() in IMPORT_EXTENSIONS
+
+
+def is_import_archive(path):
+    """
+    :return: path 是否为可导入的 zip / tar 包
+    """
+    return zipfile.is_zipfile(path) or tarfile.is_tarfile(path)
+
+
+class LibraryTransferService:
+    """图片库批量导入（zip / tar / 本地目录）与流式 tar 导出"""
+
+    JOB_HISTORY = 20
+
+    def __init__(self):
+        self._jobs = OrderedDict()
+        self._lock = threading.Lock()
+
+    def start_import(self, path, remove_source=False, source=None):
+        """
+        后台导入
+        :param path: zip / tar 包或目录路径
+        :param remove_source: 导入结束后删除 path（上传的临时包）
+        :param source: 任务中显示的来源名称，默认取 path 的文件名
+        :return: 任务字典
+        """
+        job = ImportJob(source or os.path.basename(path.rstrip(os.sep)))
+        with self._lock:
+            self._jobs[job.id] = job
+            while len(self._jobs) > self.JOB_HISTORY:
+                self._jobs.popitem(last=False)
+        threading.Thread(
+            target=self._run_job, args=(job, path, remove_source), daemon=True, name="library-import"
+        ).start()
+        return job.to_dict()
+
+    def _run_job(self, job, path, remove_source):
+        try:
+            self.run_import(path, job)
+        except Exception:
+            pass
+        finally:
+            if remove_source:
+                try:
+                    os.remove(path)
+                except OSError:
+                    pass
+
+    def get_job(self, job_id):
+        with self._lock:
+            job = self._jobs.get(job_id)
+            return job.to_dict() if job else None
+
+    def run_import(self, path, job=None, progress=None):
+        """
+        同步导入：单线程顺序读取包内文件，在 UPLOAD_WORKERS 个线程上并行解码写入，最后在一个事务内写入全部元数据
+        :param path: zip / tar 包或目录路径
+        :param job: ImportJob（可选）
+        :param progress: 每处理一个文件后以任务字典回调（可选）
+        :return: 任务字典
+        """
+        job = job or ImportJob(os.path.basename(path.rstrip(os.sep)))
+        library = ImageLibraryService()
+        workers = max(1, UPLOAD_WORKERS)
+        # 限制已读出待解码的文件数，临时文件占用不随包大小增长
+        slots = threading.BoundedSemaphore(workers * 2)
+        results = []
+
+        def report():
+            if progress is not None:
+                progress(job.to_dict())
+
+        def done(index, name, future):
+            slots.release()
+            with self._lock:
+                job.processed += 1
+                try:
+                    results.append((index, future.result()))
+                except Exception as e:
+                    job.add_error(name, e)
+            report()
+
+        with self._lock:
+            job.status = "running"
+        committed = False
+        try:
+            with self._open_source(path) as (members, metadata):
+                with self._lock:
+                    job.total = len(members)
+                report()
+                with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="library-import") as executor:
+                    for index, (name, size, open_member) in enumerate(members):
+                        entries = []
+                        for meta in metadata.get(name) or [{}]:
+                            image_id = meta.get("id")
+                            if not (isinstance(image_id, str) and _IMAGE_ID.fullmatch(image_id)):
+                                image_id = None
+                            if image_id and library.get_image(image_id):
+                                # 同一导出包重复导入：按 ID 跳过
+                                with self._lock:
+                                    job.skipped += 1
+                                continue
+                            entries.append((
+                                meta.get("original_name") or os.path.basename(name), image_id, meta.get("created_at"),
+                            ))
+                        if not entries:
+                            with self._lock:
+                                job.processed += 1
+                            report()
+                            continue
+                        slots.acquire()
+                        try:
+                            if size > UPLOAD_MAX_MB * 1024 * 1024:
+                                raise ValueError(f"File exceeds {UPLOAD_MAX_MB} MB")
+                            fp = open_member()
+                        except Exception as e:
+                            slots.release()
+                            with self._lock:
+                                job.processed += 1
+                                job.add_error(name, e)
+                            report()
+                            continue
+                        future = executor.submit(self._ingest, library, fp, entries)
+                        future.add_done_callback(lambda f, index=index, name=name: done(index, name, f))
+
+            # 并行写入的文件全部完成后，按包内顺序在一个事务内提交元数据
+            results.sort(key=lambda entry: entry[0])
+            items = [item for _, group in results for item in group]
+            added = library.add_items(items)
+            committed = True
+            with self._lock:
+                job.imported = len(added)
+                job.skipped += len(items) - len(added)
+                job.status = "done"
+        except Exception as e:
+            if not committed:
+                # 元数据未写入：释放已取得的 blob 引用，无其他引用的图片文件随之删除
+                library.release_items([item for _, group in results for item in group])
+            with self._lock:
+                job.status = "failed"
+                job.error = str(e)
+            raise
+        finally:
+            with self._lock:
+                job.finished_at = time.time()
+            report()
+        return job.to_dict()
+
+    @staticmethod
+    def _ingest(library, fp, entries):
+        """
+        解码写入一个包内文件；导出包中共享同一原图的其余条目直接引用同一 blob
+        :param entries: [(原文件名, 图片 ID, 创建时间)]
+        :return: 条目列表
+        """
+        try:
+            (original_name, image_id, created_at), rest = entries[0], entries[1:]
+            first = library.ingest_file(fp, original_name, image_id=image_id, created_at=created_at)
+        finally:
+            if not isinstance(fp, str):
+                fp.close()
+        items = [first]
+        try:
+            for original_name, image_id, created_at in rest:
+                item = library.ingest_blob(first["blob"], original_name, image_id=image_id, created_at=created_at)
+                if item is None:
+                    raise ValueError("Image blob disappeared during import")
+                items.append(item)
+        except Exception:
+            library.release_items(items)
+            raise
+        return items
+
+    @staticmethod
+    def _spool(src):
+        """
+        把包内文件复制到 UPLOAD_TMP_DIR 下的临时文件（tar 流不可随机访问，解码需要 seek）
+        """
+        os.makedirs(UPLOAD_TMP_DIR, exist_ok=True)
+        fp = tempfile.TemporaryFile("w+b", dir=UPLOAD_TMP_DIR)
+        try:
+            with src:
+                shutil.copyfileobj(src, fp, 64 * 1024)
+            fp.seek(0)
+        except BaseException:
+            fp.close()
+            raise
+        return fp
+
+    def _open_source(self, path):
+        """
+        :return: 上下文管理器，产出 (成员列表 [(名称, 大小, 打开函数)], 导出包元数据 {名称: [条目]})
+        """
+        if os.path.isdir(path):
+            return self._open_directory(path)
+        if zipfile.is_zipfile(path):
+            return self._open_zip(path)
+        if tarfile.is_tarfile(path):
+            return self._open_tar(path)
+        raise ValueError("Source must be a directory, zip or tar archive")
+
+    @staticmethod
+    def _read_metadata(data):
+        try:
+            payload = json.loads(data)
+        except ValueError:
+            return {}
+        items = payload.get("items") if isinstance(payload, dict) else None
+        # 共享同一 blob 的条目在包内只有一个文件
+        metadata = {}
+        for item in items or []:
+            if isinstance(item, dict) and item.get("filename"):
+                metadata.setdefault(f"{EXPORT_IMAGE_DIR}/{item['filename']}", []).append(item)
+        return metadata
+
+    def _open_directory(self, path):
+        members = []
+        metadata = {}
+        for root, dirs, files in os.walk(path):
+            dirs[:] = sorted(d for d in dirs if not d.startswith("."))
+            for filename in sorted(files):
+                full = os.path.join(root, filename)
+                name = os.path.relpath(full, path).replace(os.sep, "/")
+                if name == EXPORT_METADATA:
+                    with open(full, "rb") as f:
+                        metadata = self._read_metadata(f.read())
+                elif _is_import_name(name):
+                    # 目录文件可直接随机访问，无需复制
+                    members.append((name, os.path.getsize(full), lambda full=full: full))
+        return _ImportSource(members, metadata)
+
+    def _open_zip(self, path):
+        archive = zipfile.ZipFile(path)
+        try:
+            metadata = {}
+            if EXPORT_METADATA in archive.namelist():
+                metadata = self._read_metadata(archive.read(EXPORT_METADATA))
+            members = [
+                (info.filename, info.file_size, lambda info=info: self._spool(archive.open(info)))
+                for info in archive.infolist()
+                if not info.is_dir() and _is_import_name(info.filename)
+            ]
+        except BaseException:
+            archive.close()
+            raise
+        return _ImportSource(members, metadata, archive.close)
+
+    def _open_tar(self, path):
+        archive = tarfile.open(path, "r:*")
+        try:
+            metadata = {}
+            members = []
+            for info in archive.getmembers():
+                if not info.isfile():
+                    continue
+                name = info.name[2:] if info.name.startswith("./") else info.name
+                if name == EXPORT_METADATA:
+                    metadata = self._read_metadata(archive.extractfile(info).read())
+                elif _is_import_name(name):
+                    members.append((name, info.size, lambda info=info: self._spool(archive.extractfile(info))))
+        except BaseException:
+            archive.close()
+            raise
+        return _ImportSource(members, metadata, archive.close)
+
+    def export_stream(self):
+        """
+        流式导出图片库为 tar（library.json + images/ 下的原图，共享 blob 的条目只写一份），逐个文件写出，不在内存中拼装整个包
+        :return: 产出 bytes 块的生成器
+        """
+        library = ImageLibraryService()
+        items = []
+        for item in library.list_images():
+            if item.get("status", "ready") != "ready":
+                continue
+            if os.path.exists(os.path.join(library.library_dir, item["filename"])):
+                items.append(item)
+
+        buffer = _ChunkBuffer()
+        with tarfile.open(fileobj=buffer, mode="w|", format=tarfile.PAX_FORMAT) as tar:
+            payload = json.dumps({
+                "version": EXPORT_VERSION,
+                "exported_at": datetime.utcnow().isoformat() + "Z",
+                "items": [
+                    {key: item.get(key) for key in ("id", "filename", "original_name", "created_at", "etag", "blob")}
+                    for item in items
+                ],
+            }, ensure_ascii=False, indent=2).encode("utf-8")
+            info = tarfile.TarInfo(EXPORT_METADATA)
+            info.size = len(payload)
+            info.mtime = int(time.time())
+            tar.addfile(info, BytesIO(payload))
+            yield from buffer.drain()
+
+            written = set()
+            for item in items:
+                if item["filename"] in written:
+                    continue
+                written.add(item["filename"])
+                try:
+                    f = open(os.path.join(library.library_dir, item["filename"]), "rb")
+                except OSError:
+                    continue
+                with f:
+                    stat = os.fstat(f.fileno())
+                    info = tarfile.TarInfo(f"{EXPORT_IMAGE_DIR}/{item['filename']}")
+                    info.size = stat.st_size
+                    info.mtime = int(stat.st_mtime)
+                    tar.addfile(info, f)
+                yield from buffer.drain()
+        yield from buffer.drain()
+
+
+_library_transfer = None
+_library_transfer_lock = threading.Lock()
+
+
+def get_library_transfer_service():
+    global _library_transfer
+    with _library_transfer_lock:
+        if _library_transfer is None:
+            _library_transfer = LibraryTransferService()
+    return _library_transfer
@@ -0,0 +1,76 @@
+import threading
+
+
+class HammingIndex:
+    """
+    64 位感知哈希的汉明距离索引（multi-index hashing）
+    哈希按位切成 max_distance + 1 段，距离不超过 max_distance 的两个哈希至少有一段完全相同（鸽巢原理），
+    查询只需比较与某一段相同的候选，不必逐个扫描
+    """
+
+    BITS = 64
+
+    def __init__(self, max_distance):
+        self.max_distance = max_distance
+        bands = max(1, min(max_distance + 1, self.BITS))
+        # 各段位宽尽量均分
+        widths = [self.BITS // bands + (1 if i < self.BITS % bands else 0) for i in range(bands)]
+        self._bands = []
+        shift = self.BITS
+        for width in widths:
+            shift -= width
+            self._bands.append((shift, (1 << width) - 1))
+        self._tables = [{} for _ in self._bands]
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._values)
+
+    def _keys(self, value):
+        return [(value >> shift) & mask for shift, mask in self._bands]
+
+    def add(self, key, value):
+        with self._lock:
+            self._remove(key)
+            self._values[key] = value
+            for table, band in zip(self._tables, self._keys(value)):
+                table.setdefault(band, set()).add(key)
+
+    def remove(self, key):
+        with self._lock:
+            self._remove(key)
+
+    def _remove(self, key):
+        value = self._values.pop(key, None)
+        if value is None:
+            return
+        for table, band in zip(self._tables, self._keys(value)):
+            bucket = table.get(band)
+            if bucket is not None:
+                bucket.discard(key)
+                if not bucket:
+                    del table[band]
+
+    def query(self, value, max_distance=None):
+        """
+        查找汉明距离不超过 max_distance 的哈希
+        :param max_distance: 默认为建索引时的距离；更大时退化为线性扫描
+        :return: [(key, distance)]，按距离升序
+        """
+        if max_distance is None:
+            max_distance = self.max_distance
+        with self._lock:
+            if max_distance > self.max_distance:
+                candidates = list(self._values)
+            else:
+                candidates = set()
+                for table, band in zip(self._tables, self._keys(value)):
+                    candidates.update(table.get(band, ()))
+            matches = []
+            for key in candidates:
+                distance = (self._values[key] ^ value).bit_count()
+                if distance <= max_distance:
+                    matches.append((key, distance))
+        matches.sort(key=lambda match: (match[1], match[0]))
+        return matches
@@ -2,8 +2,15 @@ import json
 import os
 import threading
 import time
+from concurrent.futures import ThreadPoolExecutor
 
-from app.config import BASE_DIR
+from app.config import (
+    BASE_DIR,
+    PLAYBACK_PREFETCH_DEPTH,
+    PLAYBACK_PREFETCH_MAX_MB,
+    SCREEN_WIDTH,
+    SCREEN_HEIGHT,
+)
 
 
 class PlaybackService:
@@ -18,6 +25,15 @@ class PlaybackService:
         self._lock = threading.Lock()
         self._current_playlist_id = None
         self._state_file = os.path.join(BASE_DIR, "storage", "playback_state.json")
+
+        # 预取：在当前单元显示期间后台渲染后续单元
+        frame_bytes = SCREEN_WIDTH * SCREEN_HEIGHT * 3
+        max_frames = max(1, PLAYBACK_PREFETCH_MAX_MB * 1024 * 1024 // frame_bytes)
+        self._prefetch_depth = max(0, min(PLAYBACK_PREFETCH_DEPTH, max_frames))
+        self._prefetch_executor = None
+        self._prefetched = {}  # (playlist_id, position) -> (du_id, Future)
+        self._prefetch_lock = threading.Lock()
+        self._prefetch_stats = {"hits": 0, "waits": 0, "misses": 0, "last": None}
         self._load_state()
 
     def _load_state(self):
@@ -35,10 +51,18 @@ class PlaybackService:
             json.dump({"active_playlist_id": self._current_playlist_id}, f, indent=2)
 
     def status(self):
+        with self._prefetch_lock:
+            prefetch = dict(self._prefetch_stats)
+            prefetch["depth"] = self._prefetch_depth
+            prefetch["pending"] = [
+                {"position": position, "du_id": du_id, "ready": future.done()}
+                for (_, position), (du_id, future) in sorted(self._prefetched.items())
+            ]
         return {
             "active_playlist_id": self._current_playlist_id,
             "is_running": self._thread is not None and self._thread.is_alive(),
             "is_paused": self._pause_event.is_set(),
+            "prefetch": prefetch,
         }
 
     def play(self, playlist_id):
@@ -61,6 +85,71 @@ class PlaybackService:
             self._pause_event.clear()
             self._current_playlist_id = None
             self._save_state()
+        self._clear_prefetch()
+
+    def _clear_prefetch(self):
+        with self._prefetch_lock:
+            for _, future in self._prefetched.values():
+                future.cancel()
+            self._prefetched.clear()
+
+    def _render(self, du):
+        # 帧缓存已命中的单元无需预渲染
+        if self.display_service.has_cached_frame(du):
+            return None
+        return du.get_image()
+
+    def _schedule_prefetch(self, playlist_id, du_ids, position):
+        if self._prefetch_depth == 0 or not du_ids:
+            return
+        if self._prefetch_executor is None:
+            self._prefetch_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="prefetch")
+        # 窗口不超过其余单元数，避免绕回正在显示的单元或重复预取同一位置
+        depth = min(self._prefetch_depth, len(du_ids) - 1)
+        positions = [
+            (position + step) % len(du_ids)
+            for step in range(1, depth + 1)
+            if du_ids[(position + step) % len(du_ids)] != du_ids[position % len(du_ids)]
+        ]
+        with self._prefetch_lock:
+            # 丢弃不再处于预取窗口内的结果，控制内存占用
+            window = {(playlist_id, next_position) for next_position in positions}
+            for key in list(self._prefetched):
+                if key not in window:
+                    self._prefetched.pop(key)[1].cancel()
+            for next_position in positions:
+                key = (playlist_id, next_position)
+                if key in self._prefetched:
+                    continue
+                du = self.api_controller.display_units.get(du_ids[next_position])
+                if du is None:
+                    continue
+                future = self._prefetch_executor.submit(self._render, du)
+                self._prefetched[key] = (du_ids[next_position], future)
+
+    def _take_prefetched(self, playlist_id, position, du_id):
+        """
+        取出预取结果
+        :return: PIL.Image对象；未预取、预取失败或已缓存时返回 None
+        """
+        with self._prefetch_lock:
+            entry = self._prefetched.pop((playlist_id, position), None)
+        if entry is None or entry[0] != du_id or entry[1].cancelled():
+            outcome, counter = "miss", "misses"
+            image = None
+        else:
+            future = entry[1]
+            outcome, counter = ("hit", "hits") if future.done() else ("wait", "waits")
+            try:
+                image = future.result()
+            except Exception as e:
+                print(f"Prefetch error for DU {du_id}: {e}")
+                outcome, counter = "miss", "misses"
+                image = None
+        with self._prefetch_lock:
+            self._prefetch_stats[counter] += 1
+            self._prefetch_stats["last"] = outcome
+        return image
 
     def _run(self):
         while not self._stop_event.is_set():
@@ -73,7 +162,8 @@ class PlaybackService:
                 self._save_state()
                 break
 
-            for du_id in playlist.get("display_units", []):
+            du_ids = playlist.get("display_units", [])
+            for position, du_id in enumerate(du_ids):
                 if self._stop_event.is_set():
                     break
                 while self._pause_event.is_set() and not self._stop_event.is_set():
@@ -82,8 +172,9 @@ class PlaybackService:
                 if not du:
                     continue
                 try:
-                    image = du.get_image()
-                    self.display_service.display_image(image)
+                    image = self._take_prefetched(playlist_id, position, du_id)
+                    self._schedule_prefetch(playlist_id, du_ids, position)
+                    self.display_service.display_unit(du, image=image)
                 except Exception as e:
                     print(f"Playback error for DU {du_id}: {e}")
                 duration = max(1, int(getattr(du, "display_time", 1)))
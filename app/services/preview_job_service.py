@@ -0,0 +1,157 @@
+import os
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+from PIL import Image
+
+from app.config import PREVIEW_JOB_WORKERS
+from app.services.image_library_service import ImageLibraryService
+from app.services.preview_store_service import get_preview_store
+from app.services.render_service import get_render_service
+
+
+class PreviewJob:
+    """预览渲染任务：在线程池中执行，调用方可等待、轮询或订阅完成事件"""
+
+    def __init__(self, image_id, enable_color_diffusion, key):
+        self.id = uuid.uuid4().hex
+        self.image_id = image_id
+        self.enable_color_diffusion = enable_color_diffusion
+        self.key = key
+        self.status = "pending"
+        self.error = None
+        self.created_at = time.time()
+        self.finished_at = None
+        self._event = threading.Event()
+
+    @property
+    def done(self):
+        return self._event.is_set()
+
+    def finish(self, status, error=None):
+        self.status = status
+        self.error = error
+        self.finished_at = time.time()
+        self._event.set()
+
+    def wait(self, timeout=None):
+        """
+        等待任务结束
+        :return: 是否已结束；失败时抛出原异常
+        """
+        finished = self._event.wait(timeout)
+        if self.error:
+            raise self.error
+        return finished
+
+    def to_dict(self):
+        return {
+            "id": self.id,
+            "image_id": self.image_id,
+            "enable_color_diffusion": self.enable_color_diffusion,
+            "status": self.status,
+            "error": str(self.error) if self.error else None,
+            "image_url": get_preview_store().url(self.key) if self.status == "done" else None,
+            "created_at": self.created_at,
+            "finished_at": self.finished_at,
+        }
+
+
+class PreviewJobService:
+    """预览任务服务：颜色扩散等慢速渲染交给有界线程池，相同 (图片内容, 选项) 的请求合并到同一任务"""
+
+    # 保留最近任务记录的数量（用于状态查询）
+    JOB_HISTORY = 200
+
+    def __init__(self, max_workers=None):
+        self.max_workers = max_workers or PREVIEW_JOB_WORKERS
+        self._executor = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix="preview")
+        self._lock = threading.Lock()
+        self._jobs = OrderedDict()
+        self._inflight = {}
+        self._stats = {"submitted": 0, "deduplicated": 0, "cached": 0, "rendered": 0, "failed": 0}
+
+    def submit(self, image_id, enable_color_diffusion=False):
+        """
+        提交预览任务
+        :param image_id: 图片库 ID
+        :param enable_color_diffusion: 是否颜色扩散
+        :return: PreviewJob（已有预览时直接为 done）；图片不存在返回 None
+        """
+        library_service = ImageLibraryService()
+        item = library_service.get_file_info(image_id)
+        if not item or not item.get("etag"):
+            return None
+        image_path = os.path.join(library_service.library_dir, item["filename"])
+
+        preview_store = get_preview_store()
+        key = preview_store.make_key("image", item["etag"], enable_color_diffusion)
+        with self._lock:
+            self._stats["submitted"] += 1
+            job = self._inflight.get(key)
+            if job is not None:
+                self._stats["deduplicated"] += 1
+                return job
+
+            job = PreviewJob(image_id, enable_color_diffusion, key)
+            self._remember(job)
+            if preview_store.contains(key):
+                self._stats["cached"] += 1
+                preview_store.touch(key)
+                job.finish("done")
+                return job
+            self._inflight[key] = job
+        self._executor.submit(self._run, job, image_path)
+        return job
+
+    def get_job(self, job_id):
+        with self._lock:
+            return self._jobs.get(job_id)
+
+    def _remember(self, job):
+        self._jobs[job.id] = job
+        while len(self._jobs) > self.JOB_HISTORY:
+            self._jobs.popitem(last=False)
+
+    def _run(self, job, image_path):
+        job.status = "running"
+
+        def _render():
+            image = Image.open(image_path).convert("RGB")
+            if job.enable_color_diffusion:
+                image = get_render_service().dither(image)
+            return image
+
+        try:
+            get_preview_store().get_or_render(job.key, _render)
+        except Exception as e:
+            status, error = "failed", e
+        else:
+            status, error = "done", None
+        with self._lock:
+            self._inflight.pop(job.key, None)
+            self._stats["rendered" if error is None else "failed"] += 1
+        job.finish(status, error)
+
+    def status(self):
+        with self._lock:
+            return {
+                "workers": self.max_workers,
+                "inflight": len(self._inflight),
+                **self._stats,
+            }
+
+
+_preview_jobs = None
+_preview_jobs_lock = threading.Lock()
+
+
+def get_preview_job_service():
+    global _preview_jobs
+    with _preview_jobs_lock:
+        if _preview_jobs is None:
+            _preview_jobs = PreviewJobService()
+    return _preview_jobs
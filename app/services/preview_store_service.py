@@ -0,0 +1,82 @@
+import hashlib
+import os
+import threading
+
+from app.config import BASE_DIR, PREVIEW_CACHE_MAX_MB
+from app.services.frame_cache_service import evict_lru
+from app.services.render_service import get_render_service
+
+
+class PreviewStoreService:
+    """预览图存储：渲染一次后按内容键保存编码好的 PNG，供浏览器按 URL 拉取并长期缓存"""
+
+    def __init__(self, max_bytes=None):
+        self.preview_dir = os.path.join(BASE_DIR, "storage", "previews")
+        self.max_bytes = max_bytes if max_bytes is not None else PREVIEW_CACHE_MAX_MB * 1024 * 1024
+        self._lock = threading.Lock()
+        os.makedirs(self.preview_dir, exist_ok=True)
+
+    @staticmethod
+    def make_key(*parts):
+        """
+        由内容键各部分生成存储键
+        :param parts: 如 ("image", etag, diffusion)
+        :return: sha1 十六进制串
+        """
+        return hashlib.sha1(repr(parts).encode("utf-8")).hexdigest()
+
+    @staticmethod
+    def url(key):
+        return f"/api/previews/{key}.png"
+
+    def path(self, key):
+        return os.path.join(self.preview_dir, f"{key}.png")
+
+    def contains(self, key):
+        return os.path.exists(self.path(key))
+
+    def touch(self, key):
+        # 更新 mtime 作为 LRU 访问时间
+        try:
+            os.utime(self.path(key))
+        except OSError:
+            pass
+
+    def put_image(self, key, image):
+        path = self.path(key)
+        tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        data = get_render_service().encode(image, "PNG")
+        with open(tmp_path, "wb") as f:
+            f.write(data)
+        os.replace(tmp_path, path)
+        self._evict()
+        return key
+
+    def get_or_render(self, key, render):
+        """
+        命中直接返回，否则调用 render() 渲染并保存
+        :param key: 存储键
+        :param render: 无参函数，返回 PIL Image
+        :return: 预览 URL
+        """
+        if self.contains(key):
+            self.touch(key)
+        else:
+            self.put_image(key, render())
+        return self.url(key)
+
+    def _evict(self):
+        with self._lock:
+            evict_lru(self.preview_dir, ".png", self.max_bytes)
+
+
+_preview_store = None
+_preview_store_lock = threading.Lock()
+
+
+def get_preview_store():
+    global _preview_store
+    with _preview_store_lock:
+        if _preview_store is None:
+            _preview_store = PreviewStoreService()
+    return _preview_store
@@ -0,0 +1,203 @@
+import multiprocessing
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from io import BytesIO
+from multiprocessing import shared_memory
+
+import numpy as np
+from PIL import Image
+
+from app.config import RENDER_WORKERS
+from app.services.image_processing_service import apply_color_diffusion, pack_nibbles, panel_codes
+
+
+# 各任务在 ndarray 上执行：输入 (H, W, 3) uint8，输出写入预分配数组
+
+def _resize_op(src, out, resample):
+    height, width = out.shape[:2]
+    out[...] = np.asarray(Image.fromarray(src, "RGB").resize((width, height), resample))
+
+
+def _dither_op(src, out):
+    out[...] = np.asarray(apply_color_diffusion(Image.fromarray(src, "RGB")))
+
+
+def _quantize_pack_op(src, out):
+    pack_nibbles(panel_codes(src), out)
+
+
+def _encode_op(src, fmt, params):
+    buffer = BytesIO()
+    Image.fromarray(src, "RGB").save(buffer, format=fmt, **params)
+    return buffer.getvalue()
+
+
+_OPS = {
+    "resize": _resize_op,
+    "dither": _dither_op,
+    "quantize_pack": _quantize_pack_op,
+    "encode": _encode_op,
+}
+
+
+def _attach(desc):
+    name, shape = desc
+    shm = shared_memory.SharedMemory(name=name)
+    return shm, np.ndarray(shape, dtype=np.uint8, buffer=shm.buf)
+
+
+def _run_task(op, src_desc, out_desc, args):
+    """
+    子进程入口：按名称挂载共享内存，直接在共享缓冲区上计算，不经 pickle 传递像素
+    """
+    src_shm, src = _attach(src_desc)
+    out_shm = None
+    try:
+        if out_desc is None:
+            return _OPS[op](src, *args)
+        out_shm, out = _attach(out_desc)
+        _OPS[op](src, out, *args)
+        del out
+        return None
+    finally:
+        del src
+        src_shm.close()
+        if out_shm is not None:
+            out_shm.close()
+
+
+class _SharedArray:
+    """父进程持有的共享内存数组，用完即 unlink"""
+
+    def __init__(self, shape):
+        self.shape = tuple(shape)
+        size = max(1, int(np.prod(self.shape)))
+        self.shm = shared_memory.SharedMemory(create=True, size=size)
+        self.array = np.ndarray(self.shape, dtype=np.uint8, buffer=self.shm.buf)
+
+    @property
+    def desc(self):
+        return self.shm.name, self.shape
+
+    def release(self):
+        del self.array
+        self.shm.close()
+        self.shm.unlink()
+
+
+class RenderService:
+    """渲染服务：缩放、颜色扩散、量化打包与编码交给进程池并行执行，像素经共享内存传递"""
+
+    def __init__(self, workers=None):
+        self.workers = RENDER_WORKERS if workers is None else workers
+        self._executor = None
+        self._lock = threading.Lock()
+        self._stats = {"pool": 0, "inline": 0, "fallback": 0}
+        self._stats_lock = threading.Lock()
+
+    def _get_executor(self):
+        with self._lock:
+            if self._executor is None and self.workers > 0:
+                # spawn：Flask 多线程进程中 fork 不安全
+                self._executor = ProcessPoolExecutor(
+                    max_workers=self.workers,
+                    mp_context=multiprocessing.get_context("spawn"),
+                )
+            return self._executor
+
+    def _call(self, op, src, out_shape, *args):
+        """
+        执行任务；单核（workers=0）或进程池不可用时在当前线程执行
+        :param src: (H, W, 3) uint8 输入
+        :param out_shape: 输出数组形状；None 表示任务直接返回结果
+        :return: 输出数组或任务返回值
+        """
+        executor = self._get_executor()
+        if executor is not None:
+            src_shared = _SharedArray(src.shape)
+            out_shared = _SharedArray(out_shape) if out_shape is not None else None
+            try:
+                src_shared.array[...] = src
+                result = executor.submit(
+                    _run_task, op, src_shared.desc, out_shared.desc if out_shared else None, args
+                ).result()
+                self._count("pool")
+                if out_shared is None:
+                    return result
+                return out_shared.array.copy()
+            except BrokenProcessPool:
+                with self._lock:
+                    self._executor = None
+                self._count("fallback")
+            finally:
+                src_shared.release()
+                if out_shared is not None:
+                    out_shared.release()
+
+        self._count("inline")
+        if out_shape is None:
+            return _OPS[op](src, *args)
+        out = np.empty(out_shape, dtype=np.uint8)
+        _OPS[op](src, out, *args)
+        return out
+
+    def _count(self, name):
+        # 请求线程、显示线程与预取线程并发调用
+        with self._stats_lock:
+            self._stats[name] += 1
+
+    @staticmethod
+    def _rgb(image):
+        return np.asarray(image.convert("RGB"))
+
+    def resize(self, image, size, resample=Image.LANCZOS):
+        """
+        缩放为 RGB 图像
+        :param size: (width, height)
+        """
+        width, height = size
+        out = self._call("resize", self._rgb(image), (height, width, 3), resample)
+        return Image.fromarray(out, "RGB")
+
+    def dither(self, image):
+        """
+        六色 Floyd-Steinberg 颜色扩散
+        """
+        rgb = self._rgb(image)
+        return Image.fromarray(self._call("dither", rgb, rgb.shape), "RGB")
+
+    def quantize_pack(self, image, out):
+        """
+        量化为面板颜色码并打包为 4bpp 缓冲区
+        :param out: 预分配的可写缓冲区（宽 * 高 / 2 字节）
+        :return: out
+        """
+        rgb = self._rgb(image)
+        packed = self._call("quantize_pack", rgb, (rgb.shape[0] * rgb.shape[1] // 2,))
+        memoryview(out)[:] = packed.data
+        return out
+
+    def encode(self, image, fmt="PNG", **params):
+        """
+        编码为图片字节
+        :param fmt: PIL 格式名（PNG / WEBP / JPEG ...）
+        :return: bytes
+        """
+        return self._call("encode", self._rgb(image), None, fmt, params)
+
+    def status(self):
+        with self._stats_lock:
+            return {"workers": self.workers, **self._stats}
+
+
+_render_service = None
+_render_service_lock = threading.Lock()
+
+
+def get_render_service():
+    global _render_service
+    with _render_service_lock:
+        if _render_service is None:
+            _render_service = RenderService()
+    return _render_service
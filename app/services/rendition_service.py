@@ -0,0 +1,134 @@
+import hashlib
+import os
+import threading
+
+from PIL import Image, features
+
+from app.config import BASE_DIR
+from app.services.render_service import get_render_service
+
+
+# 缩略图尺寸（保持 800x480 的 5:3 比例）
+RENDITION_SIZES = {
+    "thumb": (240, 144),
+    "medium": (480, 288),
+}
+
+if features.check("webp"):
+    RENDITION_FORMAT, RENDITION_EXT, RENDITION_MIMETYPE = "WEBP", "webp", "image/webp"
+else:
+    RENDITION_FORMAT, RENDITION_EXT, RENDITION_MIMETYPE = "JPEG", "jpg", "image/jpeg"
+
+# 原图无损转码格式：format -> (扩展名, mimetype)
+TRANSCODE_FORMATS = {"png": ("png", "image/png"), "bmp": ("bmp", "image/bmp")}
+if features.check("webp"):
+    TRANSCODE_FORMATS["webp"] = ("webp", "image/webp")
+
+_transcode_lock = threading.Lock()
+
+
+class RenditionService:
+    """图片库缩略图服务：为每张图片生成小尺寸 WebP/JPEG，文件内容 sha1 作为强 ETag"""
+
+    def __init__(self):
+        self.rendition_dir = os.path.join(BASE_DIR, "pic", "renditions")
+        os.makedirs(self.rendition_dir, exist_ok=True)
+
+    def path(self, entry):
+        return os.path.join(self.rendition_dir, entry["file"])
+
+    def generate(self, image_id, image):
+        """
+        生成全部尺寸的缩略图
+        :param image_id: 图片 ID
+        :param image: PIL Image（通常是已缩放到屏幕尺寸的 RGB 图）
+        :return: {size: {"file", "etag", "mimetype"}}，写入图片元数据的 renditions 字段
+        """
+        render_service = get_render_service()
+        renditions = {}
+        for size, dims in RENDITION_SIZES.items():
+            resized = render_service.resize(image, dims)
+            if RENDITION_FORMAT == "WEBP":
+                data = render_service.encode(resized, "WEBP", quality=80, method=4)
+            else:
+                data = render_service.encode(resized, "JPEG", quality=82, optimize=True, progressive=True)
+
+            filename = f"{image_id}_{size}.{RENDITION_EXT}"
+            path = os.path.join(self.rendition_dir, filename)
+            tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+            with open(tmp_path, "wb") as f:
+                f.write(data)
+            os.replace(tmp_path, path)
+
+            renditions[size] = {
+                "file": filename,
+                "etag": hashlib.sha1(data).hexdigest(),
+                "mimetype": RENDITION_MIMETYPE,
+            }
+        return renditions
+
+    def is_complete(self, renditions):
+        if not renditions:
+            return False
+        for size in RENDITION_SIZES:
+            entry = renditions.get(size)
+            if not entry or not os.path.exists(self.path(entry)):
+                return False
+        return True
+
+    def transcoded(self, source_path, etag, fmt):
+        """
+        原图无损转码（PNG/WebP/BMP），按源文件内容哈希缓存，同一内容只转码一次
+        :param source_path: 原图路径
+        :param etag: 原图内容 sha1
+        :param fmt: png / webp / bmp
+        :return: (转码文件路径, mimetype)
+        """
+        ext, mimetype = TRANSCODE_FORMATS[fmt]
+        path = os.path.join(self.rendition_dir, f"{etag}.{ext}")
+        if os.path.exists(path):
+            return path, mimetype
+        with _transcode_lock:
+            if not os.path.exists(path):
+                tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+                with Image.open(source_path) as image:
+                    if fmt == "webp":
+                        data = get_render_service().encode(image, "WEBP", lossless=True, method=4)
+                    elif fmt == "bmp":
+                        data = get_render_service().encode(image, "BMP")
+                    else:
+                        data = get_render_service().encode(image, "PNG", optimize=True)
+                with open(tmp_path, "wb") as f:
+                    f.write(data)
+                os.replace(tmp_path, path)
+        return path, mimetype
+
+    def remove_transcoded(self, etag):
+        if not etag:
+            return
+        for ext, _ in TRANSCODE_FORMATS.values():
+            try:
+                os.remove(os.path.join(self.rendition_dir, f"{etag}.{ext}"))
+            except OSError:
+                pass
+
+    def remove(self, renditions):
+        for entry in (renditions or {}).values():
+            try:
+                os.remove(self.path(entry))
+            except OSError:
+                pass
+
+
+def rendition_url(item, size="thumb"):
+    """
+    缩略图 URL，带内容版本号 v 以便浏览器长期缓存
+    :param item: 图片元数据
+    :param size: thumb / medium
+    :return: URL 字符串
+    """
+    url = f"/api/image-library/{item['id']}/thumb?size={size}"
+    entry = (item.get("renditions") or {}).get(size)
+    if entry:
+        url += f"&v={entry['etag'][:16]}"
+    return url
@@ -0,0 +1,127 @@
+import os
+import tempfile
+
+from flask import Request
+from PIL import Image, UnidentifiedImageError
+from werkzeug.exceptions import RequestEntityTooLarge
+
+from app.config import UPLOAD_MAX_MB, UPLOAD_MAX_PIXELS, UPLOAD_TMP_DIR
+
+
+# EXIF Orientation -> 转置操作（与 ImageOps.exif_transpose 相同）
+_ORIENTATION = {
+    2: Image.FLIP_LEFT_RIGHT,
+    3: Image.ROTATE_180,
+    4: Image.FLIP_TOP_BOTTOM,
+    5: Image.TRANSPOSE,
+    6: Image.ROTATE_270,
+    7: Image.TRANSVERSE,
+    8: Image.ROTATE_90,
+}
+_EXIF_ORIENTATION = 0x0112
+
+
+class UploadError(ValueError):
+    """上传文件超出大小/像素限制"""
+
+
+class _LimitedFile:
+    """写入超过上限即中止的上传临时文件"""
+
+    def __init__(self, fp, limit):
+        self._fp = fp
+        self._limit = limit
+        self._written = 0
+
+    def write(self, data):
+        self._written += len(data)
+        if self._written > self._limit:
+            raise RequestEntityTooLarge(f"File exceeds {UPLOAD_MAX_MB} MB")
+        return self._fp.write(data)
+
+    def __getattr__(self, name):
+        return getattr(self._fp, name)
+
+    def __iter__(self):
+        return iter(self._fp)
+
+
+class UploadRequest(Request):
+    """上传文件一律落盘到 UPLOAD_TMP_DIR（Pi 上 /tmp 可能是内存盘），并限制单个文件大小"""
+
+    def _get_file_stream(self, total_content_length, content_type, filename=None, content_length=None):
+        os.makedirs(UPLOAD_TMP_DIR, exist_ok=True)
+        # TemporaryFile 创建后即 unlink，请求结束关闭即释放
+        fp = tempfile.TemporaryFile("w+b", dir=UPLOAD_TMP_DIR)
+        return _LimitedFile(fp, UPLOAD_MAX_MB * 1024 * 1024)
+
+
+def _palette_mode(image):
+    """
+    :return: 调色板图像展开后的模式：灰度调色板为 L，否则 RGB（透明通道最终会被丢弃，不展开为 RGBA）
+    """
+    palette = image.getpalette() or []
+    if all(palette[i] == palette[i + 1] == palette[i + 2] for i in range(0, len(palette) - 2, 3)):
+        return "L"
+    return "RGB"
+
+
+def _reduce(image, factor):
+    """
+    按原模式整数倍缩小
+    """
+    bands = image.getbands()
+    if "A" in bands:
+        # 结果会丢弃透明通道：逐个颜色通道缩小，避免 reduce 预乘 alpha 时分配全尺寸副本
+        mode = {"RGBA": "RGB", "LA": "L"}.get(image.mode)
+        if mode is not None:
+            return Image.merge(mode, [image.getchannel(band).reduce(factor) for band in bands if band != "A"])
+    try:
+        return image.reduce(factor)
+    except ValueError:
+        # 16 位灰度等 reduce 不支持的模式：BOX 缩放等价于整数倍平均
+        return image.resize((image.width // factor, image.height // factor), Image.BOX)
+
+
+def open_upload_image(fp, size):
+    """
+    按目标尺寸增量解码上传图片：JPEG 在 DCT 域按 1/2~1/8 缩小解码，其余格式先按原模式整数倍 reduce 再转 RGB，最后按 EXIF 方向转正
+    :param fp: 文件路径或文件对象
+    :param size: 目标尺寸 (width, height)，返回的图像不小于该尺寸（原图更小时保持原尺寸）
+    :return: 已加载的 RGB 图像
+    :raises UploadError: 像素数超过 UPLOAD_MAX_PIXELS
+    :raises ValueError: 无法识别的图片格式
+    """
+    try:
+        source = Image.open(fp)
+    except UnidentifiedImageError:
+        raise ValueError("Unsupported image format")
+    with source:
+        width, height = source.size
+        if width * height > UPLOAD_MAX_PIXELS:
+            raise UploadError(f"Image is {width}x{height}, exceeds {UPLOAD_MAX_PIXELS} pixels")
+
+        orientation = source.getexif().get(_EXIF_ORIENTATION, 1)
+        # 5~8 方向转正后宽高互换，缩小目标也要互换
+        target = (size[1], size[0]) if orientation in (5, 6, 7, 8) else size
+        if source.format == "JPEG":
+            source.draft("RGB", target)
+
+        # 先按原模式缩小再转 RGB，不分配全尺寸 RGB 副本；调色板图像无法对索引取平均，先展开为 L / RGB
+        if source.mode in ("P", "PA"):
+            image = source.convert(_palette_mode(source))
+        elif source.mode == "1":
+            image = source.convert("L")
+        else:
+            image = source
+        factor = min(image.width // target[0], image.height // target[1])
+        if factor >= 2:
+            image = _reduce(image, factor)
+        if image.mode != "RGB":
+            image = image.convert("RGB")
+        if orientation in _ORIENTATION:
+            image = image.transpose(_ORIENTATION[orientation])
+        if image is source:
+            # source 在退出 with 时关闭
+            image = source.copy()
+        return image
@@ -1,5 +1,7 @@
+import hashlib
 import json
 import os
+import threading
 
 from app.config import BASE_DIR
 
@@ -7,10 +9,15 @@ from app.config import BASE_DIR
 class WeatherCacheService:
     """天气图片缓存"""
 
+    # 读改写 weather_cache.json 的进程内锁（生成线程与日内刷新线程并发写入）
+    _lock = threading.RLock()
+
     def __init__(self):
         self.storage_dir = os.path.join(BASE_DIR, "storage")
         self.cache_file = os.path.join(self.storage_dir, "weather_cache.json")
+        self.background_dir = os.path.join(self.storage_dir, "weather_backgrounds")
         os.makedirs(self.storage_dir, exist_ok=True)
+        os.makedirs(self.background_dir, exist_ok=True)
         if not os.path.exists(self.cache_file):
             with open(self.cache_file, "w", encoding="utf-8") as f:
                 json.dump({}, f)
@@ -24,12 +31,42 @@ class WeatherCacheService:
             json.dump(data, f, indent=2, ensure_ascii=False)
 
     def get(self, date_key, location):
-        data = self._load()
+        with self._lock:
+            data = self._load()
         return data.get(date_key, {}).get(location)
 
     def set(self, date_key, location, value):
-        data = self._load()
-        day = data.get(date_key, {})
-        day[location] = value
-        data[date_key] = day
-        self._save(data)
+        with self._lock:
+            data = self._load()
+            day = data.get(date_key, {})
+            day[location] = value
+            data[date_key] = day
+            self._save(data)
+
+    def background_path(self, filename):
+        return os.path.join(self.background_dir, filename)
+
+    def save_background(self, date_key, location, image):
+        """
+        保存当日 AI 生成的背景图（不含文字层），日内刷新时在其上重新合成文字
+        :return: 背景图文件名
+        """
+        location_hash = hashlib.sha1(str(location).encode("utf-8")).hexdigest()[:12]
+        filename = f"{date_key}_{location_hash}.png"
+        path = self.background_path(filename)
+        tmp_path = f"{path}.{threading.get_ident()}.tmp"
+        image.convert("RGB").save(tmp_path, format="PNG")
+        os.replace(tmp_path, path)
+        self.prune_backgrounds(date_key)
+        return filename
+
+    def prune_backgrounds(self, keep_date_key):
+        """
+        删除早于 keep_date_key 的背景图
+        """
+        for entry in os.scandir(self.background_dir):
+            if entry.name[:len(keep_date_key)] < keep_date_key:
+                try:
+                    os.remove(entry.path)
+                except OSError:
+                    pass
@@ -0,0 +1,100 @@
+import threading
+import time
+
+from app.config import WEATHER_REFRESH_INTERVAL
+from app.services.weather_service import get_weather_service
+
+
+class WeatherRefreshService:
+    """天气日内刷新：按间隔重新获取实时天气，数值变化的天气单元只重新合成文字层，不重新生成背景"""
+
+    def __init__(self, interval=None):
+        self.interval = WEATHER_REFRESH_INTERVAL if interval is None else interval
+        self._thread = None
+        self._wakeup = threading.Event()
+        self._lock = threading.Lock()
+        self._stats = {
+            "runs": 0, "recomposed": 0, "unchanged": 0, "failed": 0,
+            "last_run": None, "last_duration": None, "last_error": None,
+        }
+
+    def start(self):
+        """
+        启动刷新线程（已启动或 interval<=0 时不做任何事）
+        """
+        if self.interval <= 0:
+            return
+        with self._lock:
+            if self._thread is not None and self._thread.is_alive():
+                return
+            self._thread = threading.Thread(target=self._run, daemon=True, name="weather-refresh")
+            self._thread.start()
+
+    def trigger(self):
+        """
+        立即执行一次刷新
+        """
+        self._wakeup.set()
+
+    def _run(self):
+        while True:
+            self._wakeup.wait(self.interval)
+            self._wakeup.clear()
+            try:
+                self.refresh_all()
+            except Exception as e:
+                print(f"Weather refresh error: {e}")
+
+    def refresh_all(self):
+        """
+        并发取回全部地点的最新天气，再逐个单元比较并重新合成
+        :return: 本次重新合成的单元数
+        """
+        started = time.monotonic()
+        weather_service = get_weather_service()
+        units = [unit for unit in weather_service.watchers() if hasattr(unit, "refresh_overlay")]
+        if units:
+            weather_service.get_weather_map(refresh=True)
+
+        recomposed = unchanged = failed = 0
+        last_error = None
+        for unit in units:
+            try:
+                if unit.refresh_overlay():
+                    recomposed += 1
+                else:
+                    unchanged += 1
+            except Exception as e:
+                failed += 1
+                last_error = f"{getattr(unit, 'location', '')}: {e}"
+
+        with self._lock:
+            self._stats["runs"] += 1
+            self._stats["recomposed"] += recomposed
+            self._stats["unchanged"] += unchanged
+            self._stats["failed"] += failed
+            self._stats["last_run"] = time.time()
+            self._stats["last_duration"] = round(time.monotonic() - started, 3)
+            if last_error:
+                self._stats["last_error"] = last_error
+        return recomposed
+
+    def status(self):
+        with self._lock:
+            return {
+                "interval": self.interval,
+                "running": self._thread is not None and self._thread.is_alive(),
+                **self._stats,
+            }
+
+
+_weather_refresh = None
+_weather_refresh_lock = threading.Lock()
+
+
+def get_weather_refresh_service():
+    global _weather_refresh
+    with _weather_refresh_lock:
+        if _weather_refresh is None:
+            _weather_refresh = WeatherRefreshService()
+    return _weather_refresh
@@ -1,8 +1,10 @@
 import os
 from datetime import datetime
+import threading
 import time
+import weakref
+from concurrent.futures import Future, ThreadPoolExecutor
 import jwt
-import requests
 
 from app.config import (
     WEATHER_API_HOST,
@@ -10,13 +12,20 @@ from app.config import (
     WEATHER_PEM_KEY,
     WEATHER_SUB_ID,
     WEATHER_KID_ID,
+    WEATHER_FETCH_WORKERS,
+    WEATHER_RESULT_TTL,
 )
+from app.services.http_service import get_http_service
 from app.services.logging_service import get_api_logger
 
 
 class WeatherService:
     """天气服务：获取今日天气"""
 
+    # JWT 有效期与提前续签的余量（秒）
+    JWT_TTL = 900
+    JWT_REFRESH_MARGIN = 60
+
     def __init__(self):
         if not WEATHER_API_HOST:
             raise ValueError("WEATHER_API_HOST not configured")
@@ -24,24 +33,43 @@ class WeatherService:
         if not WEATHER_API_TOKEN and not (WEATHER_PEM_KEY and WEATHER_SUB_ID and WEATHER_KID_ID):
             raise ValueError("WEATHER_API_TOKEN or WEATHER_PEM_KEY/WEATHER_SUB_ID/WEATHER_KID_ID not configured")
 
+        self._lock = threading.Lock()
+        self._jwt = None
+        self._jwt_expires_at = 0
+        self._inflight = {}
+        self._results = {}
+        self._watchers = weakref.WeakKeyDictionary()
+        self._executor = ThreadPoolExecutor(max_workers=WEATHER_FETCH_WORKERS, thread_name_prefix="weather")
+        self._stats = {"requests": 0, "coalesced": 0, "cache_hits": 0, "jwt_signed": 0}
+
     def _build_jwt(self):
+        """
+        返回签名 JWT；到期前 JWT_REFRESH_MARGIN 秒内复用同一个令牌
+        """
         key = WEATHER_PEM_KEY
         sub_id = WEATHER_SUB_ID
         kid_id = WEATHER_KID_ID
         if not key or not sub_id or not kid_id:
             return None
-        key = key.replace("\\n", "\n")
-        payload = {
-            "iat": int(time.time()) - 30,
-            "exp": int(time.time()) + 900,
-            "sub": sub_id,
-        }
-        headers = {
-            "kid": kid_id,
-        }
-        return jwt.encode(payload, key, algorithm="EdDSA", headers=headers)
+        with self._lock:
+            now = int(time.time())
+            if self._jwt and now < self._jwt_expires_at - self.JWT_REFRESH_MARGIN:
+                return self._jwt
+            key = key.replace("\\n", "\n")
+            payload = {
+                "iat": now - 30,
+                "exp": now + self.JWT_TTL,
+                "sub": sub_id,
+            }
+            headers = {
+                "kid": kid_id,
+            }
+            self._jwt = jwt.encode(payload, key, algorithm="EdDSA", headers=headers)
+            self._jwt_expires_at = payload["exp"]
+            self._stats["jwt_signed"] += 1
+            return self._jwt
 
-    def get_today_weather(self, location):
+    def _fetch_now(self, location):
         host = WEATHER_API_HOST.rstrip('/')
         if not host.startswith("http://") and not host.startswith("https://"):
             host = "https://" + host
@@ -54,7 +82,7 @@ class WeatherService:
             "location": location,
         }
         logger.info(f"WEATHER_REQUEST url={url} location={location}")
-        response = requests.get(url, headers=headers, params=params, timeout=20)
+        response = get_http_service().get(url, headers=headers, params=params)
         logger.info(f"WEATHER_RESPONSE status={response.status_code} url={response.url}")
         response.raise_for_status()
         data = response.json()
@@ -63,6 +91,109 @@ class WeatherService:
             raise ValueError(f"Weather API error: {data.get('code')}")
         return data
 
+    def get_today_weather(self, location, refresh=False):
+        """
+        获取实时天气；同一地点的并发查询合并为一次请求，成功结果在 WEATHER_RESULT_TTL 秒内复用
+        :param location: 地点 ID 或经纬度
+        :param refresh: 忽略已缓存结果重新请求（仍与进行中的请求合并）
+        :return: /v7/weather/now 响应
+        """
+        with self._lock:
+            cached = self._results.get(location)
+            if cached and not refresh and cached[0] > time.monotonic():
+                self._stats["cache_hits"] += 1
+                return cached[1]
+            future = self._inflight.get(location)
+            owner = future is None
+            if owner:
+                future = Future()
+                self._inflight[location] = future
+                self._stats["requests"] += 1
+            else:
+                self._stats["coalesced"] += 1
+        if not owner:
+            return future.result()
+
+        try:
+            data = self._fetch_now(location)
+        except Exception as e:
+            with self._lock:
+                del self._inflight[location]
+            future.set_exception(e)
+            raise
+        with self._lock:
+            del self._inflight[location]
+            if WEATHER_RESULT_TTL > 0:
+                self._results[location] = (time.monotonic() + WEATHER_RESULT_TTL, data)
+        future.set_result(data)
+        return data
+
+    def watch(self, owner, location):
+        """
+        登记需要天气数据的地点；owner 被回收后自动注销
+        :param owner: 使用方（如 WeatherDisplayUnit）
+        """
+        with self._lock:
+            self._watchers[owner] = location
+
+    def locations(self):
+        with self._lock:
+            return sorted({location for location in self._watchers.values() if location})
+
+    def watchers(self):
+        """
+        :return: 当前登记的使用方列表
+        """
+        with self._lock:
+            return list(self._watchers.keys())
+
+    def get_weather_map(self, locations=None, refresh=False):
+        """
+        并发获取多个地点的实时天气
+        :param locations: 地点列表，默认为全部已登记地点
+        :param refresh: 忽略已缓存结果重新请求
+        :return: {location: {"data": 响应或 None, "error": 错误信息或 None}}
+        """
+        if locations is None:
+            locations = self.locations()
+        futures = {
+            location: self._executor.submit(self.get_today_weather, location, refresh)
+            for location in dict.fromkeys(locations)
+        }
+        results = {}
+        for location, future in futures.items():
+            try:
+                results[location] = {"data": future.result(), "error": None}
+            except Exception as e:
+                results[location] = {"data": None, "error": str(e)}
+        return results
+
+    def status(self):
+        with self._lock:
+            return {
+                "locations": sorted({location for location in self._watchers.values() if location}),
+                "inflight": len(self._inflight),
+                "cached": len(self._results),
+                "jwt_expires_at": self._jwt_expires_at or None,
+                **self._stats,
+            }
+
     @staticmethod
     def today_key():
         return datetime.now().strftime("%Y-%m-%d")
+
+
+_weather_service = None
+_weather_service_lock = threading.Lock()
+
+
+def get_weather_service():
+    """
+    共享的天气服务（JWT、合并查询与结果缓存在所有天气单元间共用）
+    :raises ValueError: 天气 API 未配置
+    """
+    global _weather_service
+    with _weather_service_lock:
+        if _weather_service is None:
+            _weather_service = WeatherService()
+    return _weather_service
@@ -327,7 +327,7 @@ function createPlaylistItemHTML(playlist) {
             if (imageId) {
                 metaHtml = `
                     <div class="playlist-du-meta">
-                        <img class="playlist-du-thumb" loading="lazy" src="/api/image-library/${imageId}/file?t=${Date.now()}" alt="${name}">
+                        <img class="playlist-du-thumb" loading="lazy" src="/api/image-library/${imageId}/thumb" alt="${name}">
                     </div>
                 `;
             }
@@ -651,19 +651,55 @@ function updateEditorPreview(imageId, diffusionToggle, previewImg, requestToken,
         setEditorPreviewState(previewWrap, 'error', '预览加载失败，请稍后重试');
     }, { once: true });
 
-    previewImg.classList.add('img-loading');
     const diffusion = diffusionToggle ? diffusionToggle.checked : false;
-    // fast path: show original immediately
-    previewImg.src = `/api/image-preview/file?image_id=${encodeURIComponent(imageId)}&enable_color_diffusion=false&async=true&t=${Date.now()}`;
-    if (diffusion) {
-        window.setTimeout(() => {
-            if (requestToken !== editorPreviewRequestToken) {
-                return;
-            }
-            previewImg.classList.add('img-loading');
-            previewImg.src = `/api/image-preview/file?image_id=${encodeURIComponent(imageId)}&enable_color_diffusion=true&async=false&t=${Date.now()}`;
-        }, 200);
+    loadLibraryPreview(previewImg, imageId, diffusion, () => requestToken === editorPreviewRequestToken);
+}
+
+// 先显示原图；颜色扩散由后台任务渲染，完成后经 SSE 通知再替换
+function loadLibraryPreview(previewImg, imageId, diffusion, isCurrent = () => true) {
+    previewImg.classList.add('img-loading');
+    previewImg.src = `/api/image-library/${encodeURIComponent(imageId)}/file`;
+    if (!diffusion) {
+        return;
     }
+
+    const swapIn = (url) => {
+        if (!url || !isCurrent()) {
+            return;
+        }
+        previewImg.classList.add('img-loading');
+        previewImg.addEventListener('load', () => previewImg.classList.remove('img-loading'), { once: true });
+        previewImg.src = url;
+    };
+
+    fetch('/api/image-preview/jobs', {
+        method: 'POST',
+        headers: { 'Content-Type': 'application/json' },
+        body: JSON.stringify({ image_id: imageId, enable_color_diffusion: true })
+    })
+    .then(response => response.json())
+    .then(job => {
+        if (job.error) {
+            throw new Error(job.error);
+        }
+        if (job.status === 'done') {
+            swapIn(job.image_url);
+            return;
+        }
+        const source = new EventSource(job.events_url);
+        source.addEventListener('done', (event) => {
+            source.close();
+            swapIn(JSON.parse(event.data).image_url);
+        });
+        source.addEventListener('failed', (event) => {
+            source.close();
+            console.error('Preview job failed:', JSON.parse(event.data).error);
+        });
+        source.onerror = () => source.close();
+    })
+    .catch(error => {
+        console.error('Error loading preview:', error);
+    });
 }
 
 function setEditorPreviewState(previewWrap, state, text) {
@@ -884,7 +920,7 @@ function renderImageSelectGrid(images, grid, input) {
         div.style.setProperty('--i', idx + 1);
         div.dataset.imageId = item.id;
         div.innerHTML = `
-            <img class="img-loading" loading="lazy" src="/api/image-library/${item.id}/file?t=${Date.now()}" alt="${item.original_name}">
+            <img class="img-loading" loading="lazy" src="${item.thumb_url}" alt="${item.original_name}">
             <div class="image-select-name">${item.original_name}</div>
         `;
         div.addEventListener('click', () => {
@@ -908,16 +944,9 @@ function updateAddPreview(imageIdInput, diffusionToggle, preview, previewImg) {
     if (!imageIdInput || !imageIdInput.value || !preview || !previewImg) {
         return;
     }
-    previewImg.classList.add('img-loading');
     const diffusion = diffusionToggle ? diffusionToggle.checked : false;
-    // fast path: show original immediately
-    previewImg.src = `/api/image-preview/file?image_id=${encodeURIComponent(imageIdInput.value)}&enable_color_diffusion=false&async=true&t=${Date.now()}`;
-    if (diffusion) {
-        window.setTimeout(() => {
-            previewImg.classList.add('img-loading');
-            previewImg.src = `/api/image-preview/file?image_id=${encodeURIComponent(imageIdInput.value)}&enable_color_diffusion=true&async=false&t=${Date.now()}`;
-        }, 200);
-    }
+    const imageId = imageIdInput.value;
+    loadLibraryPreview(previewImg, imageId, diffusion, () => imageIdInput.value === imageId && diffusionToggle.checked);
     preview.style.display = 'block';
 }
 
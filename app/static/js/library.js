@@ -35,7 +35,7 @@ function initUploadControls() {
             if (!uploadInput.files || uploadInput.files.length === 0) {
                 return;
             }
-            uploadFile(uploadInput.files[0]);
+            uploadFiles(Array.from(uploadInput.files));
             uploadInput.value = '';
         });
     }
@@ -52,16 +52,16 @@ function initUploadControls() {
             e.preventDefault();
             dropzone.classList.remove('dragover');
             if (e.dataTransfer.files && e.dataTransfer.files.length > 0) {
-                uploadFile(e.dataTransfer.files[0]);
+                uploadFiles(Array.from(e.dataTransfer.files));
             }
         });
     }
 }
 
-async function uploadFile(file) {
+async function uploadFiles(files) {
     const uploadBtn = document.getElementById('library-upload-btn');
     const formData = new FormData();
-    formData.append('file', file);
+    files.forEach((file) => formData.append('file', file));
 
     ui.setButtonBusy(uploadBtn, true, '上传中...');
 
@@ -75,7 +75,12 @@ async function uploadFile(file) {
             throw new Error(result.error);
         }
 
-        ui.toast('上传成功，正在刷新列表', 'success');
+        const failed = result.errors || [];
+        if (failed.length > 0) {
+            ui.toast(`${result.items.length} 张上传成功，${failed.length} 张失败：${failed[0].filename} ${failed[0].error}`, 'error');
+        } else {
+            ui.toast('上传成功，正在刷新列表', 'success');
+        }
         await loadImageLibrary();
     } catch (error) {
         console.error('Error uploading image:', error);
@@ -138,7 +143,7 @@ function renderLibraryGrid(images) {
             : `<span class="library-status ${status}">${statusLabel(status)}</span>`;
         div.innerHTML = `
             <div class="library-thumb">
-                <img class="img-loading" loading="lazy" src="/api/image-library/${item.id}/file?t=${Date.now()}" alt="${escapeHtml(item.original_name)}">
+                <img class="img-loading" loading="lazy" src="${item.thumb_url}" alt="${escapeHtml(item.original_name)}">
                 <div class="library-processing-mask" aria-hidden="true">
                     <span class="library-processing-chip">AI 生成中</span>
                     <span class="library-processing-spinner"></span>
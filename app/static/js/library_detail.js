@@ -301,7 +301,7 @@ function startPolling(imageId) {
 
             if (data.status === 'ready') {
                 const img = document.getElementById('detail-image');
-                img.src = `${data.file_url}?t=${Date.now()}`;
+                img.src = data.file_url;
                 statusMachine.setSuccess('生成完成', '图片已更新');
                 if (previewMachine) {
                     previewMachine.setSuccess('预览图生成完成', '展示已自动更新');
@@ -9,7 +9,6 @@ function initText2ImagePage() {
     const error = document.getElementById('error');
     const resultContent = document.getElementById('result-content');
     const resultImage = document.getElementById('result-image');
-    const resultPath = document.getElementById('result-path');
     const resultTime = document.getElementById('result-time');
     const resultLibrary = document.getElementById('result-library');
     const previewBtn = document.getElementById('preview-on-epaper');
@@ -83,22 +82,18 @@ function initText2ImagePage() {
                 throw new Error(data.error);
             }
 
-            if (!data.image_url || !data.save_path) {
+            if (!data.image_url || !data.image_id) {
                 throw new Error('生成结果不完整，请稍后重试');
             }
 
             resultImage.src = data.image_url;
-            resultPath.textContent = `保存路径：${data.save_path}`;
-            resultLibrary.textContent = data.image_id
-                ? `图片库：已保存（ID: ${data.image_id}）`
-                : '图片库：未保存';
+            resultLibrary.textContent = `图片库：已保存（ID: ${data.image_id}）`;
             resultTime.textContent = `生成时间：${new Date().toLocaleString()}`;
             resultContent.style.display = 'block';
             ui.toast('图片生成完成', 'success');
 
             currentImageData = {
-                save_path: data.save_path,
-                image_id: data.image_id || null
+                image_id: data.image_id
             };
         } catch (err) {
             console.error('Error:', err);
@@ -129,8 +124,7 @@ function initText2ImagePage() {
                     },
                     body: JSON.stringify({
                         type: 'ImageDisplayUnit',
-                        image_id: currentImageData.image_id,
-                        image_path: currentImageData.save_path
+                        image_id: currentImageData.image_id
                     })
                 });
 
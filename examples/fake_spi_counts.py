@@ -0,0 +1,87 @@
+#!/usr/bin/python
+# -*- coding:utf-8 -*-
+"""
+Check the SPI transfer counts of the batched EPD driver on the fake backend.
+
+Runs init(), Clear() and display_stream() against EPD_BACKEND=fake and
+asserts the number of transfers and bytes each one issues: one transfer
+per command byte and one per payload, where the original init() sent every
+data byte separately. Frames go out as one transfer (Clear) or in CHUNK
+slices (display_stream). Exits non-zero on any mismatch. No panel is needed.
+
+    python examples/fake_spi_counts.py
+"""
+import math
+import os
+import sys
+
+os.environ["EPD_BACKEND"] = "fake"
+
+basedir = os.path.dirname(os.path.dirname(os.path.realpath(__file__)))
+sys.path.insert(0, os.path.join(basedir, "lib"))
+
+from waveshare_epd import epd7in3e, epdconfig
+
+FRAME_BYTES = epd7in3e.EPD_WIDTH * epd7in3e.EPD_HEIGHT // 2
+CHUNK = 4096
+# TurnOnDisplay: POWER_ON, DISPLAY_REFRESH + 1 byte, POWER_OFF + 1 byte
+TURN_ON_TRANSFERS = 5
+TURN_ON_BYTES = 5
+
+
+def measure(func, *args):
+    epdconfig.implementation.reset_spi_stats()
+    func(*args)
+    return epdconfig.implementation.spi_stats()
+
+
+def check(name, stats, transfers, nbytes, original_transfers):
+    ok = stats["transfers"] == transfers and stats["bytes"] == nbytes
+    print(
+        f"{name:16s} {stats['transfers']:6d} transfers (expected {transfers}, "
+        f"original driver {original_transfers})  {stats['bytes']:7d} bytes (expected {nbytes})  "
+        f"{'ok' if ok else 'MISMATCH'}"
+    )
+    return ok
+
+
+def main():
+    epd = epd7in3e.EPD()
+    payload = sum(len(data) for _, data in epd.INIT_SEQUENCE)
+    commands = len(epd.INIT_SEQUENCE)
+    results = []
+
+    # every command and every non-empty payload is one transfer, plus POWER_ON
+    stats = measure(epd.init)
+    results.append(check(
+        "init", stats,
+        transfers=commands + sum(1 for _, data in epd.INIT_SEQUENCE if data) + 1,
+        nbytes=commands + payload + 1,
+        original_transfers=commands + payload + 1,
+    ))
+
+    stats = measure(epd.Clear)
+    results.append(check(
+        "Clear", stats,
+        transfers=2 + TURN_ON_TRANSFERS,
+        nbytes=1 + FRAME_BYTES + TURN_ON_BYTES,
+        original_transfers=2 + TURN_ON_TRANSFERS,
+    ))
+    # commands go out with DC low, payloads with DC high
+    frame = [entry for entry in stats["log"] if entry[1] == FRAME_BYTES]
+    results.append(len(frame) == 1 and frame[0][0] == 1 and stats["log"][0] == (0, 1))
+
+    stats = measure(epd.display_stream, bytes(FRAME_BYTES), CHUNK)
+    results.append(check(
+        "display_stream", stats,
+        transfers=1 + math.ceil(FRAME_BYTES / CHUNK) + TURN_ON_TRANSFERS,
+        nbytes=1 + FRAME_BYTES + TURN_ON_BYTES,
+        original_transfers=2 + TURN_ON_TRANSFERS,
+    ))
+
+    if not all(results):
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
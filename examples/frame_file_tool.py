@@ -0,0 +1,91 @@
+#!/usr/bin/python
+# -*- coding:utf-8 -*-
+"""
+Validate and create panel frame files (64-byte header + raw 4bpp nibbles).
+
+DisplayService mmaps these files and streams the payload to SPI in chunks,
+so a frame is never copied into the Python heap.
+
+    python examples/frame_file_tool.py validate <file.frame> [...]
+    python examples/frame_file_tool.py convert <image_id> [...]
+    python examples/frame_file_tool.py convert --all
+"""
+import argparse
+import os
+import sys
+
+basedir = os.path.dirname(os.path.dirname(os.path.realpath(__file__)))
+sys.path.insert(0, basedir)
+
+from app.config import SCREEN_WIDTH, SCREEN_HEIGHT
+from app.services.frame_file_service import PANEL_MODEL, FrameFileError, validate_frame_file
+from app.services.image_library_service import ImageLibraryService
+from app.services.image_processing_service import PANEL_FRAME_VERSION
+
+
+def validate(paths, strict):
+    expected = {}
+    if strict:
+        expected = {
+            "width": SCREEN_WIDTH,
+            "height": SCREEN_HEIGHT,
+            "model": PANEL_MODEL,
+            "palette_version": PANEL_FRAME_VERSION,
+        }
+    failed = 0
+    for path in paths:
+        try:
+            header = validate_frame_file(path, **expected)
+        except FrameFileError as e:
+            failed += 1
+            print(f"INVALID {path}: {e}")
+            continue
+        print(
+            f"ok      {path}: {header['model']} {header['width']}x{header['height']} "
+            f"palette={header['palette_version']} payload={header['payload_size']}"
+        )
+    return failed
+
+
+def convert(image_ids, convert_all):
+    service = ImageLibraryService()
+    if convert_all:
+        image_ids = [item["id"] for item in service.list_images() if item.get("status") != "processing"]
+    failed = 0
+    for image_id in image_ids:
+        try:
+            path = service.convert_to_frame(image_id)
+            validate_frame_file(path, width=SCREEN_WIDTH, height=SCREEN_HEIGHT, palette_version=PANEL_FRAME_VERSION)
+        except (ValueError, OSError) as e:
+            failed += 1
+            print(f"FAILED  {image_id}: {e}")
+            continue
+        print(f"ok      {image_id} -> {path}")
+    return failed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    p_validate = sub.add_parser("validate", help="check header, size and checksum")
+    p_validate.add_argument("paths", nargs="+")
+    p_validate.add_argument("--strict", action="store_true",
+                            help="also require the current panel size, model and palette version")
+
+    p_convert = sub.add_parser("convert", help="write <id>.frame for library items")
+    p_convert.add_argument("image_ids", nargs="*")
+    p_convert.add_argument("--all", action="store_true", help="convert every library item")
+
+    args = parser.parse_args()
+    if args.command == "validate":
+        failed = validate(args.paths, args.strict)
+    else:
+        if not args.image_ids and not args.all:
+            parser.error("give image ids or --all")
+        failed = convert(args.image_ids, args.all)
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    main()
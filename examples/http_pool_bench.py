@@ -0,0 +1,133 @@
+#!/usr/bin/python
+# -*- coding:utf-8 -*-
+"""
+Harness for the shared HTTP session (app/services/http_service.py).
+
+Starts a local HTTP/1.1 keep-alive stub server that counts accepted TCP
+connections (one per handshake), then fetches the same endpoints with
+bare requests.get and with the pooled HttpService. Also checks that
+retry/backoff recovers from transient 503s and that streamed image
+decoding matches a plain Image.open. No network access is needed.
+
+    python examples/http_pool_bench.py [requests]
+"""
+import os
+import sys
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from io import BytesIO
+
+basedir = os.path.dirname(os.path.dirname(os.path.realpath(__file__)))
+sys.path.insert(0, basedir)
+
+import requests
+from PIL import Image
+
+from app.services.http_service import HttpService
+
+
+def make_png():
+    image = Image.effect_mandelbrot((800, 480), (-2.0, -1.2, 1.0, 1.2), 64).convert("RGB")
+    buffer = BytesIO()
+    image.save(buffer, format="PNG")
+    return buffer.getvalue()
+
+
+PNG = make_png()
+JSON = b'{"code": "200", "now": {"temp": "21", "text": "Sunny"}}'
+
+
+class StubServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self):
+        super().__init__(("127.0.0.1", 0), StubHandler)
+        self.lock = threading.Lock()
+        self.connections = 0
+        self.requests = 0
+        self.flaky_left = 0
+
+    def reset(self, flaky=0):
+        with self.lock:
+            self.connections = 0
+            self.requests = 0
+            self.flaky_left = flaky
+
+
+class StubHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    # headers and body are separate writes; with Nagle + delayed ACK every
+    # keep-alive request would stall ~40 ms
+    disable_nagle_algorithm = True
+
+    def setup(self):
+        super().setup()
+        with self.server.lock:
+            self.server.connections += 1
+
+    def do_GET(self):
+        with self.server.lock:
+            self.server.requests += 1
+            flaky = self.server.flaky_left > 0
+            if flaky:
+                self.server.flaky_left -= 1
+        if self.path.startswith("/flaky") and flaky:
+            self._send(503, b"busy", "text/plain")
+        elif self.path.startswith("/image.png"):
+            self._send(200, PNG, "image/png")
+        else:
+            self._send(200, JSON, "application/json")
+
+    def _send(self, status, body, content_type):
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def run(server, label, fetch, count):
+    server.reset()
+    start = time.perf_counter()
+    for _ in range(count):
+        fetch()
+    elapsed = time.perf_counter() - start
+    print(f"{label:<28} requests={server.requests:<4} handshakes={server.connections:<4} "
+          f"{elapsed * 1000 / count:7.2f} ms/req")
+    return server.connections
+
+
+def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 50
+    server = StubServer()
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    base = f"http://127.0.0.1:{server.server_address[1]}"
+    service = HttpService()
+
+    print(f"stub server {base}, {count} requests per case")
+    bare_json = run(server, "json  requests.get", lambda: requests.get(f"{base}/now", timeout=5).json(), count)
+    pool_json = run(server, "json  HttpService.get", lambda: service.get(f"{base}/now").json(), count)
+    run(server, "image requests.get+open", lambda: Image.open(BytesIO(requests.get(f"{base}/image.png", timeout=5).content)).load(), count)
+    pool_image = run(server, "image HttpService.fetch", lambda: service.fetch_image(f"{base}/image.png"), count)
+
+    expected = Image.open(BytesIO(PNG)).convert("RGB").tobytes()
+    decoded = service.fetch_image(f"{base}/image.png").convert("RGB").tobytes()
+    print(f"streamed decode identical: {decoded == expected}")
+
+    server.reset(flaky=2)
+    response = service.get(f"{base}/flaky")
+    print(f"retry after 2x 503: status={response.status_code} attempts={server.requests}")
+
+    assert bare_json == count, "bare requests.get should handshake per request"
+    assert pool_json <= 1 and pool_image <= 1, "pooled session should reuse the keep-alive connection"
+    assert decoded == expected
+    assert response.status_code == 200 and server.requests == 3
+    server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
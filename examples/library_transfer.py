@@ -0,0 +1,82 @@
+#!/usr/bin/python
+# -*- coding:utf-8 -*-
+"""
+Bulk import into and export from the image library.
+
+Import takes a zip/tar archive or a local directory. Files are decoded in
+parallel (UPLOAD_WORKERS) and all metadata is committed in one transaction.
+Export writes library.json plus the stored originals as a tar, streamed
+file by file; archives produced by export can be imported on another frame
+and keep their image ids (re-importing skips ids that already exist).
+
+    python examples/library_transfer.py import <archive|directory>
+    python examples/library_transfer.py export <out.tar | ->
+"""
+import argparse
+import os
+import sys
+import time
+
+basedir = os.path.dirname(os.path.dirname(os.path.realpath(__file__)))
+sys.path.insert(0, basedir)
+
+from app.services.library_transfer_service import LibraryTransferService
+
+
+def print_progress(job):
+    line = (
+        f"\r{job['processed']}/{job['total']} processed, "
+        f"{job['failed']} failed, {job['skipped']} skipped"
+    )
+    sys.stderr.write(line)
+    sys.stderr.flush()
+
+
+def run_import(path):
+    started = time.monotonic()
+    job = LibraryTransferService().run_import(path, progress=print_progress)
+    sys.stderr.write("\n")
+    for error in job["errors"]:
+        print(f"FAILED  {error['name']}: {error['error']}")
+    print(
+        f"imported {job['imported']}, skipped {job['skipped']}, failed {job['failed']} "
+        f"in {time.monotonic() - started:.1f}s"
+    )
+    return 1 if job["failed"] else 0
+
+
+def run_export(out):
+    stream = LibraryTransferService().export_stream()
+    written = 0
+    if out == "-":
+        for chunk in stream:
+            sys.stdout.buffer.write(chunk)
+            written += len(chunk)
+        sys.stdout.buffer.flush()
+    else:
+        tmp = out + ".tmp"
+        with open(tmp, "wb") as f:
+            for chunk in stream:
+                f.write(chunk)
+                written += len(chunk)
+        os.replace(tmp, out)
+    print(f"exported {written} bytes", file=sys.stderr)
+    return 0
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    sub = parser.add_subparsers(dest="command", required=True)
+    p_import = sub.add_parser("import", help="import a zip/tar archive or a directory")
+    p_import.add_argument("path")
+    p_export = sub.add_parser("export", help="export the library as a tar ('-' for stdout)")
+    p_export.add_argument("out")
+    args = parser.parse_args()
+
+    if args.command == "import":
+        sys.exit(run_import(args.path))
+    sys.exit(run_export(args.out))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,82 @@
+#!/usr/bin/python
+# -*- coding:utf-8 -*-
+"""
+Micro-benchmark for the 4bpp framebuffer packers.
+
+Compares the old per-byte Python loop with PIL's P;4 raw packer
+(EPD.getbuffer) and the NumPy shift-or into a preallocated buffer
+(DisplayService._getbuffer_reuse), and checks that all outputs are
+byte-identical. No panel is needed.
+
+    python examples/pack_buffer_bench.py [image] [repeat]
+"""
+import os
+import sys
+import time
+
+basedir = os.path.dirname(os.path.dirname(os.path.realpath(__file__)))
+sys.path.insert(0, basedir)
+
+import numpy as np
+from PIL import Image
+
+from app.services.image_processing_service import pack_nibbles
+
+WIDTH = 800
+HEIGHT = 480
+
+
+def load_palette_image():
+    pal_image = Image.new("P", (1, 1))
+    pal_image.putpalette((0, 0, 0, 255, 255, 255, 255, 255, 0, 255, 0, 0, 0, 0, 0, 0, 0, 255, 0, 255, 0) + (0, 0, 0) * 249)
+    return pal_image
+
+
+def pack_loop(image_6color, buf):
+    buf_6color = image_6color.tobytes("raw")
+    idx = 0
+    for i in range(0, len(buf_6color), 2):
+        buf[idx] = (buf_6color[i] << 4) + buf_6color[i + 1]
+        idx += 1
+    return buf
+
+
+def pack_pil(image_6color, buf):
+    return image_6color.tobytes("raw", "P;4")
+
+
+def pack_numpy(image_6color, buf):
+    return pack_nibbles(np.asarray(image_6color), buf)
+
+
+def bench(func, image_6color, repeat):
+    buf = bytearray(WIDTH * HEIGHT // 2)
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        out = func(image_6color, buf)
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return bytes(out), best
+
+
+def main():
+    path = sys.argv[1] if len(sys.argv) > 1 else os.path.join(basedir, "pic", "7in3e.bmp")
+    repeat = int(sys.argv[2]) if len(sys.argv) > 2 else 5
+
+    image = Image.open(path).convert("RGB").resize((WIDTH, HEIGHT))
+    image_6color = image.quantize(palette=load_palette_image())
+
+    reference = None
+    for name, func in (("python loop", pack_loop), ("PIL P;4", pack_pil), ("numpy shift-or", pack_numpy)):
+        out, best = bench(func, image_6color, repeat)
+        if reference is None:
+            reference = out
+        same = "identical" if out == reference else "MISMATCH"
+        print(f"{name:16s} {best * 1000:9.2f} ms  {same}")
+        if out != reference:
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -34,14 +34,37 @@ from . import epdconfig
 import PIL
 from PIL import Image
 import io
+import threading
+import time
 
 # Display resolution
 EPD_WIDTH       = 800
 EPD_HEIGHT      = 480
 
+# BUSY wait limit and histogram bucket bounds, in seconds
+BUSY_TIMEOUT    = 60
+BUSY_BUCKETS    = (0.1, 0.5, 1, 2, 5, 10, 15, 20, 30, 60)
+
 logger = logging.getLogger(__name__)
 
 class EPD:
+    # (command, payload) register setup sent by init()
+    INIT_SEQUENCE = (
+        (0xAA, bytes([0x49, 0x55, 0x20, 0x08, 0x09, 0x18])),
+        (0x01, bytes([0x3F])),
+        (0x00, bytes([0x5F, 0x69])),
+        (0x03, bytes([0x00, 0x54, 0x00, 0x44])),
+        (0x05, bytes([0x40, 0x1F, 0x1F, 0x2C])),
+        (0x06, bytes([0x6F, 0x1F, 0x17, 0x49])),
+        (0x08, bytes([0x6F, 0x1F, 0x1F, 0x22])),
+        (0x30, bytes([0x03])),
+        (0x50, bytes([0x3F])),
+        (0x60, bytes([0x02, 0x00])),
+        (0x61, bytes([0x03, 0x20, 0x01, 0xE0])),
+        (0x84, bytes([0x01])),
+        (0xE3, bytes([0x2F])),
+    )
+
     def __init__(self):
         self.reset_pin = epdconfig.RST_PIN
         self.dc_pin = epdconfig.DC_PIN
@@ -56,7 +79,10 @@ class EPD:
         # self.ORANGE = 0x0080ff   #   0100
         self.BLUE   = 0xff0000   #   0101
         self.GREEN  = 0x00ff00   #   0110
-        
+        self._clear_buffers = {}
+        self._busy_stats = {}
+        self._busy_stats_lock = threading.Lock()
+
 
     # Hardware reset
     def reset(self):
@@ -85,96 +111,76 @@ class EPD:
         epdconfig.digital_write(self.cs_pin, 0)
         epdconfig.spi_writebyte2(data)
         epdconfig.digital_write(self.cs_pin, 1)
+
+    # send a command and its whole payload: one transfer for the command
+    # byte (DC low) and one writebytes2 transfer for the payload (DC high)
+    def send_command_data(self, command, data=b''):
+        self.send_command(command)
+        if data:
+            self.send_data2(data)
         
-    def ReadBusyH(self):
+    def ReadBusyH(self, phase="busy"):
         logger.debug("e-Paper busy H")
-        while(epdconfig.digital_read(self.busy_pin) == 0):      # 0: busy, 1: idle
-            epdconfig.delay_ms(5)
+        start = time.monotonic()
+        idle = epdconfig.wait_busy_idle(BUSY_TIMEOUT)      # 0: busy, 1: idle
+        self._record_busy(phase, time.monotonic() - start)
+        if not idle:
+            raise TimeoutError("e-Paper busy for more than %d s (%s)" % (BUSY_TIMEOUT, phase))
         logger.debug("e-Paper busy H release")
 
+    def _record_busy(self, phase, elapsed):
+        with self._busy_stats_lock:
+            stats = self._busy_stats.get(phase)
+            if stats is None:
+                stats = {"count": 0, "sum": 0.0, "max": 0.0, "buckets": [0] * (len(BUSY_BUCKETS) + 1)}
+                self._busy_stats[phase] = stats
+            stats["count"] += 1
+            stats["sum"] += elapsed
+            stats["max"] = max(stats["max"], elapsed)
+            for i, bound in enumerate(BUSY_BUCKETS):
+                if elapsed <= bound:
+                    stats["buckets"][i] += 1
+                    break
+            else:
+                stats["buckets"][-1] += 1
+
+    # BUSY wait durations per phase, histogram buckets keyed by upper bound
+    def busy_histograms(self):
+        with self._busy_stats_lock:
+            result = {}
+            for phase, stats in self._busy_stats.items():
+                labels = ["%g" % bound for bound in BUSY_BUCKETS] + ["+Inf"]
+                result[phase] = {
+                    "count": stats["count"],
+                    "sum": round(stats["sum"], 3),
+                    "max": round(stats["max"], 3),
+                    "buckets": dict(zip(labels, stats["buckets"])),
+                }
+            return result
+
     def TurnOnDisplay(self):
         self.send_command(0x04) # POWER_ON
-        self.ReadBusyH()
+        self.ReadBusyH("power_on")
 
-        self.send_command(0x12) # DISPLAY_REFRESH
-        self.send_data(0X00)
-        self.ReadBusyH()
+        self.send_command_data(0x12, b'\x00') # DISPLAY_REFRESH
+        self.ReadBusyH("refresh")
         
-        self.send_command(0x02) # POWER_OFF
-        self.send_data(0X00)
-        self.ReadBusyH()
+        self.send_command_data(0x02, b'\x00') # POWER_OFF
+        self.ReadBusyH("power_off")
         
     def init(self):
         if (epdconfig.module_init() != 0):
             return -1
         # EPD hardware init start
         self.reset()
-        self.ReadBusyH()
+        self.ReadBusyH("reset")
         epdconfig.delay_ms(30)
 
-        self.send_command(0xAA)   
-        self.send_data(0x49)
-        self.send_data(0x55)
-        self.send_data(0x20)
-        self.send_data(0x08)
-        self.send_data(0x09)
-        self.send_data(0x18)
-
-        self.send_command(0x01)
-        self.send_data(0x3F)
-
-        self.send_command(0x00)  
-        self.send_data(0x5F)
-        self.send_data(0x69)
-
-        self.send_command(0x03)
-        self.send_data(0x00)
-        self.send_data(0x54)
-        self.send_data(0x00)
-        self.send_data(0x44) 
-
-        self.send_command(0x05)
-        self.send_data(0x40)
-        self.send_data(0x1F)
-        self.send_data(0x1F)
-        self.send_data(0x2C)
-
-        self.send_command(0x06)
-        self.send_data(0x6F)
-        self.send_data(0x1F)
-        self.send_data(0x17)
-        self.send_data(0x49)
-
-        self.send_command(0x08)
-        self.send_data(0x6F)
-        self.send_data(0x1F)
-        self.send_data(0x1F)
-        self.send_data(0x22)
-
-        self.send_command(0x30)
-        self.send_data(0x03)
-
-        self.send_command(0x50)
-        self.send_data(0x3F)
-
-        self.send_command(0x60)
-        self.send_data(0x02)
-        self.send_data(0x00)
-
-        self.send_command(0x61)
-        self.send_data(0x03)
-        self.send_data(0x20)
-        self.send_data(0x01) 
-        self.send_data(0xE0)
-
-        self.send_command(0x84)
-        self.send_data(0x01)
-
-        self.send_command(0xE3)
-        self.send_data(0x2F)
+        for command, data in self.INIT_SEQUENCE:
+            self.send_command_data(command, data)
 
         self.send_command(0x04)
-        self.ReadBusyH()
+        self.ReadBusyH("power_on")
         return 0
 
     def getbuffer(self, image):
@@ -194,33 +200,47 @@ class EPD:
 
         # Convert the soruce image to the 6 colors, dithering if needed
         image_6color = image_temp.convert("RGB").quantize(palette=pal_image)
-        buf_6color = bytearray(image_6color.tobytes('raw'))
-
-        # PIL does not support 4 bit color, so pack the 4 bits of color
-        # into a single byte to transfer to the panel
-        buf = [0x00] * int(self.width * self.height / 2)
-        idx = 0
-        for i in range(0, len(buf_6color), 2):
-            buf[idx] = (buf_6color[i] << 4) + buf_6color[i+1]
-            idx += 1
-            
-        return buf
+
+        # Pack the 4 bits of color two pixels per byte (first pixel in the
+        # high nibble) with PIL's raw P;4 packer to transfer to the panel
+        return image_6color.tobytes('raw', 'P;4')
 
     def display(self, image):
         self.send_command(0x10)
         self.send_data2(image)
 
         self.TurnOnDisplay()
+
+    # send a frame from any buffer (e.g. a memoryview over an mmap'ed frame
+    # file) in chunk_size slices under one CS assertion, so no full-frame
+    # copy is made on the heap
+    def display_stream(self, buffer, chunk_size=4096):
+        view = memoryview(buffer)
+        self.send_command(0x10)
+        epdconfig.digital_write(self.dc_pin, 1)
+        epdconfig.digital_write(self.cs_pin, 0)
+        try:
+            for offset in range(0, len(view), chunk_size):
+                epdconfig.spi_writebyte2(view[offset:offset + chunk_size])
+        finally:
+            epdconfig.digital_write(self.cs_pin, 1)
+            view.release()
+
+        self.TurnOnDisplay()
         
     def Clear(self, color=0x11):
+        # prefilled frame per color, reused across calls
+        buf = self._clear_buffers.get(color)
+        if buf is None:
+            buf = bytes([color]) * (int(self.height) * int(self.width/2))
+            self._clear_buffers[color] = buf
         self.send_command(0x10)
-        self.send_data2([color] * int(self.height) * int(self.width/2))
+        self.send_data2(buf)
 
         self.TurnOnDisplay()
 
     def sleep(self):
-        self.send_command(0x07) # DEEP_SLEEP
-        self.send_data(0XA5)
+        self.send_command_data(0x07, b'\xA5') # DEEP_SLEEP
         
         epdconfig.delay_ms(2000)
         epdconfig.module_exit()
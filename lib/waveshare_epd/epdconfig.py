@@ -38,6 +38,18 @@ from ctypes import *
 logger = logging.getLogger(__name__)
 
 
+def _poll_busy_idle(read_busy, timeout, min_delay=0.005, max_delay=0.2):
+    # adaptive polling: start fast, back off while the panel stays busy
+    deadline = None if timeout is None else time.monotonic() + timeout
+    delay = min_delay
+    while read_busy() == 0:      # 0: busy, 1: idle
+        if deadline is not None and time.monotonic() >= deadline:
+            return False
+        time.sleep(delay)
+        delay = min(delay * 2, max_delay)
+    return True
+
+
 class RaspberryPi:
     # Pin definition
     RST_PIN  = 17
@@ -98,6 +110,10 @@ class RaspberryPi:
     def delay_ms(self, delaytime):
         time.sleep(delaytime / 1000.0)
 
+    def wait_busy_idle(self, timeout=None):
+        # BUSY is active high when idle: block on the edge instead of polling
+        return self.GPIO_BUSY_PIN.wait_for_press(timeout)
+
     def spi_writebyte(self, data):
         self.SPI.writebytes(data)
 
@@ -201,6 +217,9 @@ class JetsonNano:
     def delay_ms(self, delaytime):
         time.sleep(delaytime / 1000.0)
 
+    def wait_busy_idle(self, timeout=None):
+        return _poll_busy_idle(lambda: self.digital_read(self.BUSY_PIN), timeout)
+
     def spi_writebyte(self, data):
         self.SPI.SYSFS_software_spi_transfer(data[0])
 
@@ -259,6 +278,9 @@ class SunriseX3:
     def delay_ms(self, delaytime):
         time.sleep(delaytime / 1000.0)
 
+    def wait_busy_idle(self, timeout=None):
+        return _poll_busy_idle(lambda: self.digital_read(self.BUSY_PIN), timeout)
+
     def spi_writebyte(self, data):
         self.SPI.writebytes(data)
 
@@ -301,20 +323,84 @@ class SunriseX3:
         self.GPIO.cleanup([self.RST_PIN, self.DC_PIN, self.CS_PIN, self.BUSY_PIN], self.PWR_PIN)
 
 
-if sys.version_info[0] == 2:
-    process = subprocess.Popen("cat /proc/cpuinfo | grep Raspberry", shell=True, stdout=subprocess.PIPE)
-else:
-    process = subprocess.Popen("cat /proc/cpuinfo | grep Raspberry", shell=True, stdout=subprocess.PIPE, text=True)
-output, _ = process.communicate()
-if sys.version_info[0] == 2:
-    output = output.decode(sys.stdout.encoding)
-
-if "Raspberry" in output:
-    implementation = RaspberryPi()
-elif os.path.exists('/sys/bus/platform/drivers/gpio-x3'):
-    implementation = SunriseX3()
+class FakeSPI:
+    """
+    Hardware-free backend (EPD_BACKEND=fake): records SPI transfers and pin
+    writes instead of driving a panel, BUSY always reads idle.
+    """
+    # Pin definition
+    RST_PIN  = 17
+    DC_PIN   = 25
+    CS_PIN   = 8
+    BUSY_PIN = 24
+    PWR_PIN  = 27
+
+    def __init__(self):
+        self.reset_spi_stats()
+
+    def reset_spi_stats(self):
+        self._stats = {"transfers": 0, "bytes": 0, "pin_writes": 0, "delay_ms": 0}
+        self._transfer_log = []
+
+    def spi_stats(self):
+        stats = dict(self._stats)
+        # (dc level, payload length) per transfer
+        stats["log"] = list(self._transfer_log)
+        return stats
+
+    def digital_write(self, pin, value):
+        self._stats["pin_writes"] += 1
+        if pin == self.DC_PIN:
+            self._dc = value
+
+    def digital_read(self, pin):
+        return 1
+
+    def delay_ms(self, delaytime):
+        self._stats["delay_ms"] += delaytime
+
+    def wait_busy_idle(self, timeout=None):
+        return True
+
+    def _record(self, data):
+        self._stats["transfers"] += 1
+        self._stats["bytes"] += len(data)
+        self._transfer_log.append((getattr(self, "_dc", 0), len(data)))
+
+    def spi_writebyte(self, data):
+        self._record(data)
+
+    def spi_writebyte2(self, data):
+        self._record(data)
+
+    def module_init(self, cleanup=False):
+        return 0
+
+    def module_exit(self, cleanup=False):
+        logger.debug("fake spi end")
+
+
+def _detect_implementation():
+    if sys.version_info[0] == 2:
+        process = subprocess.Popen("cat /proc/cpuinfo | grep Raspberry", shell=True, stdout=subprocess.PIPE)
+    else:
+        process = subprocess.Popen("cat /proc/cpuinfo | grep Raspberry", shell=True, stdout=subprocess.PIPE, text=True)
+    output, _ = process.communicate()
+    if sys.version_info[0] == 2:
+        output = output.decode(sys.stdout.encoding)
+
+    if "Raspberry" in output:
+        return RaspberryPi()
+    elif os.path.exists('/sys/bus/platform/drivers/gpio-x3'):
+        return SunriseX3()
+    else:
+        return JetsonNano()
+
+
+if os.getenv("EPD_BACKEND") == "fake":
+    implementation = FakeSPI()
 else:
-    implementation = JetsonNano()
+    implementation = _detect_implementation()
 
 for func in [x for x in dir(implementation) if not x.startswith('_')]:
     setattr(sys.modules[__name__], func, getattr(implementation, func))
@@ -1,22 +1,26 @@
+import multiprocessing
 import os
 import signal
 import sys
 from app import create_app
 from app.models.empty_du import EmptyDisplayUnit
 
-app = create_app()
+# 渲染进程池以 spawn 启动的子进程会以 __mp_main__ 重新导入本文件：应用与信号处理只在主进程中创建
+app = create_app() if multiprocessing.parent_process() is None else None
 
 def _handle_shutdown(signum, frame):
     try:
         display_service = app.extensions.get("display_service")
         if display_service:
             white = EmptyDisplayUnit("Shutdown White").get_image()
-            display_service.display_image(white)
+            # 关机白屏不可被播放线程随后提交的帧覆盖
+            display_service.display_image(white, supersedable=False)
     finally:
         sys.exit(0)
 
-signal.signal(signal.SIGINT, _handle_shutdown)
-signal.signal(signal.SIGTERM, _handle_shutdown)
+if app is not None:
+    signal.signal(signal.SIGINT, _handle_shutdown)
+    signal.signal(signal.SIGTERM, _handle_shutdown)
 
 if __name__ == '__main__':
     print(f"Running in {os.getenv('RUN_MODE', 'debug')} mode")